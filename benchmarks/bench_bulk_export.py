@@ -0,0 +1,132 @@
+"""
+Benchmark streaming NDJSON import/export throughput (rows/sec) and peak memory.
+
+Generates a synthetic conversation history, imports it with `import_ndjson` and
+streams it back out with `export_ndjson`. Peak memory is measured with
+tracemalloc and should stay flat as `--threads` grows.
+
+Usage: python benchmarks/bench_bulk_export.py [--store sqlite|postgres]
+           [--threads N] [--items-per-thread N] [--batch-size N]
+
+The postgres store uses DATABASE_URL and writes under a throwaway user ID.
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chatkit.store import ItemRecord, Store, ThreadRecord
+from chatkit.types import (
+    AssistantMessageContent,
+    AssistantMessageItem,
+    InferenceOptions,
+    ThreadMetadata,
+    UserMessageItem,
+    UserMessageTextContent,
+)
+from request_context import RequestContext
+
+
+def generate_lines(threads: int, items_per_thread: int) -> Iterator[bytes]:
+    start = datetime(2025, 1, 1)
+    for t in range(threads):
+        thread_id = f"thr_{t:08d}"
+        created_at = start + timedelta(minutes=t)
+        yield (
+            ThreadRecord(thread=ThreadMetadata(id=thread_id, created_at=created_at))
+            .model_dump_json()
+            .encode()
+            + b"\n"
+        )
+        for i in range(items_per_thread):
+            item_at = created_at + timedelta(seconds=i)
+            if i % 2 == 0:
+                item = UserMessageItem(
+                    id=f"msg_{t:08d}_{i:04d}",
+                    thread_id=thread_id,
+                    created_at=item_at,
+                    content=[UserMessageTextContent(text="Mo Chit to Siam?")],
+                    inference_options=InferenceOptions(),
+                )
+            else:
+                item = AssistantMessageItem(
+                    id=f"msg_{t:08d}_{i:04d}",
+                    thread_id=thread_id,
+                    created_at=item_at,
+                    content=[
+                        AssistantMessageContent(
+                            text="Take the Sukhumvit Line towards Kheha. " * 5
+                        )
+                    ],
+                )
+            record = ItemRecord(thread_id=thread_id, item=item)
+            yield record.model_dump_json().encode() + b"\n"
+
+
+def make_store(name: str, tmp_dir: str) -> Store:
+    if name == "postgres":
+        from postgres_store import PostgresStore
+
+        return PostgresStore()
+    from tests.helpers.mock_store import SQLiteStore
+
+    return SQLiteStore(str(Path(tmp_dir) / "bench.db"))
+
+
+async def run(args: argparse.Namespace) -> None:
+    rows = args.threads * (1 + args.items_per_thread)
+    context = RequestContext(user_id=f"bench_{uuid.uuid4().hex[:8]}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = make_store(args.store, tmp_dir)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        imported = await store.import_ndjson(
+            generate_lines(args.threads, args.items_per_thread),
+            context,
+            batch_size=args.batch_size,
+        )
+        import_s = time.perf_counter() - start
+        _, import_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        exported = 0
+        size = 0
+        start = time.perf_counter()
+        async for line in store.export_ndjson(context, batch_size=args.batch_size):
+            exported += 1
+            size += len(line)
+        export_s = time.perf_counter() - start
+        _, export_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if args.store == "postgres":
+            for t in range(args.threads):
+                await store.delete_thread(f"thr_{t:08d}", context)
+
+    assert imported == exported == rows, (imported, exported, rows)
+    print(f"{args.store}: {rows} rows, {size / 1e6:.1f} MB of NDJSON")
+    print(f"import  {rows / import_s:>10.0f} rows/s  peak {import_peak / 1e6:6.1f} MB")
+    print(f"export  {rows / export_s:>10.0f} rows/s  peak {export_peak / 1e6:6.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--store", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--threads", type=int, default=1000)
+    parser.add_argument("--items-per-thread", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=500)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark multi-criteria journey search on BTS and on a larger synthetic network.
+
+The synthetic network is a grid of lines crossing each other, several times
+the size of BTS, with lines of different speeds and fares per ride, like a
+network with MRT and Airport Rail Link lines added, so fast, cheap, direct
+and step-free journeys differ.
+
+Usage: python benchmarks/bench_journeys.py [--grid N] [--queries N]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bts_network import NETWORK, Line, Network, Station
+from journeys import JourneyPlanner
+from timetable import Timetable
+
+
+class RideFares:
+    """A fare per ride: a boarding fee plus a fee per stop, by line."""
+
+    empty = 0
+
+    def __init__(self, fees: dict[str, tuple[int, int]]):
+        self.fees = fees
+
+    def board(self, state: int, line: str, station: str) -> int:
+        return state + self.fees[line][0]
+
+    def ride(self, state: int, line: str, a: str, b: str) -> int:
+        return state + self.fees[line][1]
+
+    def amount(self, state: int) -> int:
+        return state
+
+    def covers(self, a: int, b: int) -> bool:
+        return a <= b
+
+
+def grid_network(
+    size: int, between: int, rng: random.Random
+) -> tuple[Network, RideFares, set[str]]:
+    """`size` lines each way, crossing at interchanges `between` stops apart."""
+    stations: dict[str, Station] = {}
+    lines = []
+    fees = {}
+
+    def station(code: str) -> str:
+        stations.setdefault(code, Station(code, code, code))
+        return code
+
+    for direction in ("h", "v"):
+        for n in range(size):
+            codes = []
+            for m in range(size):
+                r, c = (n, m) if direction == "h" else (m, n)
+                codes.append(station(f"X{r}.{c}"))
+                if m < size - 1:
+                    codes += [
+                        station(f"{direction.upper()}{n}.{m}.{k}")
+                        for k in range(between)
+                    ]
+            # Faster lines cost more per ride, like an express or airport line.
+            segment = rng.choice((75, 100, 130))
+            fees[f"{direction}{n}"] = (
+                {75: 30, 100: 20, 130: 15}[segment],
+                rng.choice((1, 2, 3)),
+            )
+            lines.append(
+                Line(
+                    id=f"{direction}{n}",
+                    name=f"Line {direction}{n}",
+                    color="",
+                    stations=tuple(codes),
+                    segment_seconds=tuple(
+                        segment + rng.randint(-15, 15) for _ in codes[1:]
+                    ),
+                )
+            )
+    no_step_free = {code for code in stations if rng.random() < 0.15}
+    return Network(stations.values(), lines), RideFares(fees), no_step_free
+
+
+def bench(name: str, planner: JourneyPlanner, queries: int, rng: random.Random) -> None:
+    codes = list(planner.network.stations)
+    start_of_day = datetime(2026, 1, 5, 6)  # a Monday
+    latencies = []
+    sizes = []
+    for _ in range(queries):
+        origin, destination = rng.sample(codes, 2)
+        when = start_of_day + timedelta(minutes=rng.randrange(15 * 60))
+        started = time.perf_counter()
+        journeys = planner.search(origin, destination, when=when, limit=100)
+        latencies.append((time.perf_counter() - started) * 1000)
+        sizes.append(len(journeys))
+    latencies.sort()
+    print(
+        f"{name:<10} {len(codes):>8} {len(planner.timetable.patterns('weekday')):>8} "
+        f"{planner.timetable.trip_count:>7} {statistics.median(latencies):>8.2f} "
+        f"{latencies[int(len(latencies) * 0.95)]:>8.2f} {latencies[-1]:>8.2f} "
+        f"{statistics.mean(sizes):>7.2f} {max(sizes):>5}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--grid", type=int, default=8, help="lines each way")
+    parser.add_argument("--between", type=int, default=3, help="stops between")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    started = time.perf_counter()
+    network, fares, no_step_free = grid_network(args.grid, args.between, rng)
+    synthetic = Timetable.generate(network)
+    print(f"built synthetic network in {time.perf_counter() - started:.1f}s")
+
+    print(
+        f"{'network':<10} {'stations':>8} {'patterns':>8} {'trips':>7} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'options':>7} {'max':>5}"
+    )
+    bench("bts", JourneyPlanner(Timetable.generate(NETWORK)), args.queries, rng)
+    bench(
+        "synthetic",
+        JourneyPlanner(synthetic, fares, no_step_free=no_step_free),
+        args.queries,
+        rng,
+    )
+
+
+if __name__ == "__main__":
+    main()
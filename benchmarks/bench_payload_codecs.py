@@ -0,0 +1,155 @@
+"""
+Benchmark stored item payload size and encode/decode throughput per codec.
+
+Usage: python benchmarks/bench_payload_codecs.py [--iterations N]
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chatkit.types import (
+    AssistantMessageContent,
+    AssistantMessageItem,
+    ClientToolCallItem,
+    InferenceOptions,
+    ThreadItem,
+    UserMessageItem,
+    UserMessageTextContent,
+    WidgetItem,
+)
+from chatkit.widgets import Badge, Card, ListView, ListViewItem, Row, Text, Title
+from payload_codec import PayloadCodec, decode_payload_json, get_codec
+from postgres_store import ItemData
+
+STATIONS = [f"Station {i}" for i in range(60)]
+
+
+def sample_items() -> dict[str, ThreadItem]:
+    now = datetime.now()
+    return {
+        "user_message": UserMessageItem(
+            id="msg_user",
+            thread_id="thr_1",
+            created_at=now,
+            content=[UserMessageTextContent(text="How do I get from Mo Chit to Siam?")],
+            inference_options=InferenceOptions(),
+        ),
+        "assistant_message": AssistantMessageItem(
+            id="msg_assistant",
+            thread_id="thr_1",
+            created_at=now,
+            content=[
+                AssistantMessageContent(
+                    text="Take the Sukhumvit Line towards Kheha and get off at Siam. "
+                    * 20
+                )
+            ],
+        ),
+        "widget": WidgetItem(
+            id="msg_widget",
+            thread_id="thr_1",
+            created_at=now,
+            widget=ListView(
+                children=[
+                    ListViewItem(
+                        gap=2,
+                        children=[
+                            Row(
+                                gap=3,
+                                align="center",
+                                children=[
+                                    Title(value=name, size="sm", weight="semibold"),
+                                    Badge(label="Normal", color="success", pill=True),
+                                    Text(value="Every 4 min", color="secondary"),
+                                ],
+                            )
+                        ],
+                    )
+                    for name in STATIONS
+                ]
+            ),
+        ),
+        "client_tool_call": ClientToolCallItem(
+            id="tc_1",
+            thread_id="thr_1",
+            created_at=now,
+            call_id="call_1",
+            name="get_departures",
+            arguments={"station": "Siam"},
+            status="completed",
+            output={
+                "departures": [
+                    {"station": name, "minutes": i % 7, "platform": i % 2 + 1}
+                    for i, name in enumerate(STATIONS)
+                ]
+            },
+        ),
+        "small_card": WidgetItem(
+            id="msg_card",
+            thread_id="thr_1",
+            created_at=now,
+            widget=Card(children=[Text(value="Siam - Interchange station")]),
+        ),
+    }
+
+
+def bench(codec: PayloadCodec | None, data: dict, iterations: int):
+    if codec is None:
+        # JSONB baseline: psycopg's Json adapter uses json.dumps defaults.
+        start = time.perf_counter()
+        for _ in range(iterations):
+            encoded = json.dumps(data).encode("utf-8")
+        encode_s = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(iterations):
+            ItemData.model_validate_json(encoded)
+        decode_s = time.perf_counter() - start
+        return len(encoded), encode_s, decode_s
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encoded = codec.encode(data)
+    encode_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(iterations):
+        ItemData.model_validate_json(decode_payload_json(encoded))
+    decode_s = time.perf_counter() - start
+    return len(encoded), encode_s, decode_s
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    codecs: dict[str, PayloadCodec | None] = {"jsonb": None}
+    for name in ("json", "zlib", "zstd"):
+        try:
+            codecs[name] = get_codec(name)
+        except RuntimeError as e:
+            print(f"skipping {name}: {e}")
+
+    print(
+        f"{'item type':<18} {'codec':<6} {'bytes':>8} {'ratio':>6} "
+        f"{'encode/s':>10} {'decode/s':>10}"
+    )
+    for item_type, item in sample_items().items():
+        data = ItemData(item=item).model_dump(mode="json", round_trip=True)
+        baseline = None
+        for name, codec in codecs.items():
+            size, encode_s, decode_s = bench(codec, data, args.iterations)
+            baseline = baseline or size
+            print(
+                f"{item_type:<18} {name:<6} {size:>8} {size / baseline:>6.2f} "
+                f"{args.iterations / encode_s:>10.0f} {args.iterations / decode_s:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark ChatKitServer.process() without storage or model I/O.
+
+The server runs over chatkit.memory_store.MemoryStore with a canned responder
+that answers every user message with `--items` fixed AssistantMessageItems, so
+the numbers measure request parsing, event handling and serialization only.
+Each round creates a thread, adds `--messages` user messages, then lists the
+thread's items and the user's threads.
+
+`--store sqlite` uses chatkit.sqlite_store.SQLiteStore on a temporary file
+with synchronous=FULL instead, to compare `--commit-mode write|item|turn`.
+
+`--profile` runs the rounds under cProfile and prints the top functions by
+cumulative time.
+
+Usage: python benchmarks/bench_server_process.py [--rounds N] [--messages N]
+           [--items N] [--store memory|sqlite] [--commit-mode write|item|turn]
+           [--copy-items] [--profile] [--top N]
+"""
+
+import argparse
+import asyncio
+import cProfile
+import pstats
+import sys
+import tempfile
+import time
+from collections.abc import AsyncIterator
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chatkit.memory_store import MemoryStore
+from chatkit.server import ChatKitServer, StreamingResult
+from chatkit.sqlite_store import SQLiteStore
+from chatkit.store import Store
+from chatkit.types import (
+    AssistantMessageContent,
+    AssistantMessageItem,
+    InferenceOptions,
+    ItemsListParams,
+    ItemsListReq,
+    ThreadAddUserMessageParams,
+    ThreadCreateParams,
+    ThreadItemDoneEvent,
+    ThreadListParams,
+    ThreadMetadata,
+    ThreadsAddUserMessageReq,
+    ThreadsCreateReq,
+    ThreadsListReq,
+    ThreadStreamEvent,
+    UserMessageInput,
+    UserMessageItem,
+    UserMessageTextContent,
+)
+from request_context import RequestContext
+
+
+class CannedServer(ChatKitServer[RequestContext]):
+    items_per_response = 1
+
+    async def respond(
+        self,
+        thread: ThreadMetadata,
+        input_user_message: UserMessageItem | None,
+        context: RequestContext,
+    ) -> AsyncIterator[ThreadStreamEvent]:
+        for _ in range(self.items_per_response):
+            yield ThreadItemDoneEvent(
+                item=AssistantMessageItem(
+                    id=self.store.generate_item_id("message", thread, context),
+                    thread_id=thread.id,
+                    created_at=datetime.now(),
+                    content=[AssistantMessageContent(text="Take the Sukhumvit Line.")],
+                )
+            )
+
+
+def user_input(text: str) -> UserMessageInput:
+    return UserMessageInput(
+        content=[UserMessageTextContent(text=text)],
+        attachments=[],
+        inference_options=InferenceOptions(),
+    )
+
+
+async def drain(result) -> bytes:
+    if isinstance(result, StreamingResult):
+        last = b""
+        async for event in result:
+            last = event
+        return last
+    return result.json
+
+
+async def run_round(server: CannedServer, messages: int, context) -> None:
+    create = ThreadsCreateReq(
+        params=ThreadCreateParams(input=user_input("Mo Chit to Siam?"))
+    )
+    await drain(await server.process(create.model_dump_json(), context))
+    threads = await server.store.load_threads(1, None, "desc", context)
+    thread_id = threads.data[0].id
+    for _ in range(messages):
+        add = ThreadsAddUserMessageReq(
+            params=ThreadAddUserMessageParams(
+                thread_id=thread_id, input=user_input("And then to Silom?")
+            )
+        )
+        await drain(await server.process(add.model_dump_json(), context))
+    items = ItemsListReq(params=ItemsListParams(thread_id=thread_id, limit=50))
+    await drain(await server.process(items.model_dump_json(), context))
+    listing = ThreadsListReq(params=ThreadListParams(limit=20))
+    await drain(await server.process(listing.model_dump_json(), context))
+
+
+async def run_rounds(server: CannedServer, rounds: int, messages: int) -> float:
+    context = RequestContext(user_id="bench_user")
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await run_round(server, messages, context)
+    # One create, `messages` adds and two list requests per round.
+    return rounds * (messages + 3) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--items", type=int, default=1)
+    parser.add_argument("--store", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument(
+        "--commit-mode", choices=["write", "item", "turn"], default="write"
+    )
+    parser.add_argument("--copy-items", action="store_true")
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store: Store = (
+            SQLiteStore(f"{tmp_dir}/bench.db", synchronous="FULL")
+            if args.store == "sqlite"
+            else MemoryStore(copy_items=args.copy_items)
+        )
+        server = CannedServer(store, commit_mode=args.commit_mode)
+        server.items_per_response = args.items
+        asyncio.run(run_rounds(server, 10, args.messages))
+        if args.profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            rate = asyncio.run(run_rounds(server, args.rounds, args.messages))
+            profiler.disable()
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+        else:
+            rate = asyncio.run(run_rounds(server, args.rounds, args.messages))
+        if isinstance(store, SQLiteStore):
+            store.close()
+    print(f"{rate:>8.1f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark store chat turns per second.
+
+A turn replays the store calls ChatKitServer and MyChatKitServer make for one
+user message: load the thread, add the user message, look for pending client
+tool calls, load the history, add and finalize the assistant message, and save
+the thread. Each configuration runs the same turns:
+
+- sqlite: chatkit.sqlite_store.SQLiteStore on a temporary database file;
+- pooled: PostgresStore with reused connections and prepared statements;
+- unprepared: PostgresStore with reused connections, no prepared statements;
+- per-call: PostgresStore with a new connection for every store call;
+- threaded: the pooled PostgresStore behind chatkit.thread_pool_store.ThreadPoolStore,
+  so concurrent conversations don't wait on each other's queries.
+
+The PostgresStore configurations run against DATABASE_URL and are skipped when
+it isn't set. `--concurrency` runs that many conversations at once. The worst
+event loop lag seen during the run shows how long other requests on the same
+worker would have waited.
+
+Usage: python benchmarks/bench_store_turns.py [--turns N] [--history N]
+           [--concurrency N] [--stores sqlite,pooled,...]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chatkit.sqlite_store import SQLiteStore
+from chatkit.store import Store
+from chatkit.thread_pool_store import ThreadPoolStore
+from chatkit.types import (
+    AssistantMessageContent,
+    AssistantMessageItem,
+    InferenceOptions,
+    ThreadMetadata,
+    UserMessageItem,
+    UserMessageTextContent,
+)
+from request_context import RequestContext
+
+POSTGRES_CONFIGS = {
+    "pooled": {},
+    "unprepared": {"prepare_threshold": None},
+    "per-call": {"pool_size": 0, "prepare_threshold": None},
+    "threaded": {},
+}
+
+
+async def run_conversation(store: Store, turns: int, history: int) -> None:
+    tag = uuid.uuid4().hex[:8]
+    context = RequestContext(user_id=f"bench_{tag}")
+    thread = ThreadMetadata(id=f"thr_{tag}", created_at=datetime.now())
+    await store.save_thread(thread, context)
+    start_at = datetime.now()
+    for i in range(history):
+        await store.add_thread_item(
+            thread.id,
+            AssistantMessageItem(
+                id=f"msg_{tag}_h{i:05d}",
+                thread_id=thread.id,
+                created_at=start_at + timedelta(milliseconds=i),
+                content=[AssistantMessageContent(text="Earlier answer. " * 10)],
+            ),
+            context,
+        )
+
+    for turn in range(turns):
+        now = datetime.now()
+        thread = await store.load_thread(thread.id, context)
+        await store.add_thread_item(
+            thread.id,
+            UserMessageItem(
+                id=f"msg_{tag}_u{turn:05d}",
+                thread_id=thread.id,
+                created_at=now,
+                content=[UserMessageTextContent(text="Mo Chit to Siam?")],
+                inference_options=InferenceOptions(),
+            ),
+            context,
+        )
+        await store.load_thread_items_filtered(
+            thread.id,
+            None,
+            20,
+            "desc",
+            context,
+            types=["client_tool_call"],
+            status="pending",
+        )
+        await store.load_thread_items(thread.id, None, 50, "asc", context)
+        reply = AssistantMessageItem(
+            id=f"msg_{tag}_a{turn:05d}",
+            thread_id=thread.id,
+            created_at=now + timedelta(milliseconds=1),
+            content=[AssistantMessageContent(text="")],
+        )
+        await store.add_thread_item(thread.id, reply, context)
+        reply.content = [AssistantMessageContent(text="Take the Sukhumvit Line.")]
+        await store.save_item(thread.id, reply, context)
+        await store.save_thread(thread, context)
+
+    await store.delete_thread(thread.id, context)
+
+
+async def max_loop_lag(interval: float, lags: list[float]) -> None:
+    """Record how late the event loop wakes up from `interval`-second sleeps."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        try:
+            await asyncio.sleep(interval)
+        finally:
+            # Also counts a sleep that outlasted the run it was sampling.
+            lags.append(loop.time() - start - interval)
+
+
+async def run_turns(
+    store: Store, turns: int, history: int, concurrency: int
+) -> tuple[float, float]:
+    """Return turns per second and the worst event loop lag in seconds."""
+    lags: list[float] = [0.0]
+    sampler = asyncio.create_task(max_loop_lag(0.005, lags))
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            run_conversation(store, turns // concurrency, history)
+            for _ in range(concurrency)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    sampler.cancel()
+    await asyncio.gather(sampler, return_exceptions=True)
+    return (turns // concurrency * concurrency) / elapsed, max(lags)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--history", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument(
+        "--stores", default="sqlite,pooled,unprepared,per-call,threaded"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.stores.split(","):
+            if name == "sqlite":
+                store: Store = SQLiteStore(f"{tmp_dir}/bench.db")
+            elif not os.getenv("DATABASE_URL"):
+                print(f"{name:<11} skipped (DATABASE_URL not set)")
+                continue
+            else:
+                from postgres_store import PostgresStore
+
+                store = PostgresStore(**POSTGRES_CONFIGS[name])
+                if name == "threaded":
+                    store = ThreadPoolStore(store)
+            # Warm up so every configuration starts with the same server caches.
+            await run_turns(store, 10, args.history, 1)
+            rate, lag = await run_turns(
+                store, args.turns, args.history, args.concurrency
+            )
+            print(
+                f"{name:<11} {rate:>8.1f} turns/s  max loop lag {lag * 1000:>7.1f} ms"
+            )
+            if isinstance(store, SQLiteStore | ThreadPoolStore):
+                store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
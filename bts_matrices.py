@@ -0,0 +1,211 @@
+"""
+Dense travel-time, hop-count, transfer and fare matrices for every BTS station pair.
+
+The matrices are derived from the route planner in bts_network, so they agree
+with `plan_route` answers. Building them takes well under a second; a prebuilt
+copy can also be written once with
+
+    python bts_matrices.py --output data/bts_matrices
+
+and loaded memory-mapped at startup by pointing BTS_MATRICES_PATH at that
+directory, so worker processes share the pages instead of each building its
+own. A prebuilt copy whose station list no longer matches the network is
+ignored and rebuilt.
+
+Fares follow the BTS structure: a core-network fare by the number of stations
+travelled inside the core, plus a flat fee for each extension section entered,
+up to a cap. The amounts are approximations in baht.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from bts_network import NETWORK, Network, Route
+
+logger = logging.getLogger(__name__)
+
+# Core fare by stations travelled within the core network, capped at the last.
+CORE_FARES = (17, 17, 25, 28, 32, 35, 38, 40, 43, 45, 47)
+EXTENSION_FARE = 15
+FARE_CAP = 65
+
+# Stations outside the core network, by extension section.
+EXTENSIONS = {
+    "north": {f"N{n}" for n in range(9, 25)},
+    "east": {f"E{n}" for n in range(10, 24)},
+    "thonburi": {f"S{n}" for n in range(9, 13)},
+}
+
+# Layers of the stacked matrix, in file order.
+LAYERS = ("seconds", "hops", "transfers", "fares")
+
+_MATRICES_FILE = "matrices.npy"
+_STATIONS_FILE = "stations.json"
+
+
+def route_fare(route: Route) -> int:
+    if not route.legs:
+        return 0
+    stations = [route.legs[0].stations[0]]
+    for leg in route.legs:
+        stations.extend(leg.stations[1:])
+    return fare_amount(ride_fare(EMPTY_FARE, stations))
+
+
+# What decides a fare: stations travelled in the core, and extensions entered.
+FareState = tuple[int, frozenset[str]]
+EMPTY_FARE: FareState = (0, frozenset())
+
+
+def ride_fare(state: FareState, stations: Sequence[str]) -> FareState:
+    """Add a ride through `stations`, in travel order, to a fare so far."""
+    core_stops, sections = state
+    entered = set()
+    for a, b in itertools.pairwise(stations):
+        section_a, section_b = _section(a), _section(b)
+        if section_a is None and section_b is None:
+            core_stops += 1
+        entered.update(s for s in (section_a, section_b) if s is not None)
+    return core_stops, sections | entered if entered else sections
+
+
+def fare_amount(state: FareState) -> int:
+    core_stops, sections = state
+    if not core_stops and not sections:
+        return 0
+    fare = EXTENSION_FARE * len(sections)
+    if core_stops or not sections:
+        fare += CORE_FARES[min(core_stops, len(CORE_FARES) - 1)]
+    return min(fare, FARE_CAP)
+
+
+def _section(code: str) -> str | None:
+    for section, codes in EXTENSIONS.items():
+        if code in codes:
+            return section
+    return None
+
+
+@dataclass
+class TripCosts:
+    """Costs for a batch of origin/destination pairs, one array entry per pair."""
+
+    origins: list[str]
+    destinations: list[str]
+    seconds: np.ndarray
+    hops: np.ndarray
+    transfers: np.ndarray
+    fares: np.ndarray
+
+    def as_dicts(self, network: Network) -> list[dict]:
+        return [
+            {
+                "origin": network.name(self.origins[i]),
+                "destination": network.name(self.destinations[i]),
+                "minutes": round(int(self.seconds[i]) / 60),
+                "stops": int(self.hops[i]),
+                "transfers": int(self.transfers[i]),
+                "fare_baht": int(self.fares[i]),
+            }
+            for i in range(len(self.origins))
+        ]
+
+
+class TravelMatrices:
+    """Station-by-station cost matrices, indexed by position in `codes`.
+
+    `data` is a (layer, origin, destination) int32 array, either in memory or
+    memory-mapped read-only from a prebuilt file; `seconds`, `hops`,
+    `transfers` and `fares` are views of its layers.
+    """
+
+    def __init__(self, network: Network, codes: Sequence[str], data: np.ndarray):
+        self.network = network
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.data = data
+        self.seconds, self.hops, self.transfers, self.fares = data
+
+    @classmethod
+    def build(cls, network: Network = NETWORK) -> "TravelMatrices":
+        codes = list(network.stations)
+        rows = []
+        for origin in codes:
+            routes = [network.route(origin, destination) for destination in codes]
+            rows.append([
+                (r.seconds, r.stops, r.transfers, route_fare(r)) for r in routes
+            ])
+        # (origin, destination, layer) -> (layer, origin, destination)
+        data = np.ascontiguousarray(np.array(rows, dtype=np.int32).transpose(2, 0, 1))
+        return cls(network, codes, data)
+
+    def save(self, directory: str | Path) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / _MATRICES_FILE, self.data)
+        (directory / _STATIONS_FILE).write_text(
+            json.dumps({"stations": self.codes, "layers": list(LAYERS)})
+        )
+
+    @classmethod
+    def load(
+        cls, directory: str | Path, network: Network = NETWORK
+    ) -> "TravelMatrices":
+        directory = Path(directory)
+        meta = json.loads((directory / _STATIONS_FILE).read_text())
+        if meta["stations"] != list(network.stations) or meta["layers"] != list(LAYERS):
+            raise ValueError(f"Matrices in {directory} don't match the network")
+        data = np.load(directory / _MATRICES_FILE, mmap_mode="r")
+        return cls(network, meta["stations"], data)
+
+    @classmethod
+    def load_or_build(
+        cls, directory: str | Path | None, network: Network = NETWORK
+    ) -> "TravelMatrices":
+        if directory is not None:
+            try:
+                return cls.load(directory, network)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Rebuilding BTS matrices, can't use {directory}: {e}")
+        return cls.build(network)
+
+    def positions(self, stations: Sequence[str]) -> np.ndarray:
+        """Matrix positions of station names or codes, resolved by the network."""
+        index, resolve = self.index, self.network.resolve
+        return np.fromiter(
+            (index[resolve(s)] for s in stations), dtype=np.intp, count=len(stations)
+        )
+
+    def lookup(self, origins: Sequence[str], destinations: Sequence[str]) -> TripCosts:
+        """Costs for each (origins[i], destinations[i]) pair, gathered in one pass."""
+        if len(origins) != len(destinations):
+            raise ValueError("Need as many origins as destinations")
+        rows, cols = self.positions(origins), self.positions(destinations)
+        seconds, hops, transfers, fares = self.data[:, rows, cols]
+        return TripCosts(
+            origins=[self.codes[i] for i in rows],
+            destinations=[self.codes[i] for i in cols],
+            seconds=seconds,
+            hops=hops,
+            transfers=transfers,
+            fares=fares,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prebuild the BTS cost matrices.")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+    TravelMatrices.build().save(args.output)
+    print(f"Wrote matrices for {len(NETWORK.stations)} stations to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
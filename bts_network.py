@@ -0,0 +1,546 @@
+"""
+The BTS Skytrain network as a graph, with a shortest-path route planner.
+
+Stations are identified by their official codes (`N8` Mo Chit, `CEN` Siam,
+`S12` Bang Wa). Each line is an ordered list of stations with the scheduled
+running time in seconds between neighbours, dwell included. The times are
+approximations for planning, not a timetable.
+
+The graph has one node per (line, station) platform, so changing lines at Siam
+costs `TRANSFER_SECONDS`. All-pairs shortest paths are computed once, with one
+Dijkstra run per origin station, when a `Network` is built; `route()` and
+`travel_seconds()` then answer from those tables without searching.
+`NETWORK` is the BTS network as it runs today.
+
+`set_penalties()` slows down or closes segments, for disruptions, and
+repairs the tables incrementally: only origins whose shortest-path trees use
+a changed segment, or could use one that got faster, are touched, and within
+those only the platforms below the change are relabelled.
+"""
+
+import heapq
+import logging
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Walking between the Siam platforms plus the average wait for the next train.
+TRANSFER_SECONDS = 180
+
+
+class UnknownStationError(ValueError):
+    pass
+
+
+class NoRouteError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Station:
+    code: str
+    name: str
+    name_th: str
+
+
+@dataclass(frozen=True)
+class Line:
+    id: str
+    name: str
+    color: str
+    stations: tuple[str, ...]
+    # segment_seconds[i] is the running time from stations[i] to stations[i + 1].
+    segment_seconds: tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class Leg:
+    line: str
+    # From the boarding station to the alighting station, in travel order.
+    stations: tuple[str, ...]
+    # The terminus the train is heading for, as shown on platform signs.
+    towards: str
+    seconds: int
+
+    @property
+    def stops(self) -> int:
+        return len(self.stations) - 1
+
+
+@dataclass(frozen=True)
+class Route:
+    origin: str
+    destination: str
+    legs: tuple[Leg, ...]
+    # Running time plus transfers.
+    seconds: int
+
+    @property
+    def transfers(self) -> int:
+        return max(len(self.legs) - 1, 0)
+
+    @property
+    def stops(self) -> int:
+        return sum(leg.stops for leg in self.legs)
+
+    def as_dict(self, network: "Network") -> dict[str, Any]:
+        name = network.name
+        return {
+            "origin": name(self.origin),
+            "destination": name(self.destination),
+            "minutes": round(self.seconds / 60),
+            "stops": self.stops,
+            "transfers": self.transfers,
+            "legs": [
+                {
+                    "line": network.lines[leg.line].name,
+                    "board": name(leg.stations[0]),
+                    "alight": name(leg.stations[-1]),
+                    "towards": name(leg.towards),
+                    "stops": leg.stops,
+                    "minutes": round(leg.seconds / 60),
+                }
+                for leg in self.legs
+            ],
+        }
+
+
+@dataclass
+class RepairStats:
+    segments: int = 0
+    # Origins whose tables changed, and platform labels changed across them.
+    origins: int = 0
+    platforms: int = 0
+
+
+class Network:
+    """Stations and lines, with precomputed shortest paths between all stations.
+
+    Lookups accept a station code or its English name, case-insensitively.
+    """
+
+    def __init__(
+        self,
+        stations: Iterable[Station],
+        lines: Iterable[Line],
+        *,
+        transfer_seconds: int = TRANSFER_SECONDS,
+    ):
+        self.stations = {station.code: station for station in stations}
+        self.lines = {line.id: line for line in lines}
+        self.transfer_seconds = transfer_seconds
+        self._by_name = {}
+        for station in self.stations.values():
+            self._by_name[_normalize(station.code)] = station.code
+            self._by_name[_normalize(station.name)] = station.code
+
+        # Nodes are platforms: one per (line, station).
+        self._nodes: list[tuple[str, str]] = []
+        self._node_index: dict[tuple[str, str], int] = {}
+        self._platforms: dict[str, list[int]] = {code: [] for code in self.stations}
+        for line in self.lines.values():
+            if len(line.segment_seconds) != len(line.stations) - 1:
+                raise ValueError(f"Line {line.id} needs one time per segment")
+            for code in line.stations:
+                if code not in self.stations:
+                    raise ValueError(f"Line {line.id} refers to unknown {code}")
+                self._node_index[(line.id, code)] = len(self._nodes)
+                self._platforms[code].append(len(self._nodes))
+                self._nodes.append((line.id, code))
+
+        self._edges: list[list[tuple[int, int]]] = [[] for _ in self._nodes]
+        # Scheduled running time of each segment, both ways.
+        self._segments: dict[tuple[int, int], int] = {}
+        for line in self.lines.values():
+            for i, seconds in enumerate(line.segment_seconds):
+                a = self._node_index[(line.id, line.stations[i])]
+                b = self._node_index[(line.id, line.stations[i + 1])]
+                self._edges[a].append((b, seconds))
+                self._edges[b].append((a, seconds))
+                self._segments[(a, b)] = self._segments[(b, a)] = seconds
+        self._penalized: set[tuple[int, int]] = set()
+        for platforms in self._platforms.values():
+            for a in platforms:
+                for b in platforms:
+                    if a != b:
+                        self._edges[a].append((b, transfer_seconds))
+
+        self._codes = list(self.stations)
+        self._station_index = {code: i for i, code in enumerate(self._codes)}
+        self._dist: list[list[int]] = []
+        self._prev: list[list[int]] = []
+        for code in self._codes:
+            dist, prev = self._dijkstra(self._platforms[code])
+            self._dist.append(dist)
+            self._prev.append(prev)
+        logger.debug(
+            f"Built network of {len(self.stations)} stations, {len(self._nodes)} platforms"
+        )
+
+    def resolve(self, query: str) -> str:
+        """Return the code of the station named or coded `query`."""
+        code = self._by_name.get(_normalize(query))
+        if code is None:
+            raise UnknownStationError(f"Unknown BTS station: {query!r}")
+        return code
+
+    def name(self, code: str) -> str:
+        return self.stations[code].name
+
+    def lines_at(self, code: str) -> list[str]:
+        return [self._nodes[node][0] for node in self._platforms[code]]
+
+    def set_penalties(
+        self, penalties: Mapping[tuple[str, str, str], int | None]
+    ) -> RepairStats:
+        """Replace the extra time on segments, updating the tables in place.
+
+        Keys are (line, station, neighbouring station); values are extra
+        seconds in both directions, or None to close the segment. Segments
+        not listed go back to their scheduled times. Only origins whose
+        shortest paths the changed segments can affect are repaired, and
+        within those only the platforms whose distance can change.
+        """
+        target: dict[tuple[int, int], int] = {}
+        for (line, a, b), extra in penalties.items():
+            edge = (self._node_index[(line, a)], self._node_index[(line, b)])
+            if edge not in self._segments:
+                raise ValueError(f"{a} and {b} are not neighbours on {line}")
+            seconds = _INFINITY if extra is None else self._segments[edge] + extra
+            target[edge] = target[edge[::-1]] = seconds
+
+        # (from, to, old seconds, new seconds) for each direction that changed.
+        changed: list[tuple[int, int, int, int]] = []
+        for a, b in self._penalized | set(target):
+            seconds = target.get((a, b), self._segments[(a, b)])
+            k, (_, old) = next(
+                (k, e) for k, e in enumerate(self._edges[a]) if e[0] == b
+            )
+            if seconds != old:
+                self._edges[a][k] = (b, seconds)
+                changed.append((a, b, old, seconds))
+        self._penalized = set(target)
+
+        stats = RepairStats(segments=len(changed) // 2)
+        for dist, prev in zip(self._dist, self._prev):
+            relabelled = self._repair(dist, prev, changed)
+            if relabelled:
+                stats.origins += 1
+                stats.platforms += relabelled
+        logger.debug(
+            f"Updated {stats.segments} segments: repaired {stats.origins} origins, "
+            f"{stats.platforms} platforms"
+        )
+        return stats
+
+    def _repair(
+        self,
+        dist: list[int],
+        prev: list[int],
+        changed: list[tuple[int, int, int, int]],
+    ) -> int:
+        """Bring one origin's tables up to date after `changed` edges.
+
+        Returns the number of platforms relabelled; 0 means the origin's
+        paths don't involve the changed edges.
+        """
+        # Paths through an edge that got slower or closed must be found again:
+        # every platform below it in the shortest-path tree loses its label.
+        slower = [b for a, b, old, new in changed if new > old and prev[b] == a]
+        heap: list[tuple[int, int]] = []
+        relabelled: set[int] = set()
+        if slower:
+            children: dict[int, list[int]] = {}
+            for node, parent in enumerate(prev):
+                if parent != -1:
+                    children.setdefault(parent, []).append(node)
+            stack = slower
+            while stack:
+                node = stack.pop()
+                if node not in relabelled:
+                    relabelled.add(node)
+                    stack.extend(children.get(node, ()))
+            for node in relabelled:
+                dist[node], prev[node] = _INFINITY, -1
+            # Reattach them through their cheapest still-labelled neighbour.
+            # Segments and transfers run both ways at the same cost.
+            for node in relabelled:
+                for neighbour, seconds in self._edges[node]:
+                    d = dist[neighbour] + seconds
+                    if neighbour not in relabelled and d < dist[node]:
+                        dist[node], prev[node] = d, neighbour
+                if dist[node] < _INFINITY:
+                    heap.append((dist[node], node))
+        # Edges that got faster may offer shortcuts.
+        for a, b, old, new in changed:
+            if new < old and dist[a] + new < dist[b]:
+                dist[b], prev[b] = dist[a] + new, a
+                relabelled.add(b)
+                heap.append((dist[b], b))
+        if heap:
+            heapq.heapify(heap)
+            self._relax(heap, dist, prev, relabelled)
+        return len(relabelled)
+
+    def _dijkstra(self, sources: Sequence[int]) -> tuple[list[int], list[int]]:
+        dist = [_INFINITY] * len(self._nodes)
+        prev = [-1] * len(self._nodes)
+        heap = []
+        for source in sources:
+            dist[source] = 0
+            heap.append((0, source))
+        heapq.heapify(heap)
+        self._relax(heap, dist, prev)
+        return dist, prev
+
+    def _relax(
+        self,
+        heap: list[tuple[int, int]],
+        dist: list[int],
+        prev: list[int],
+        relabelled: set[int] | None = None,
+    ) -> None:
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node]:
+                continue
+            for neighbour, seconds in self._edges[node]:
+                nd = d + seconds
+                if nd < dist[neighbour]:
+                    dist[neighbour] = nd
+                    prev[neighbour] = node
+                    heapq.heappush(heap, (nd, neighbour))
+                    if relabelled is not None:
+                        relabelled.add(neighbour)
+
+    def _arrival(self, dist: list[int], code: str) -> int:
+        # Best platform at the destination; ties go to the first line listed.
+        return min(self._platforms[code], key=dist.__getitem__)
+
+    def travel_seconds(self, origin: str, destination: str) -> int:
+        origin, destination = self.resolve(origin), self.resolve(destination)
+        dist = self._dist[self._station_index[origin]]
+        seconds = dist[self._arrival(dist, destination)]
+        if seconds >= _INFINITY:
+            raise NoRouteError(f"No BTS route from {origin} to {destination}")
+        return seconds
+
+    def reachable(self, origin: str, destination: str) -> bool:
+        dist = self._dist[self._station_index[self.resolve(origin)]]
+        return dist[self._arrival(dist, self.resolve(destination))] < _INFINITY
+
+    def route(self, origin: str, destination: str) -> Route:
+        """Return the fastest route, from the precomputed tables."""
+        origin, destination = self.resolve(origin), self.resolve(destination)
+        i = self._station_index[origin]
+        return self._build_route(origin, destination, self._dist[i], self._prev[i])
+
+    def shortest_path(self, origin: str, destination: str) -> Route:
+        """Return the fastest route, searching the graph instead of the tables."""
+        origin, destination = self.resolve(origin), self.resolve(destination)
+        dist, prev = self._dijkstra(self._platforms[origin])
+        return self._build_route(origin, destination, dist, prev)
+
+    def _build_route(
+        self, origin: str, destination: str, dist: list[int], prev: list[int]
+    ) -> Route:
+        end = self._arrival(dist, destination)
+        if dist[end] >= _INFINITY:
+            raise NoRouteError(f"No BTS route from {origin} to {destination}")
+        nodes = [end]
+        while prev[nodes[-1]] != -1:
+            nodes.append(prev[nodes[-1]])
+        nodes.reverse()
+
+        legs: list[Leg] = []
+        start = 0
+        for k in range(1, len(nodes) + 1):
+            line = self._nodes[nodes[start]][0]
+            if k < len(nodes) and self._nodes[nodes[k]][0] == line:
+                continue
+            # nodes[start:k] are consecutive platforms on one line.
+            if k - start > 1:
+                legs.append(self._leg(nodes[start:k], dist))
+            start = k
+        return Route(
+            origin=origin, destination=destination, legs=tuple(legs), seconds=dist[end]
+        )
+
+    def _leg(self, nodes: list[int], dist: list[int]) -> Leg:
+        line = self.lines[self._nodes[nodes[0]][0]]
+        stations = tuple(self._nodes[node][1] for node in nodes)
+        forward = line.stations.index(stations[1]) > line.stations.index(stations[0])
+        return Leg(
+            line=line.id,
+            stations=stations,
+            towards=line.stations[-1] if forward else line.stations[0],
+            seconds=dist[nodes[-1]] - dist[nodes[0]],
+        )
+
+
+_INFINITY = 1 << 60
+
+
+def _normalize(text: str) -> str:
+    return "".join(ch for ch in text.casefold() if ch.isalnum())
+
+
+STATIONS = [
+    Station(code, name, name_th)
+    for code, name, name_th in [
+        ("N24", "Khu Khot", "คูคต"),
+        ("N23", "Yaek Kor Por Aor", "แยก คปอ."),
+        ("N22", "Royal Thai Air Force Museum", "พิพิธภัณฑ์กองทัพอากาศ"),
+        ("N21", "Bhumibol Adulyadej Hospital", "โรงพยาบาลภูมิพลอดุลยเดช"),
+        ("N20", "Saphan Mai", "สะพานใหม่"),
+        ("N19", "Sai Yud", "สายหยุด"),
+        ("N18", "Phahon Yothin 59", "พหลโยธิน 59"),
+        ("N17", "Wat Phra Sri Mahathat", "วัดพระศรีมหาธาตุ"),
+        ("N16", "11th Infantry Regiment", "กรมทหารราบที่ 11"),
+        ("N15", "Bang Bua", "บางบัว"),
+        ("N14", "Royal Forest Department", "กรมป่าไม้"),
+        ("N13", "Kasetsart University", "มหาวิทยาลัยเกษตรศาสตร์"),
+        ("N12", "Sena Nikhom", "เสนานิคม"),
+        ("N11", "Ratchayothin", "รัชโยธิน"),
+        ("N10", "Phahon Yothin 24", "พหลโยธิน 24"),
+        ("N9", "Ha Yaek Lat Phrao", "ห้าแยกลาดพร้าว"),
+        ("N8", "Mo Chit", "หมอชิต"),
+        ("N7", "Saphan Khwai", "สะพานควาย"),
+        ("N5", "Ari", "อารีย์"),
+        ("N4", "Sanam Pao", "สนามเป้า"),
+        ("N3", "Victory Monument", "อนุสาวรีย์ชัยสมรภูมิ"),
+        ("N2", "Phaya Thai", "พญาไท"),
+        ("N1", "Ratchathewi", "ราชเทวี"),
+        ("CEN", "Siam", "สยาม"),
+        ("E1", "Chit Lom", "ชิดลม"),
+        ("E2", "Phloen Chit", "เพลินจิต"),
+        ("E3", "Nana", "นานา"),
+        ("E4", "Asok", "อโศก"),
+        ("E5", "Phrom Phong", "พร้อมพงษ์"),
+        ("E6", "Thong Lo", "ทองหล่อ"),
+        ("E7", "Ekkamai", "เอกมัย"),
+        ("E8", "Phra Khanong", "พระโขนง"),
+        ("E9", "On Nut", "อ่อนนุช"),
+        ("E10", "Bang Chak", "บางจาก"),
+        ("E11", "Punnawithi", "ปุณณวิถี"),
+        ("E12", "Udom Suk", "อุดมสุข"),
+        ("E13", "Bang Na", "บางนา"),
+        ("E14", "Bearing", "แบริ่ง"),
+        ("E15", "Samrong", "สำโรง"),
+        ("E16", "Pu Chao", "ปู่เจ้า"),
+        ("E17", "Chang Erawan", "ช้างเอราวัณ"),
+        ("E18", "Royal Thai Naval Academy", "โรงเรียนนายเรือ"),
+        ("E19", "Pak Nam", "ปากน้ำ"),
+        ("E20", "Srinagarindra", "ศรีนครินทร์"),
+        ("E21", "Phraek Sa", "แพรกษา"),
+        ("E22", "Sai Luat", "สายลวด"),
+        ("E23", "Kheha", "เคหะฯ"),
+        ("W1", "National Stadium", "สนามกีฬาแห่งชาติ"),
+        ("S1", "Ratchadamri", "ราชดำริ"),
+        ("S2", "Sala Daeng", "ศาลาแดง"),
+        ("S3", "Chong Nonsi", "ช่องนนทรี"),
+        ("S4", "Saint Louis", "เซนต์หลุยส์"),
+        ("S5", "Surasak", "สุรศักดิ์"),
+        ("S6", "Saphan Taksin", "สะพานตากสิน"),
+        ("S7", "Krung Thon Buri", "กรุงธนบุรี"),
+        ("S8", "Wongwian Yai", "วงเวียนใหญ่"),
+        ("S9", "Pho Nimit", "โพธิ์นิมิตร"),
+        ("S10", "Talat Phlu", "ตลาดพลู"),
+        ("S11", "Wutthakat", "วุฒากาศ"),
+        ("S12", "Bang Wa", "บางหว้า"),
+    ]
+]
+
+
+def _line(id: str, name: str, color: str, stops: list[tuple[str, int]]) -> Line:
+    # Each stop carries the running time from the previous one.
+    return Line(
+        id=id,
+        name=name,
+        color=color,
+        stations=tuple(code for code, _ in stops),
+        segment_seconds=tuple(seconds for _, seconds in stops[1:]),
+    )
+
+
+LINES = [
+    _line(
+        "sukhumvit",
+        "Sukhumvit Line",
+        "#7FBF3F",
+        [
+            ("N24", 0),
+            ("N23", 120),
+            ("N22", 150),
+            ("N21", 120),
+            ("N20", 120),
+            ("N19", 150),
+            ("N18", 120),
+            ("N17", 120),
+            ("N16", 120),
+            ("N15", 150),
+            ("N14", 120),
+            ("N13", 120),
+            ("N12", 150),
+            ("N11", 120),
+            ("N10", 120),
+            ("N9", 150),
+            ("N8", 120),
+            ("N7", 150),
+            ("N5", 210),
+            ("N4", 120),
+            ("N3", 120),
+            ("N2", 120),
+            ("N1", 120),
+            ("CEN", 150),
+            ("E1", 90),
+            ("E2", 90),
+            ("E3", 120),
+            ("E4", 90),
+            ("E5", 120),
+            ("E6", 120),
+            ("E7", 120),
+            ("E8", 150),
+            ("E9", 150),
+            ("E10", 120),
+            ("E11", 120),
+            ("E12", 120),
+            ("E13", 120),
+            ("E14", 150),
+            ("E15", 150),
+            ("E16", 150),
+            ("E17", 120),
+            ("E18", 150),
+            ("E19", 120),
+            ("E20", 120),
+            ("E21", 150),
+            ("E22", 120),
+            ("E23", 150),
+        ],
+    ),
+    _line(
+        "silom",
+        "Silom Line",
+        "#00665E",
+        [
+            ("W1", 0),
+            ("CEN", 120),
+            ("S1", 120),
+            ("S2", 90),
+            ("S3", 120),
+            ("S4", 90),
+            ("S5", 90),
+            ("S6", 120),
+            ("S7", 150),
+            ("S8", 120),
+            ("S9", 120),
+            ("S10", 120),
+            ("S11", 150),
+            ("S12", 120),
+        ],
+    ),
+]
+
+NETWORK = Network(STATIONS, LINES)
@@ -0,0 +1,296 @@
+"""
+Function tools that let the BTS agent answer from local network data.
+
+Each tool returns JSON, or a short error message the model can relay, and
+never raises: a bad station name should end up as a clarifying question.
+Station arguments go through the fuzzy resolver, so misspellings, Thai names
+and landmarks work wherever a station is expected.
+"""
+
+import json
+import os
+from datetime import date, datetime, time
+
+from agents import function_tool
+
+from bts_matrices import TravelMatrices
+from bts_network import NETWORK, UnknownStationError
+from gtfs_import import GtfsImporter
+from journeys import PREFERENCES, JourneyPlanner
+from rerouting import LiveRoutes, closed_segments, step_free_outages
+from service_status import REFRESH_SECONDS, ServiceStatus, source_from_env
+from station_resolver import RESOLVER
+from timetable import Timetable, now
+
+MATRICES = TravelMatrices.load_or_build(os.getenv("BTS_MATRICES_PATH"))
+GTFS = GtfsImporter(os.environ["BTS_GTFS_DIR"]) if os.getenv("BTS_GTFS_DIR") else None
+TIMETABLE = GTFS.build() if GTFS is not None else Timetable.generate()
+STATUS = ServiceStatus(
+    source_from_env(os.getenv("BTS_STATUS_SOURCE")),
+    interval=float(os.getenv("BTS_STATUS_REFRESH_SECONDS", REFRESH_SECONDS)),
+)
+LIVE_ROUTES = LiveRoutes(STATUS)
+JOURNEYS = JourneyPlanner(TIMETABLE)
+
+
+@function_tool
+def plan_route(origin: str, destination: str) -> str:
+    """Plan the fastest BTS trip between two stations.
+
+    Returns the lines to ride, where to change, which terminus each train is
+    heading towards, and the travel time in minutes, as scheduled. Current
+    disruptions on the way are listed; use `alternate_route` then.
+
+    Args:
+        origin: Station name or code, e.g. "Mo Chit" or "N8".
+        destination: Station name or code, e.g. "Saphan Taksin" or "S6".
+    """
+    try:
+        route = NETWORK.route(RESOLVER.resolve(origin), RESOLVER.resolve(destination))
+    except UnknownStationError as e:
+        return str(e)
+    result = route.as_dict(NETWORK)
+    disruptions = LIVE_ROUTES.disruptions_on(route)
+    if disruptions:
+        result["disruptions"] = [d.summary(NETWORK) for d in disruptions]
+    return json.dumps(result, ensure_ascii=False)
+
+
+@function_tool
+def find_station(query: str) -> str:
+    """Find the BTS stations a name, spelling or landmark may refer to.
+
+    Matches English and Thai names, alternative spellings and nearby landmarks
+    (e.g. "Siam Paragon", "หมอชิต", "Asoke"). Use it when unsure which station
+    the user means; the other tools already accept such names directly.
+
+    Args:
+        query: What the user called the station.
+    """
+    return json.dumps(
+        [
+            {"code": m.code, "name": m.name, "matched": m.matched, "score": m.score}
+            for m in RESOLVER.search(query)
+        ],
+        ensure_ascii=False,
+    )
+
+
+@function_tool
+def line_stations(line: str) -> str:
+    """List the stations of a BTS line in order, with their codes.
+
+    Args:
+        line: "sukhumvit" or "silom".
+    """
+    found = NETWORK.lines.get(line.strip().lower().removesuffix(" line"))
+    if found is None:
+        return f"Unknown BTS line: {line!r}. Use one of: {', '.join(NETWORK.lines)}"
+    return json.dumps(
+        [
+            {
+                "code": code,
+                "name": NETWORK.name(code),
+                "name_th": NETWORK.stations[code].name_th,
+            }
+            for code in found.stations
+        ],
+        ensure_ascii=False,
+    )
+
+
+@function_tool
+def trip_costs(origin: str, destinations: list[str]) -> str:
+    """Look up fare, travel time, stops and transfers from one station to several.
+
+    Use this for fare questions and for comparing destinations; use
+    `plan_route` when the user needs directions.
+
+    Args:
+        origin: Station name or code, e.g. "Asok" or "E4".
+        destinations: Station names or codes, e.g. ["Siam", "Mo Chit"].
+    """
+    try:
+        costs = MATRICES.lookup(
+            [RESOLVER.resolve(origin)] * len(destinations),
+            [RESOLVER.resolve(d) for d in destinations],
+        )
+    except UnknownStationError as e:
+        return str(e)
+    return json.dumps(costs.as_dicts(NETWORK), ensure_ascii=False)
+
+
+@function_tool
+def next_trains(station: str, destination: str | None, count: int = 3) -> str:
+    """List the next trains leaving a station, from the timetable.
+
+    Args:
+        station: Station to board at, e.g. "Asok".
+        destination: Where the user is going, to show only trains towards it;
+            null for trains in every direction.
+        count: How many departures to return.
+    """
+    try:
+        departures = TIMETABLE.next_departures(
+            RESOLVER.resolve(station),
+            RESOLVER.resolve(destination) if destination else None,
+            count=min(max(count, 1), 10),
+        )
+    except (UnknownStationError, ValueError) as e:
+        return str(e)
+    return json.dumps([d.as_dict(NETWORK) for d in departures], ensure_ascii=False)
+
+
+@function_tool
+def first_and_last_trains(origin: str, destination: str, day: str | None) -> str:
+    """Find the first and last trains from one station that reach another.
+
+    The last train accounts for the connection at Siam when the trip changes
+    lines.
+
+    Args:
+        origin: Station to board at, e.g. "Mo Chit".
+        destination: Station to reach, e.g. "Bang Wa".
+        day: Date as YYYY-MM-DD, or null for today.
+    """
+    try:
+        first_last = TIMETABLE.first_last(
+            RESOLVER.resolve(origin),
+            RESOLVER.resolve(destination),
+            date.fromisoformat(day) if day else None,
+        )
+    except (UnknownStationError, ValueError) as e:
+        return str(e)
+    if first_last is None:
+        return "No trains run between these stations that day."
+    return json.dumps(
+        {
+            "first": first_last.first.as_dict(NETWORK),
+            "last": first_last.last.as_dict(NETWORK),
+        },
+        ensure_ascii=False,
+    )
+
+
+@function_tool
+def train_frequency(origin: str, destination: str) -> str:
+    """Find how often trains run right now from one station towards another.
+
+    Args:
+        origin: Station to board at, e.g. "Siam".
+        destination: Any station in the direction of travel, e.g. "Mo Chit".
+    """
+    try:
+        headway = TIMETABLE.headway(
+            RESOLVER.resolve(origin), RESOLVER.resolve(destination)
+        )
+    except (UnknownStationError, ValueError) as e:
+        return str(e)
+    if headway is None:
+        return "No trains are scheduled around this time."
+    return json.dumps({"minutes_between_trains": round(headway / 60, 1)})
+
+
+@function_tool
+def service_status(line: str | None) -> str:
+    """Report current BTS disruptions: closures, delays and station notices.
+
+    Reads the latest status feed snapshot. An empty list means the feed
+    reports normal service.
+
+    Args:
+        line: "sukhumvit" or "silom" to only report that line; null for both.
+    """
+    if STATUS.source is None:
+        return "No live status feed is available; real-time service status is unknown."
+    snapshot = STATUS.snapshot
+    if line:
+        found = NETWORK.lines.get(line.strip().lower().removesuffix(" line"))
+        if found is None:
+            return f"Unknown BTS line: {line!r}. Use one of: {', '.join(NETWORK.lines)}"
+        disruptions = [d for d in snapshot.disruptions if d.line == found.id]
+    else:
+        disruptions = list(snapshot.disruptions)
+    report = snapshot.as_dict(NETWORK)
+    report["stale"] = STATUS.stale
+    report["disruptions"] = [d.as_dict(NETWORK) for d in disruptions]
+    return json.dumps(report, ensure_ascii=False)
+
+
+@function_tool
+def alternate_route(origin: str, destination: str) -> str:
+    """Plan a trip around current disruptions, compared with the usual route.
+
+    Returns the scheduled route, the disruptions on it, and the fastest route
+    running now with the extra minutes it takes. If closures cut BTS service,
+    `live` is null and `bts_reaches` / `bts_resumes_at` say where to leave the
+    BTS and where to rejoin it, to cover the gap by other transport.
+
+    Args:
+        origin: Station name or code, e.g. "Mo Chit".
+        destination: Station name or code, e.g. "Saphan Taksin".
+    """
+    try:
+        alternate = LIVE_ROUTES.alternate(
+            RESOLVER.resolve(origin), RESOLVER.resolve(destination)
+        )
+    except UnknownStationError as e:
+        return str(e)
+    return json.dumps(alternate.as_dict(NETWORK), ensure_ascii=False)
+
+
+@function_tool
+def plan_journey(
+    origin: str, destination: str, prefer: str, depart_at: str | None
+) -> str:
+    """Find the best journeys by time, transfers, fare and step-free access.
+
+    Searches the timetable for the journeys that no other journey beats on
+    all of arrival time, transfers, fare and stations without step-free
+    access (including lifts currently out of service), avoiding closed
+    stretches. Each option lists its trains with departure and arrival times.
+
+    Args:
+        origin: Station name or code, e.g. "Mo Chit".
+        destination: Station name or code, e.g. "Bang Wa".
+        prefer: What matters most: "fastest", "fewest_transfers", "cheapest"
+            or "step_free". Options come best first by it.
+        depart_at: Departure time today as HH:MM, or null for now.
+    """
+    snapshot = STATUS.snapshot
+    closed = closed_segments(snapshot)
+    try:
+        when = now()
+        if depart_at:
+            when = datetime.combine(when.date(), time.fromisoformat(depart_at))
+        journeys = JOURNEYS.search(
+            RESOLVER.resolve(origin),
+            RESOLVER.resolve(destination),
+            when=when,
+            closed=closed,
+            no_step_free=step_free_outages(snapshot),
+            prefer=prefer if prefer in PREFERENCES else "fastest",
+        )
+    except (UnknownStationError, ValueError) as e:
+        return str(e)
+    if not journeys and closed:
+        return "Closures cut BTS service on this trip; call `alternate_route`."
+    if not journeys:
+        return "No BTS journey between these stations for the rest of the day."
+    return json.dumps(
+        {"journeys": [j.as_dict(NETWORK) for j in journeys]}, ensure_ascii=False
+    )
+
+
+BTS_TOOLS = [
+    find_station,
+    plan_route,
+    plan_journey,
+    alternate_route,
+    trip_costs,
+    line_stations,
+    next_trains,
+    first_and_last_trains,
+    train_frequency,
+    service_status,
+]
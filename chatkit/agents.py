@@ -9,6 +9,7 @@ from typing import (
     AsyncGenerator,
     Awaitable,
     Generic,
+    Literal,
     Sequence,
     TypeVar,
     assert_never,
@@ -76,7 +77,7 @@ from .types import (
     WorkflowTaskAdded,
     WorkflowTaskUpdated,
 )
-from .widgets import Markdown, Text, WidgetRoot
+from .widgets import Markdown, Text, WidgetRoot, widget_to_text
 
 
 class ClientToolCall(BaseModel):
@@ -632,8 +633,29 @@ class ThreadItemConverter:
     Widgets, Tasks, and Workflows have default conversions but can be customized.
     Attachments, Tags, and HiddenContextItems require custom handling based on the use case.
     Other item types are converted automatically.
+
+    Args:
+        widget_format: How WidgetItems are described to the model. "json" sends the
+            full widget JSON; "text" sends a compact rendering of the widget's
+            semantic content (titles, text values, list rows, chart summaries).
+        widget_max_chars: Maximum length of each compact widget rendering; None
+            for no limit.
+
+    Both are also class attributes, so subclasses can set them without
+    calling `__init__`.
     """
 
+    widget_format: Literal["json", "text"] = "json"
+    widget_max_chars: int | None = None
+
+    def __init__(
+        self,
+        widget_format: Literal["json", "text"] = "json",
+        widget_max_chars: int | None = None,
+    ):
+        self.widget_format = widget_format
+        self.widget_max_chars = widget_max_chars
+
     def attachment_to_message_content(
         self, attachment: Attachment
     ) -> Awaitable[ResponseInputContentParam]:
@@ -727,17 +749,22 @@ class ThreadItemConverter:
     ) -> TResponseInputItem | list[TResponseInputItem] | None:
         """
         Convert a WidgetItem into input item(s) to send to the model.
-        By default, WidgetItems converted to a text description with a JSON representation of the widget.
+        By default, WidgetItems converted to a text description with a JSON representation of the widget,
+        or a compact text rendering of its content when `widget_format` is "text".
         """
+        if self.widget_format == "text":
+            description = "\n" + widget_to_text(item.widget, self.widget_max_chars)
+        else:
+            description = item.widget.model_dump_json(
+                exclude_unset=True, exclude_none=True
+            )
         return Message(
             type="message",
             content=[
                 ResponseInputTextParam(
                     type="input_text",
                     text=f"The following graphical UI widget (id: {item.id}) was displayed to the user:"
-                    + item.widget.model_dump_json(
-                        exclude_unset=True, exclude_none=True
-                    ),
+                    + description,
                 )
             ],
             role="user",
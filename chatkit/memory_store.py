@@ -0,0 +1,275 @@
+"""In-memory store for tests, profiling and benchmarks."""
+
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Callable, Collection
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from .store import NotFoundError, RawThreadItem, Store, TContext, _matches_item_filter
+from .types import Attachment, Page, ThreadItem, ThreadMetadata
+
+# Sort key shared by threads and items: creation time, then ID for ties.
+_Key = tuple[datetime, str]
+
+
+def _default_user_id(context: Any) -> str:
+    return context.user_id
+
+
+class _SortedIndex:
+    """Values kept in (created_at, id) order with O(log n) lookup by ID.
+
+    Positions are found by bisection. Appending in creation order, the common
+    case for chat items, inserts at the end of the key list without shifting;
+    inserting or removing anywhere else shifts the later keys, which is O(n)
+    but a single memmove of pointers.
+    """
+
+    def __init__(self) -> None:
+        self.keys: list[_Key] = []
+        self.by_id: dict[str, tuple[_Key, Any]] = {}
+
+    def put(self, key: _Key, value: Any) -> None:
+        old = self.by_id.get(key[1])
+        if old is not None and old[0] != key:
+            self._remove_key(old[0])
+            old = None
+        if old is None:
+            insort(self.keys, key)
+        self.by_id[key[1]] = (key, value)
+
+    def _remove_key(self, key: _Key) -> None:
+        del self.keys[bisect_left(self.keys, key)]
+
+    def pop(self, id: str) -> Any | None:
+        entry = self.by_id.pop(id, None)
+        if entry is None:
+            return None
+        self._remove_key(entry[0])
+        return entry[1]
+
+    def get(self, id: str) -> Any | None:
+        entry = self.by_id.get(id)
+        return None if entry is None else entry[1]
+
+    def scan(self, after: str | None, order: str) -> "Any":
+        """Yield values after the entry `after` in the given order."""
+        keys = self.keys
+        if order == "asc":
+            start = 0
+            if after is not None:
+                start = bisect_right(keys, self._key_of(after))
+            for i in range(start, len(keys)):
+                yield self.by_id[keys[i][1]][1]
+        else:
+            end = len(keys)
+            if after is not None:
+                end = bisect_left(keys, self._key_of(after))
+            for i in range(end - 1, -1, -1):
+                yield self.by_id[keys[i][1]][1]
+
+    def _key_of(self, id: str) -> _Key:
+        entry = self.by_id.get(id)
+        if entry is None:
+            raise NotFoundError(f"Item {id} not found")
+        return entry[0]
+
+
+@dataclass
+class _UserData:
+    threads: _SortedIndex = field(default_factory=_SortedIndex)
+    items: dict[str, _SortedIndex] = field(default_factory=dict)
+    attachments: dict[str, Attachment] = field(default_factory=dict)
+    # The thread each item is stored under, since item IDs are unique per user.
+    item_threads: dict[str, str] = field(default_factory=dict)
+
+
+class MemoryStore(Store[TContext]):
+    """Store that keeps everything in process memory, scoped by user.
+
+    Threads and each thread's items are kept sorted by (created_at, id), so
+    pagination seeks with bisection instead of scanning. Nothing is persisted.
+
+    With `copy_items=True` (the default) models are deep-copied on the way in
+    and out, so callers can't mutate stored state without saving it, as with a
+    database-backed store. Pass `copy_items=False` to profile server code
+    without that overhead.
+    """
+
+    def __init__(
+        self,
+        *,
+        user_id: Callable[[TContext], str] = _default_user_id,
+        copy_items: bool = True,
+    ):
+        self._user_id = user_id
+        self._copy_items = copy_items
+        self._users: dict[str, _UserData] = {}
+
+    def _data(self, context: TContext) -> _UserData:
+        user_id = self._user_id(context)
+        data = self._users.get(user_id)
+        if data is None:
+            data = self._users[user_id] = _UserData()
+        return data
+
+    def _copy(self, model: Any) -> Any:
+        return model.model_copy(deep=True) if self._copy_items else model
+
+    @staticmethod
+    def _page(values: Any, limit: int) -> Page[Any]:
+        data = []
+        for value in values:
+            if len(data) == limit:
+                return Page(data=data, has_more=True, after=data[-1].id)
+            data.append(value)
+        return Page(data=data, has_more=False, after=None)
+
+    # Threads
+
+    async def load_thread(self, thread_id: str, context: TContext) -> ThreadMetadata:
+        thread = self._data(context).threads.get(thread_id)
+        if thread is None:
+            raise NotFoundError(f"Thread {thread_id} not found")
+        return self._copy(thread)
+
+    async def save_thread(self, thread: ThreadMetadata, context: TContext) -> None:
+        if type(thread) is ThreadMetadata:
+            metadata = self._copy(thread)
+        else:
+            # Store only the metadata, even when given a Thread with items.
+            metadata = ThreadMetadata.model_validate(
+                thread.model_dump(include=set(ThreadMetadata.model_fields))
+            )
+        self._data(context).threads.put((thread.created_at, thread.id), metadata)
+
+    async def load_threads(
+        self,
+        limit: int,
+        after: str | None,
+        order: str,
+        context: TContext,
+    ) -> Page[ThreadMetadata]:
+        threads = self._data(context).threads.scan(after, order)
+        return self._page((self._copy(t) for t in threads), limit)
+
+    async def delete_thread(self, thread_id: str, context: TContext) -> None:
+        data = self._data(context)
+        data.threads.pop(thread_id)
+        index = data.items.pop(thread_id, None)
+        if index is not None:
+            for item_id in index.by_id:
+                data.item_threads.pop(item_id, None)
+
+    # Items
+
+    async def load_thread_items(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+    ) -> Page[ThreadItem]:
+        return await self.load_thread_items_filtered(
+            thread_id, after, limit, order, context
+        )
+
+    async def load_thread_items_filtered(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+        *,
+        types: Collection[str] | None = None,
+        exclude_types: Collection[str] | None = None,
+        status: str | None = None,
+    ) -> Page[ThreadItem]:
+        index = self._data(context).items.get(thread_id)
+        if index is None:
+            if after is not None:
+                raise NotFoundError(f"Item {after} not found")
+            return Page(data=[], has_more=False, after=None)
+        items = (
+            self._copy(item)
+            for item in index.scan(after, order)
+            if _matches_item_filter(item, types, exclude_types, status)
+        )
+        return self._page(items, limit)
+
+    async def load_raw_thread_items(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+        *,
+        exclude_types: Collection[str] | None = None,
+    ) -> Page[RawThreadItem]:
+        index = self._data(context).items.get(thread_id)
+        if index is None:
+            if after is not None:
+                raise NotFoundError(f"Item {after} not found")
+            return Page(data=[], has_more=False, after=None)
+        items = (
+            RawThreadItem.from_item(self._copy(item))
+            for item in index.scan(after, order)
+            if exclude_types is None or item.type not in exclude_types
+        )
+        return self._page(items, limit)
+
+    async def load_item(
+        self, thread_id: str, item_id: str, context: TContext
+    ) -> ThreadItem:
+        index = self._data(context).items.get(thread_id)
+        item = index.get(item_id) if index is not None else None
+        if item is None:
+            raise NotFoundError(f"Item {item_id} not found in thread {thread_id}")
+        return self._copy(item)
+
+    async def add_thread_item(
+        self, thread_id: str, item: ThreadItem, context: TContext
+    ) -> None:
+        await self.save_item(thread_id, item, context)
+
+    async def save_item(
+        self, thread_id: str, item: ThreadItem, context: TContext
+    ) -> None:
+        data = self._data(context)
+        # Item IDs are unique per user, so move items saved under another thread.
+        previous = data.item_threads.get(item.id)
+        if previous is not None and previous != thread_id:
+            data.items[previous].pop(item.id)
+        index = data.items.get(thread_id)
+        if index is None:
+            index = data.items[thread_id] = _SortedIndex()
+        index.put((item.created_at, item.id), self._copy(item))
+        data.item_threads[item.id] = thread_id
+
+    async def delete_thread_item(
+        self, thread_id: str, item_id: str, context: TContext
+    ) -> None:
+        data = self._data(context)
+        index = data.items.get(thread_id)
+        if index is not None and index.pop(item_id) is not None:
+            del data.item_threads[item_id]
+
+    # Attachments
+
+    async def save_attachment(self, attachment: Attachment, context: TContext) -> None:
+        self._data(context).attachments[attachment.id] = self._copy(attachment)
+
+    async def load_attachment(
+        self, attachment_id: str, context: TContext
+    ) -> Attachment:
+        attachment = self._data(context).attachments.get(attachment_id)
+        if attachment is None:
+            raise NotFoundError(f"Attachment {attachment_id} not found")
+        return self._copy(attachment)
+
+    async def delete_attachment(self, attachment_id: str, context: TContext) -> None:
+        self._data(context).attachments.pop(attachment_id, None)
@@ -9,6 +9,7 @@ from typing import (
     AsyncIterable,
     Callable,
     Generic,
+    Literal,
     assert_never,
 )
 
@@ -25,7 +26,13 @@ from typing_extensions import TypeVar
 from chatkit.errors import CustomStreamError, StreamError
 
 from .logger import logger
-from .store import AttachmentStore, Store, StoreItemType, default_generate_id
+from .store import (
+    AttachmentStore,
+    RawThreadItem,
+    Store,
+    StoreItemType,
+    default_generate_id,
+)
 from .types import (
     Action,
     AttachmentsCreateReq,
@@ -75,6 +82,9 @@ from .widgets import Markdown, Text, WidgetComponent, WidgetComponentBase, Widge
 DEFAULT_PAGE_SIZE = 20
 DEFAULT_ERROR_MESSAGE = "An error occurred when generating a response."
 
+# Built once: constructing the adapter compiles the whole request schema.
+_CHATKIT_REQ_ADAPTER: TypeAdapter[ChatKitReq] = TypeAdapter(ChatKitReq)
+
 
 def diff_widget(
     before: WidgetRoot, after: WidgetRoot
@@ -257,9 +267,24 @@ class ChatKitServer(ABC, Generic[TContext]):
         self,
         store: Store[TContext],
         attachment_store: AttachmentStore[TContext] | None = None,
+        *,
+        commit_mode: Literal["write", "item", "turn"] = "write",
     ):
+        """
+        Args:
+            store: Store for threads, items and attachments.
+            attachment_store: Store for file operations, if attachments are used.
+            commit_mode: When writes made while streaming a response reach the
+                store. "write" applies each one as it happens. "item" and "turn"
+                collect them in a `UnitOfWork` and commit it when an item is done
+                or removed, or once at the end of the turn; items removed before their write
+                is committed (e.g. on a guardrail tripwire) are never written.
+                Writes still pending when the stream fails or is cancelled are
+                discarded.
+        """
         self.store = store
         self.attachment_store = attachment_store
+        self.commit_mode = commit_mode
 
     def _get_attachment_store(self) -> AttachmentStore[TContext]:
         """Return the configured AttachmentStore or raise if missing."""
@@ -312,7 +337,7 @@ class ChatKitServer(ABC, Generic[TContext]):
     async def process(
         self, request: str | bytes | bytearray, context: TContext
     ) -> StreamingResult | NonStreamingResult:
-        parsed_request = TypeAdapter[ChatKitReq](ChatKitReq).validate_json(request)
+        parsed_request = _CHATKIT_REQ_ADAPTER.validate_json(request)
         logger.info(f"Received request op: {parsed_request.type}")
 
         if is_streaming_req(parsed_request):
@@ -327,10 +352,18 @@ class ChatKitServer(ABC, Generic[TContext]):
     ) -> bytes:
         match request:
             case ThreadsGetByIdReq():
-                thread = await self._load_full_thread(
+                thread_meta = await self.store.load_thread(
                     request.params.thread_id, context=context
                 )
-                return self._serialize(self._to_thread_response(thread))
+                raw_items = await self.store.load_raw_thread_items(
+                    request.params.thread_id,
+                    after=None,
+                    limit=DEFAULT_PAGE_SIZE,
+                    order="asc",
+                    context=context,
+                    exclude_types=["hidden_context_item"],
+                )
+                return self._serialize_thread_with_raw_items(thread_meta, raw_items)
             case ThreadsListReq():
                 params = request.params
                 threads = await self.store.load_threads(
@@ -373,20 +406,15 @@ class ChatKitServer(ABC, Generic[TContext]):
                 return b"{}"
             case ItemsListReq():
                 items_list_params = request.params
-                items = await self.store.load_thread_items(
+                raw_items = await self.store.load_raw_thread_items(
                     items_list_params.thread_id,
                     limit=items_list_params.limit or DEFAULT_PAGE_SIZE,
                     order=items_list_params.order,
                     after=items_list_params.after,
                     context=context,
+                    exclude_types=["hidden_context_item"],
                 )
-                # filter out HiddenContextItems
-                items.data = [
-                    item
-                    for item in items.data
-                    if not isinstance(item, HiddenContextItem)
-                ]
-                return self._serialize(items)
+                return self._serialize_raw_items(raw_items)
             case ThreadsUpdateReq():
                 thread = await self.store.load_thread(
                     request.params.thread_id, context=context
@@ -456,21 +484,26 @@ class ChatKitServer(ABC, Generic[TContext]):
                 thread = await self.store.load_thread(
                     request.params.thread_id, context=context
                 )
-                items = await self.store.load_thread_items(
-                    thread.id, None, 1, "desc", context
+                items = await self.store.load_thread_items_filtered(
+                    thread.id,
+                    None,
+                    1,
+                    "desc",
+                    context,
+                    types=["client_tool_call"],
+                    status="pending",
                 )
                 tool_call = next(
                     (
                         item
                         for item in items.data
                         if isinstance(item, ClientToolCallItem)
-                        and item.status == "pending"
                     ),
                     None,
                 )
                 if not tool_call:
                     raise ValueError(
-                        f"Last thread item in {thread.id} was not a ClientToolCallItem"
+                        f"Thread {thread.id} has no pending ClientToolCallItem"
                     )
 
                 tool_call.output = request.params.result
@@ -566,13 +599,17 @@ class ChatKitServer(ABC, Generic[TContext]):
     async def _cleanup_pending_client_tool_call(
         self, thread: ThreadMetadata, context: TContext
     ) -> None:
-        items = await self.store.load_thread_items(
-            thread.id, None, DEFAULT_PAGE_SIZE, "desc", context
+        items = await self.store.load_thread_items_filtered(
+            thread.id,
+            None,
+            DEFAULT_PAGE_SIZE,
+            "desc",
+            context,
+            types=["client_tool_call"],
+            status="pending",
         )
         for tool_call in items.data:
-            if not isinstance(tool_call, ClientToolCallItem):
-                continue
-            if tool_call.status == "pending":
+            if isinstance(tool_call, ClientToolCallItem):
                 logger.warning(
                     f"Client tool call {tool_call.call_id} was not completed, ignoring"
                 )
@@ -606,23 +643,48 @@ class ChatKitServer(ABC, Generic[TContext]):
         await asyncio.sleep(0)  # allow the response to start streaming
 
         last_thread = thread.model_copy(deep=True)
+        unit = (
+            None
+            if self.commit_mode == "write"
+            else self.store.begin_unit_of_work(thread.id, context)
+        )
 
+        async def save_thread() -> None:
+            if unit is None:
+                await self.store.save_thread(thread, context=context)
+            else:
+                unit.save_thread(thread)
+
+        failed = False
         try:
             with agents_sdk_user_agent_override():
                 async for event in stream():
                     match event:
                         case ThreadItemDoneEvent():
-                            await self.store.add_thread_item(
-                                thread.id, event.item, context=context
-                            )
+                            if unit is None:
+                                await self.store.add_thread_item(
+                                    thread.id, event.item, context=context
+                                )
+                            else:
+                                unit.add_item(event.item)
+                                if self.commit_mode == "item":
+                                    await unit.commit()
                         case ThreadItemRemovedEvent():
-                            await self.store.delete_thread_item(
-                                thread.id, event.item_id, context=context
-                            )
+                            if unit is None:
+                                await self.store.delete_thread_item(
+                                    thread.id, event.item_id, context=context
+                                )
+                            else:
+                                unit.delete_item(event.item_id)
+                                if self.commit_mode == "item":
+                                    await unit.commit()
                         case ThreadItemReplacedEvent():
-                            await self.store.save_item(
-                                thread.id, event.item, context=context
-                            )
+                            if unit is None:
+                                await self.store.save_item(
+                                    thread.id, event.item, context=context
+                                )
+                            else:
+                                unit.save_item(event.item)
 
                     # special case - don't send hidden context items back to the client
                     should_swallow_event = isinstance(
@@ -635,36 +697,55 @@ class ChatKitServer(ABC, Generic[TContext]):
                     # in case user updated the thread while streaming
                     if thread != last_thread:
                         last_thread = thread.model_copy(deep=True)
-                        await self.store.save_thread(thread, context=context)
+                        await save_thread()
                         yield ThreadUpdatedEvent(
                             thread=self._to_thread_response(thread)
                         )
                 # in case user updated the thread while streaming
                 if thread != last_thread:
                     last_thread = thread.model_copy(deep=True)
-                    await self.store.save_thread(thread, context=context)
+                    await save_thread()
                     yield ThreadUpdatedEvent(thread=self._to_thread_response(thread))
         except CustomStreamError as e:
+            failed = True
             yield ErrorEvent(
                 code="custom",
                 message=e.message,
                 allow_retry=e.allow_retry,
             )
         except StreamError as e:
+            failed = True
             yield ErrorEvent(
                 code=e.code,
                 allow_retry=e.allow_retry,
             )
         except Exception as e:
+            failed = True
             yield ErrorEvent(
                 code=ErrorCode.STREAM_ERROR,
                 allow_retry=True,
             )
             logger.exception(e)
 
-        if thread != last_thread:
-            # in case user updated the thread at the end of the stream
-            await self.store.save_thread(thread, context=context)
+        if unit is not None and failed:
+            # Don't store the partial writes of a turn that didn't finish.
+            unit.rollback()
+            return
+        # in case user updated the thread at the end of the stream
+        thread_updated = thread != last_thread
+        if thread_updated:
+            await save_thread()
+        if unit is not None:
+            try:
+                await unit.commit()
+            except Exception as e:
+                yield ErrorEvent(
+                    code=ErrorCode.STREAM_ERROR,
+                    allow_retry=True,
+                )
+                logger.exception(e)
+                return
+        if thread_updated:
             yield ThreadUpdatedEvent(thread=self._to_thread_response(thread))
 
     async def _build_user_message_item(
@@ -713,6 +794,34 @@ class ChatKitServer(ABC, Generic[TContext]):
     def _serialize(self, obj: BaseModel) -> bytes:
         return obj.model_dump_json(by_alias=True, exclude_none=True).encode("utf-8")
 
+    def _serialize_raw_items(self, page: Page[RawThreadItem]) -> bytes:
+        """Serialize a page of stored item JSON without re-validating the items.
+
+        HiddenContextItems are filtered out by their type discriminator.
+        """
+        data = b",".join(
+            raw.data.encode("utf-8")
+            for raw in page.data
+            if raw.type != "hidden_context_item"
+        )
+        rest = self._serialize(Page(has_more=page.has_more, after=page.after))
+        # rest is '{"data":[],...}'; splice the raw items into the empty data list
+        prefix = b'{"data":['
+        return prefix + data + rest[len(prefix) :]
+
+    def _serialize_thread_with_raw_items(
+        self, thread: ThreadMetadata, items: Page[RawThreadItem]
+    ) -> bytes:
+        thread_json = self._to_thread_response(thread).model_dump_json(
+            by_alias=True, exclude_none=True, exclude={"items"}
+        )
+        return (
+            thread_json[:-1].encode("utf-8")
+            + b',"items":'
+            + self._serialize_raw_items(items)
+            + b"}"
+        )
+
     def _to_thread_response(self, thread: ThreadMetadata | Thread) -> Thread:
         def is_hidden(item: ThreadItem) -> bool:
             return isinstance(item, HiddenContextItem)
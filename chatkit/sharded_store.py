@@ -0,0 +1,364 @@
+"""Store that spreads users across several underlying stores."""
+
+import asyncio
+import hashlib
+import re
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Collection,
+    Iterable,
+    Sequence,
+)
+from typing import Any, TypeVar
+
+from .logger import logger
+from .store import (
+    NotFoundError,
+    RawThreadItem,
+    Store,
+    StoreItemType,
+    TContext,
+    ThreadRecord,
+    read_export_batches,
+)
+from .types import Attachment, Page, ThreadItem, ThreadMetadata, UserMessageItem
+
+T = TypeVar("T")
+
+# Generated IDs look like `thr_b417_1a2b3c4d`: the shard store's ID with the
+# bucket inserted after its prefix.
+_HINT = re.compile(r"^(?:[^_]+_)?b(\d+)_")
+
+
+def _default_user_id(context: Any) -> str:
+    return context.user_id
+
+
+def _with_hint(id: str, bucket: int) -> str:
+    prefix, sep, rest = id.partition("_")
+    if not sep:
+        return f"b{bucket}_{id}"
+    return f"{prefix}_b{bucket}_{rest}"
+
+
+class ShardedStore(Store[TContext]):
+    """Route each user's data to one of several stores.
+
+    Users are hashed into a fixed number of buckets, and `assignment` maps each
+    bucket to a shard (by default `bucket % len(shards)`). Thread and item IDs
+    generated here carry their bucket, so thread-scoped calls are routed from
+    the ID alone. IDs without a hint, such as ones created before sharding, are
+    routed by the user's bucket.
+
+    Every call is served by a single shard. Use `fan_out` for admin tasks that
+    need all of them, and `rebalance` to move buckets to other shards. The
+    bucket count must not change once IDs have been issued.
+    """
+
+    def __init__(
+        self,
+        shards: Sequence[Store[TContext]],
+        *,
+        buckets: int = 1024,
+        assignment: Sequence[int] | None = None,
+        user_id: Callable[[TContext], str] = _default_user_id,
+    ):
+        if not shards:
+            raise ValueError("ShardedStore needs at least one shard")
+        self.shards = list(shards)
+        self.buckets = buckets
+        self._assignment = self._check_assignment(
+            assignment
+            if assignment is not None
+            else [bucket % len(shards) for bucket in range(buckets)]
+        )
+        self._user_id = user_id
+
+    def _check_assignment(self, assignment: Sequence[int]) -> list[int]:
+        if len(assignment) != self.buckets:
+            raise ValueError(f"Assignment must map all {self.buckets} buckets")
+        if any(not 0 <= shard < len(self.shards) for shard in assignment):
+            raise ValueError("Assignment refers to a shard that doesn't exist")
+        return list(assignment)
+
+    @property
+    def assignment(self) -> list[int]:
+        """The shard index of each bucket. Persist it after rebalancing."""
+        return list(self._assignment)
+
+    def bucket_for_user(self, user_id: str) -> int:
+        # Not hash(): it must agree across processes and restarts.
+        digest = hashlib.blake2b(user_id.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.buckets
+
+    def _bucket(self, context: TContext, id: str | None = None) -> int:
+        if id is not None:
+            match = _HINT.match(id)
+            if match is not None and int(match.group(1)) < self.buckets:
+                return int(match.group(1))
+        return self.bucket_for_user(self._user_id(context))
+
+    def shard_for(self, context: TContext, id: str | None = None) -> Store[TContext]:
+        """Return the shard holding `id`, or the user's shard without one."""
+        return self.shards[self._assignment[self._bucket(context, id)]]
+
+    async def fan_out(self, fn: Callable[[Store[TContext]], Awaitable[T]]) -> list[T]:
+        """Run `fn` on every shard concurrently and return the results in order."""
+        return list(await asyncio.gather(*(fn(shard) for shard in self.shards)))
+
+    # IDs
+
+    def generate_thread_id(self, context: TContext) -> str:
+        bucket = self._bucket(context)
+        shard = self.shards[self._assignment[bucket]]
+        return _with_hint(shard.generate_thread_id(context), bucket)
+
+    def generate_item_id(
+        self, item_type: StoreItemType, thread: ThreadMetadata, context: TContext
+    ) -> str:
+        bucket = self._bucket(context, thread.id)
+        shard = self.shards[self._assignment[bucket]]
+        return _with_hint(shard.generate_item_id(item_type, thread, context), bucket)
+
+    # Threads
+
+    async def load_thread(self, thread_id: str, context: TContext) -> ThreadMetadata:
+        return await self.shard_for(context, thread_id).load_thread(thread_id, context)
+
+    async def save_thread(self, thread: ThreadMetadata, context: TContext) -> None:
+        await self.shard_for(context, thread.id).save_thread(thread, context)
+
+    async def load_threads(
+        self,
+        limit: int,
+        after: str | None,
+        order: str,
+        context: TContext,
+    ) -> Page[ThreadMetadata]:
+        # A user's threads all carry the user's bucket, so they share a shard.
+        return await self.shard_for(context).load_threads(limit, after, order, context)
+
+    async def delete_thread(self, thread_id: str, context: TContext) -> None:
+        await self.shard_for(context, thread_id).delete_thread(thread_id, context)
+
+    # Items
+
+    async def load_thread_items(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+    ) -> Page[ThreadItem]:
+        return await self.shard_for(context, thread_id).load_thread_items(
+            thread_id, after, limit, order, context
+        )
+
+    async def load_thread_items_filtered(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+        *,
+        types: Collection[str] | None = None,
+        exclude_types: Collection[str] | None = None,
+        status: str | None = None,
+    ) -> Page[ThreadItem]:
+        return await self.shard_for(context, thread_id).load_thread_items_filtered(
+            thread_id,
+            after,
+            limit,
+            order,
+            context,
+            types=types,
+            exclude_types=exclude_types,
+            status=status,
+        )
+
+    async def load_raw_thread_items(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+        *,
+        exclude_types: Collection[str] | None = None,
+    ) -> Page[RawThreadItem]:
+        return await self.shard_for(context, thread_id).load_raw_thread_items(
+            thread_id, after, limit, order, context, exclude_types=exclude_types
+        )
+
+    async def load_item(
+        self, thread_id: str, item_id: str, context: TContext
+    ) -> ThreadItem:
+        return await self.shard_for(context, thread_id).load_item(
+            thread_id, item_id, context
+        )
+
+    async def add_thread_item(
+        self, thread_id: str, item: ThreadItem, context: TContext
+    ) -> None:
+        await self.shard_for(context, thread_id).add_thread_item(
+            thread_id, item, context
+        )
+
+    async def save_item(
+        self, thread_id: str, item: ThreadItem, context: TContext
+    ) -> None:
+        await self.shard_for(context, thread_id).save_item(thread_id, item, context)
+
+    async def delete_thread_item(
+        self, thread_id: str, item_id: str, context: TContext
+    ) -> None:
+        await self.shard_for(context, thread_id).delete_thread_item(
+            thread_id, item_id, context
+        )
+
+    # Attachments are created outside the store, so they follow the user.
+
+    async def save_attachment(self, attachment: Attachment, context: TContext) -> None:
+        await self.shard_for(context).save_attachment(attachment, context)
+
+    async def load_attachment(
+        self, attachment_id: str, context: TContext
+    ) -> Attachment:
+        return await self.shard_for(context).load_attachment(attachment_id, context)
+
+    async def delete_attachment(self, attachment_id: str, context: TContext) -> None:
+        await self.shard_for(context).delete_attachment(attachment_id, context)
+
+    # Bulk export and import
+
+    async def export_ndjson(
+        self, context: TContext, *, batch_size: int = 500
+    ) -> AsyncIterator[bytes]:
+        async for line in self.shard_for(context).export_ndjson(
+            context, batch_size=batch_size
+        ):
+            yield line
+
+    async def import_ndjson(
+        self,
+        lines: AsyncIterable[bytes | str] | Iterable[bytes | str],
+        context: TContext,
+        *,
+        batch_size: int = 500,
+    ) -> int:
+        count = 0
+        async for batch in read_export_batches(lines, batch_size):
+            by_shard: dict[int, list[bytes]] = {}
+            for record in batch:
+                thread_id = (
+                    record.thread.id
+                    if isinstance(record, ThreadRecord)
+                    else record.thread_id
+                )
+                shard = self._assignment[self._bucket(context, thread_id)]
+                by_shard.setdefault(shard, []).append(record.model_dump_json().encode())
+            for shard, shard_lines in by_shard.items():
+                count += await self.shards[shard].import_ndjson(
+                    shard_lines, context, batch_size=batch_size
+                )
+        return count
+
+    # Rebalancing
+
+    async def rebalance(
+        self,
+        assignment: Sequence[int],
+        contexts: Iterable[TContext],
+        *,
+        batch_size: int = 500,
+    ) -> int:
+        """Switch to a new bucket assignment, moving the affected users' data.
+
+        The store can't list users, so pass a context for every user that may
+        have data. For each bucket that changes shard, every user in it is
+        copied to the new shard (threads, items and the attachments their
+        messages reference) while reads still go to the old one. The bucket is
+        then routed to the new shard and the users are deleted from the old one.
+        Writes made for such a user while they are being copied may be lost, so
+        pause their traffic first. Returns the number of users moved; persist
+        `assignment` afterwards.
+        """
+        new_assignment = self._check_assignment(assignment)
+        by_bucket: dict[int, dict[str, TContext]] = {}
+        for context in contexts:
+            users = by_bucket.setdefault(self._bucket(context), {})
+            users.setdefault(self._user_id(context), context)
+        moved = 0
+        for bucket, users in by_bucket.items():
+            old = self.shards[self._assignment[bucket]]
+            new = self.shards[new_assignment[bucket]]
+            if old is new:
+                continue
+            copied = [
+                (context, await self._copy_user(old, new, context, batch_size))
+                for context in users.values()
+            ]
+            self._assignment[bucket] = new_assignment[bucket]
+            for context, attachment_ids in copied:
+                await self._delete_user(old, context, attachment_ids, batch_size)
+            moved += len(copied)
+        self._assignment = new_assignment
+        logger.info(f"Rebalanced {moved} users across {len(self.shards)} shards")
+        return moved
+
+    async def _copy_user(
+        self,
+        old: Store[TContext],
+        new: Store[TContext],
+        context: TContext,
+        batch_size: int,
+    ) -> list[str]:
+        attachment_ids: list[str] = []
+        await new.import_ndjson(
+            self._collect_attachments(
+                old.export_ndjson(context, batch_size=batch_size), attachment_ids
+            ),
+            context,
+            batch_size=batch_size,
+        )
+        for attachment_id in attachment_ids:
+            try:
+                attachment = await old.load_attachment(attachment_id, context)
+            except NotFoundError:
+                continue
+            await new.save_attachment(attachment, context)
+        return attachment_ids
+
+    @staticmethod
+    async def _collect_attachments(
+        lines: AsyncIterator[bytes], attachment_ids: list[str]
+    ) -> AsyncIterator[bytes]:
+        async for line in lines:
+            # Only user messages carry attachments; skip parsing everything else.
+            if b'"attachments"' in line:
+                async for batch in read_export_batches([line], 1):
+                    item = getattr(batch[0], "item", None)
+                    if isinstance(item, UserMessageItem):
+                        attachment_ids.extend(a.id for a in item.attachments)
+            yield line
+
+    @staticmethod
+    async def _delete_user(
+        shard: Store[TContext],
+        context: TContext,
+        attachment_ids: list[str],
+        batch_size: int,
+    ) -> None:
+        while True:
+            threads = await shard.load_threads(batch_size, None, "asc", context)
+            for thread in threads.data:
+                await shard.delete_thread(thread.id, context)
+            if not threads.has_more:
+                break
+        for attachment_id in attachment_ids:
+            await shard.delete_attachment(attachment_id, context)
@@ -0,0 +1,619 @@
+"""Embedded SQLite store for single-node deployments."""
+
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Collection, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, TypeVar
+
+from pydantic import TypeAdapter
+
+from .logger import logger
+from .store import (
+    NotFoundError,
+    RawThreadItem,
+    Store,
+    TContext,
+    ThreadRecord,
+    UnitOfWork,
+    read_export_batches,
+    strip_item_nones,
+)
+from .types import Attachment, Page, ThreadItem, ThreadMetadata
+
+T = TypeVar("T")
+
+_THREAD_ITEM_ADAPTER: TypeAdapter[ThreadItem] = TypeAdapter(ThreadItem)
+_ATTACHMENT_ADAPTER: TypeAdapter[Attachment] = TypeAdapter(Attachment)
+# Serializes only ThreadMetadata fields, even when given a Thread with items.
+_THREAD_ADAPTER: TypeAdapter[ThreadMetadata] = TypeAdapter(ThreadMetadata)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS threads_user_created_idx
+    ON threads (user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    type TEXT NOT NULL,
+    status TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+CREATE INDEX IF NOT EXISTS items_thread_created_idx
+    ON items (user_id, thread_id, created_at);
+CREATE INDEX IF NOT EXISTS items_thread_type_status_idx
+    ON items (user_id, thread_id, type, status, created_at);
+
+CREATE TABLE IF NOT EXISTS attachments (
+    id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, id)
+) WITHOUT ROWID;
+"""
+
+_UPSERT_ITEM = """
+INSERT INTO items (id, thread_id, user_id, created_at, type, status, data)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, id) DO UPDATE SET
+    thread_id = excluded.thread_id,
+    created_at = excluded.created_at,
+    type = excluded.type,
+    status = excluded.status,
+    data = excluded.data
+"""
+
+_UPSERT_THREAD = """
+INSERT INTO threads (id, user_id, created_at, data) VALUES (?, ?, ?, ?)
+ON CONFLICT (user_id, id) DO UPDATE SET
+    created_at = excluded.created_at,
+    data = excluded.data
+"""
+
+# Sentinel telling the writer thread to exit.
+_STOP = object()
+
+
+def _default_user_id(context: Any) -> str:
+    return context.user_id
+
+
+def _item_row(
+    thread_id: str, item: ThreadItem, user_id: str
+) -> tuple[str, str, str, str, str, str | None, str]:
+    return (
+        item.id,
+        thread_id,
+        user_id,
+        item.created_at.isoformat(),
+        item.type,
+        getattr(item, "status", None),
+        item.model_dump_json(),
+    )
+
+
+class SQLiteStore(Store[TContext]):
+    """Store backed by a local SQLite database file.
+
+    Designed for single-node deployments such as kiosks and development:
+
+    - the database runs in WAL mode, so reads proceed while a write commits;
+    - reads run on a small thread pool, each thread keeping one connection;
+    - all writes go through one writer thread that holds a persistent
+      connection and commits every write queued at that moment in a single
+      transaction (group commit). Each `await` returns after its write commits.
+
+    Rows are scoped by `user_id(context)`, which defaults to `context.user_id`.
+    `synchronous=NORMAL` keeps the database consistent after a crash but may lose
+    the last commits on power loss; pass `synchronous="FULL"` to avoid that.
+    Call `close()` on shutdown to flush pending writes.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        user_id: Callable[[TContext], str] = _default_user_id,
+        readers: int = 4,
+        max_batch: int = 256,
+        synchronous: str = "NORMAL",
+    ):
+        self.path = str(path)
+        self._user_id = user_id
+        self._max_batch = max_batch
+        self._synchronous = synchronous
+        self._local = threading.local()
+        self._read_connections: list[sqlite3.Connection] = []
+        self._readers = ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="chatkit-sqlite-read"
+        )
+        self._writes: queue.SimpleQueue[Any] = queue.SimpleQueue()
+        # Guards `_closed` so no write is queued behind the writer's stop signal.
+        self._write_lock = threading.Lock()
+        self._closed = False
+
+        # Create the schema before starting readers so they never see it missing.
+        self._writer_conn = self._connect()
+        self._writer_conn.execute("PRAGMA journal_mode=WAL")
+        self._writer_conn.executescript(_SCHEMA)
+        self._writer = threading.Thread(
+            target=self._run_writer, name="chatkit-sqlite-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path, uri=True, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute(f"PRAGMA synchronous = {self._synchronous}")
+        return conn
+
+    def close(self) -> None:
+        """Commit queued writes and close all connections."""
+        with self._write_lock:
+            if not self._closed:
+                self._closed = True
+                self._writes.put(_STOP)
+        self._writer.join()
+        self._readers.shutdown(wait=True)
+        for conn in self._read_connections:
+            conn.close()
+        self._read_connections.clear()
+
+    # Writer thread
+
+    def _run_writer(self) -> None:
+        conn = self._writer_conn
+        try:
+            while True:
+                op = self._writes.get()
+                batch = []
+                stop = op is _STOP
+                while not stop:
+                    batch.append(op)
+                    if len(batch) >= self._max_batch:
+                        break
+                    try:
+                        op = self._writes.get_nowait()
+                    except queue.Empty:
+                        break
+                    stop = op is _STOP
+                if batch:
+                    self._commit_batch(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit_batch(
+        self,
+        conn: sqlite3.Connection,
+        batch: list[tuple[Callable[[sqlite3.Connection], Any], Future[Any]]],
+    ) -> None:
+        results: list[tuple[Future[Any], Any, BaseException | None]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, future in batch:
+                # A savepoint per write keeps one failing write from undoing the
+                # others in the batch.
+                conn.execute("SAVEPOINT write")
+                try:
+                    results.append((future, fn(conn), None))
+                    conn.execute("RELEASE write")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.exception("SQLite write batch failed")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    async def _write(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        future: Future[T] = Future()
+        with self._write_lock:
+            if self._closed:
+                raise RuntimeError("SQLiteStore is closed")
+            self._writes.put((fn, future))
+        return await asyncio.wrap_future(future)
+
+    # Readers
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            conn.execute("PRAGMA query_only = ON")
+            self._read_connections.append(conn)
+        return conn
+
+    async def _read(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, lambda: fn(self._reader()))
+
+    # Threads
+
+    async def load_thread(self, thread_id: str, context: TContext) -> ThreadMetadata:
+        user_id = self._user_id(context)
+        row = await self._read(
+            lambda conn: conn.execute(
+                "SELECT data FROM threads WHERE user_id = ? AND id = ?",
+                (user_id, thread_id),
+            ).fetchone()
+        )
+        if row is None:
+            raise NotFoundError(f"Thread {thread_id} not found")
+        return ThreadMetadata.model_validate_json(row[0])
+
+    async def save_thread(self, thread: ThreadMetadata, context: TContext) -> None:
+        params = (
+            thread.id,
+            self._user_id(context),
+            thread.created_at.isoformat(),
+            _THREAD_ADAPTER.dump_json(thread).decode(),
+        )
+        await self._write(lambda conn: conn.execute(_UPSERT_THREAD, params))
+
+    async def load_threads(
+        self,
+        limit: int,
+        after: str | None,
+        order: str,
+        context: TContext,
+    ) -> Page[ThreadMetadata]:
+        user_id = self._user_id(context)
+        direction = "ASC" if order == "asc" else "DESC"
+        comparison = ">" if order == "asc" else "<"
+
+        def query(conn: sqlite3.Connection) -> list[Any]:
+            sql = "SELECT id, data FROM threads WHERE user_id = ?"
+            params: list[Any] = [user_id]
+            if after:
+                row = conn.execute(
+                    "SELECT created_at FROM threads WHERE user_id = ? AND id = ?",
+                    (user_id, after),
+                ).fetchone()
+                if row is None:
+                    raise NotFoundError(f"Thread {after} not found")
+                sql += f" AND (created_at, id) {comparison} (?, ?)"
+                params += [row[0], after]
+            sql += f" ORDER BY created_at {direction}, id {direction} LIMIT ?"
+            params.append(limit + 1)
+            return conn.execute(sql, params).fetchall()
+
+        rows = await self._read(query)
+        threads = [ThreadMetadata.model_validate_json(data) for _, data in rows]
+        return self._page(threads, limit)
+
+    async def delete_thread(self, thread_id: str, context: TContext) -> None:
+        user_id = self._user_id(context)
+
+        def delete(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "DELETE FROM items WHERE user_id = ? AND thread_id = ?",
+                (user_id, thread_id),
+            )
+            conn.execute(
+                "DELETE FROM threads WHERE user_id = ? AND id = ?",
+                (user_id, thread_id),
+            )
+
+        await self._write(delete)
+
+    # Items
+
+    @staticmethod
+    def _page(data: list[Any], limit: int) -> Page[Any]:
+        has_more = len(data) > limit
+        data = data[:limit]
+        return Page(
+            data=data, has_more=has_more, after=data[-1].id if has_more else None
+        )
+
+    def _select_items(
+        self,
+        conn: sqlite3.Connection,
+        columns: str,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        user_id: str,
+        types: Collection[str] | None = None,
+        exclude_types: Collection[str] | None = None,
+        status: str | None = None,
+    ) -> list[Any]:
+        direction = "ASC" if order == "asc" else "DESC"
+        sql = f"SELECT {columns} FROM items WHERE user_id = ? AND thread_id = ?"
+        params: list[Any] = [user_id, thread_id]
+        if after:
+            row = conn.execute(
+                "SELECT created_at FROM items WHERE user_id = ? AND id = ?",
+                (user_id, after),
+            ).fetchone()
+            if row is None:
+                raise NotFoundError(f"Item {after} not found")
+            comparison = ">" if order == "asc" else "<"
+            sql += f" AND (created_at, id) {comparison} (?, ?)"
+            params += [row[0], after]
+        if types is not None:
+            sql += f" AND type IN ({', '.join('?' * len(types))})"
+            params += list(types)
+        if exclude_types is not None:
+            sql += f" AND type NOT IN ({', '.join('?' * len(exclude_types))})"
+            params += list(exclude_types)
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += f" ORDER BY created_at {direction}, id {direction} LIMIT ?"
+        params.append(limit + 1)
+        return conn.execute(sql, params).fetchall()
+
+    async def load_thread_items(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+    ) -> Page[ThreadItem]:
+        return await self.load_thread_items_filtered(
+            thread_id, after, limit, order, context
+        )
+
+    async def load_thread_items_filtered(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+        *,
+        types: Collection[str] | None = None,
+        exclude_types: Collection[str] | None = None,
+        status: str | None = None,
+    ) -> Page[ThreadItem]:
+        user_id = self._user_id(context)
+        rows = await self._read(
+            lambda conn: self._select_items(
+                conn,
+                "data",
+                thread_id,
+                after,
+                limit,
+                order,
+                user_id,
+                types=types,
+                exclude_types=exclude_types,
+                status=status,
+            )
+        )
+        items = [_THREAD_ITEM_ADAPTER.validate_json(data) for (data,) in rows]
+        return self._page(items, limit)
+
+    async def load_raw_thread_items(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+        *,
+        exclude_types: Collection[str] | None = None,
+    ) -> Page[RawThreadItem]:
+        user_id = self._user_id(context)
+        rows = await self._read(
+            lambda conn: self._select_items(
+                conn,
+                "id, type, data",
+                thread_id,
+                after,
+                limit,
+                order,
+                user_id,
+                exclude_types=exclude_types,
+            )
+        )
+        # Drop None fields so the JSON matches what is sent to clients, without
+        # validating the items.
+        items = [
+            RawThreadItem.model_construct(
+                id=item_id,
+                type=item_type,
+                data=json.dumps(strip_item_nones(json.loads(data)), ensure_ascii=False),
+            )
+            for item_id, item_type, data in rows
+        ]
+        return self._page(items, limit)
+
+    async def load_item(
+        self, thread_id: str, item_id: str, context: TContext
+    ) -> ThreadItem:
+        user_id = self._user_id(context)
+        row = await self._read(
+            lambda conn: conn.execute(
+                """
+                SELECT data FROM items
+                WHERE user_id = ? AND id = ? AND thread_id = ?
+                """,
+                (user_id, item_id, thread_id),
+            ).fetchone()
+        )
+        if row is None:
+            raise NotFoundError(f"Item {item_id} not found in thread {thread_id}")
+        return _THREAD_ITEM_ADAPTER.validate_json(row[0])
+
+    async def add_thread_item(
+        self, thread_id: str, item: ThreadItem, context: TContext
+    ) -> None:
+        await self.save_item(thread_id, item, context)
+
+    async def save_item(
+        self, thread_id: str, item: ThreadItem, context: TContext
+    ) -> None:
+        params = _item_row(thread_id, item, self._user_id(context))
+        await self._write(lambda conn: conn.execute(_UPSERT_ITEM, params))
+
+    async def delete_thread_item(
+        self, thread_id: str, item_id: str, context: TContext
+    ) -> None:
+        params = (self._user_id(context), item_id, thread_id)
+        await self._write(
+            lambda conn: conn.execute(
+                "DELETE FROM items WHERE user_id = ? AND id = ? AND thread_id = ?",
+                params,
+            )
+        )
+
+    async def commit_unit_of_work(self, unit: UnitOfWork[TContext]) -> None:
+        # One writer job, so the whole unit shares a savepoint and a commit.
+        user_id = self._user_id(unit.context)
+        items = [_item_row(unit.thread_id, i, user_id) for i in unit.items.values()]
+        deleted = [(user_id, i, unit.thread_id) for i in unit.deleted_item_ids]
+        thread = unit.thread
+
+        def write(conn: sqlite3.Connection) -> None:
+            conn.executemany(_UPSERT_ITEM, items)
+            conn.executemany(
+                "DELETE FROM items WHERE user_id = ? AND id = ? AND thread_id = ?",
+                deleted,
+            )
+            if thread is not None:
+                conn.execute(
+                    _UPSERT_THREAD,
+                    (
+                        thread.id,
+                        user_id,
+                        thread.created_at.isoformat(),
+                        _THREAD_ADAPTER.dump_json(thread).decode(),
+                    ),
+                )
+
+        await self._write(write)
+
+    # Attachments
+
+    async def save_attachment(self, attachment: Attachment, context: TContext) -> None:
+        params = (attachment.id, self._user_id(context), attachment.model_dump_json())
+        await self._write(
+            lambda conn: conn.execute(
+                """
+                INSERT INTO attachments (id, user_id, data) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, id) DO UPDATE SET data = excluded.data
+                """,
+                params,
+            )
+        )
+
+    async def load_attachment(
+        self, attachment_id: str, context: TContext
+    ) -> Attachment:
+        user_id = self._user_id(context)
+        row = await self._read(
+            lambda conn: conn.execute(
+                "SELECT data FROM attachments WHERE user_id = ? AND id = ?",
+                (user_id, attachment_id),
+            ).fetchone()
+        )
+        if row is None:
+            raise NotFoundError(f"Attachment {attachment_id} not found")
+        return _ATTACHMENT_ADAPTER.validate_json(row[0])
+
+    async def delete_attachment(self, attachment_id: str, context: TContext) -> None:
+        params = (self._user_id(context), attachment_id)
+        await self._write(
+            lambda conn: conn.execute(
+                "DELETE FROM attachments WHERE user_id = ? AND id = ?", params
+            )
+        )
+
+    # Bulk export and import
+
+    async def export_ndjson(
+        self, context: TContext, *, batch_size: int = 500
+    ) -> AsyncIterator[bytes]:
+        user_id = self._user_id(context)
+        # Threads and items in one query, each thread followed by its items.
+        sql = """
+            SELECT id, 0, created_at, id, data FROM threads WHERE user_id = ?
+            UNION ALL
+            SELECT thread_id, 1, created_at, id, data FROM items WHERE user_id = ?
+            ORDER BY 1, 2, 3, 4
+        """
+        # A dedicated connection, used by one reader thread at a time, reads
+        # `batch_size` rows per call inside one read transaction, so the whole
+        # export sees a single snapshot.
+        conn = await self._read(lambda _: self._connect())
+        try:
+            await self._read(lambda _: conn.execute("BEGIN"))
+            cursor = await self._read(lambda _: conn.execute(sql, (user_id, user_id)))
+            while rows := await self._read(lambda _: cursor.fetchmany(batch_size)):
+                for thread_id, kind, _, _, data in rows:
+                    if kind == 0:
+                        yield b'{"thread":' + data.encode() + b"}\n"
+                    else:
+                        head = (
+                            b'{"thread_id":%s,"item":' % json.dumps(thread_id).encode()
+                        )
+                        yield head + data.encode() + b"}\n"
+            await self._read(lambda _: conn.execute("COMMIT"))
+        finally:
+            conn.close()
+
+    async def import_ndjson(
+        self,
+        lines: AsyncIterable[bytes | str] | Iterable[bytes | str],
+        context: TContext,
+        *,
+        batch_size: int = 500,
+    ) -> int:
+        user_id = self._user_id(context)
+        count = 0
+        async for batch in read_export_batches(lines, batch_size):
+            threads = [
+                (
+                    r.thread.id,
+                    user_id,
+                    r.thread.created_at.isoformat(),
+                    _THREAD_ADAPTER.dump_json(r.thread).decode(),
+                )
+                for r in batch
+                if isinstance(r, ThreadRecord)
+            ]
+            items = [
+                _item_row(r.thread_id, r.item, user_id)
+                for r in batch
+                if not isinstance(r, ThreadRecord)
+            ]
+
+            def write(conn: sqlite3.Connection, threads=threads, items=items) -> None:
+                conn.executemany(_UPSERT_THREAD, threads)
+                conn.executemany(_UPSERT_ITEM, items)
+
+            await self._write(write)
+            count += len(batch)
+        return count
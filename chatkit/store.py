@@ -1,7 +1,11 @@
 import uuid
 from abc import ABC, abstractmethod
-from typing import Any, Generic, Literal
+from collections.abc import AsyncIterable, AsyncIterator, Collection, Iterable
+from functools import cache
+from types import UnionType
+from typing import Annotated, Any, Generic, Literal, Union, get_args, get_origin
 
+from pydantic import BaseModel, PrivateAttr, TypeAdapter
 from typing_extensions import TypeVar
 
 from .types import (
@@ -11,6 +15,7 @@ from .types import (
     ThreadItem,
     ThreadMetadata,
 )
+from .widgets import WidgetComponentBase
 
 TContext = TypeVar("TContext", default=Any)
 
@@ -38,6 +43,220 @@ class NotFoundError(Exception):
     pass
 
 
+_THREAD_ITEM_ADAPTER: TypeAdapter[ThreadItem] = TypeAdapter(ThreadItem)
+
+
+def strip_item_nones(data: Any) -> Any:
+    """Drop `None` fields from decoded item JSON, as `exclude_none` would.
+
+    Only fields of models are dropped. `None` values inside free-form fields,
+    such as a client tool call's `arguments`, are kept like pydantic keeps them.
+    """
+    return _strip_nones(data, ThreadItem)
+
+
+def _strip_nones(value: Any, annotation: Any) -> Any:
+    origin = get_origin(annotation)
+    if origin is Annotated:
+        return _strip_nones(value, get_args(annotation)[0])
+    if origin is Union or origin is UnionType:
+        member = _union_member(annotation, value)
+        return value if member is None else _strip_nones(value, member)
+    if origin is list and isinstance(value, list):
+        (arg,) = get_args(annotation) or (Any,)
+        return [_strip_nones(v, arg) for v in value]
+    if origin is dict and isinstance(value, dict):
+        arg = get_args(annotation)[1] if get_args(annotation) else Any
+        return {k: _strip_nones(v, arg) for k, v in value.items()}
+    if (
+        isinstance(annotation, type)
+        and issubclass(annotation, BaseModel)
+        and isinstance(value, dict)
+    ):
+        # Widgets are stored as their own serializer writes them for clients.
+        if issubclass(annotation, WidgetComponentBase):
+            return value
+        fields = _model_fields(annotation)
+        return {
+            k: _strip_nones(v, fields[k]) if k in fields else v
+            for k, v in value.items()
+            if v is not None or k not in fields
+        }
+    return value
+
+
+def _union_member(annotation: Any, value: Any) -> Any:
+    """The member of a union that `value` was serialized from, if structured."""
+    for arg in get_args(annotation):
+        while get_origin(arg) is Annotated:
+            arg = get_args(arg)[0]
+        if isinstance(value, list) and get_origin(arg) is list:
+            return arg
+        if not isinstance(value, dict):
+            continue
+        if get_origin(arg) is dict:
+            return arg
+        if isinstance(arg, type) and issubclass(arg, BaseModel):
+            kind = _model_fields(arg).get("type")
+            if get_origin(kind) is not Literal or value.get("type") in get_args(kind):
+                return arg
+    return None
+
+
+@cache
+def _model_fields(model: type[BaseModel]) -> dict[str, Any]:
+    fields = {}
+    for name, field in model.model_fields.items():
+        fields[name] = field.annotation
+        if field.alias:
+            fields[field.alias] = field.annotation
+    return fields
+
+
+class RawThreadItem(BaseModel):
+    """A stored thread item kept as serialized JSON.
+
+    `data` holds the item JSON as it is sent to clients (by alias, without `None`
+    fields) so list responses can include it without a decode/encode round trip.
+    The item is only validated into a `ThreadItem` when `item` is accessed.
+    """
+
+    id: str
+    type: str
+    data: str
+    _item: ThreadItem | None = PrivateAttr(default=None)
+
+    @classmethod
+    def from_item(cls, item: ThreadItem) -> "RawThreadItem":
+        raw = cls.model_construct(
+            id=item.id,
+            type=item.type,
+            data=item.model_dump_json(by_alias=True, exclude_none=True),
+        )
+        raw._item = item
+        return raw
+
+    @property
+    def item(self) -> ThreadItem:
+        if self._item is None:
+            self._item = _THREAD_ITEM_ADAPTER.validate_json(self.data)
+        return self._item
+
+
+class ThreadRecord(BaseModel):
+    """An exported thread: one NDJSON line `{"thread": {...}}`."""
+
+    thread: ThreadMetadata
+
+
+class ItemRecord(BaseModel):
+    """An exported thread item: one NDJSON line `{"thread_id": ..., "item": {...}}`."""
+
+    thread_id: str
+    item: ThreadItem
+
+
+ExportRecord = ThreadRecord | ItemRecord
+
+_EXPORT_RECORD_ADAPTER: TypeAdapter[ExportRecord] = TypeAdapter(ExportRecord)
+
+
+async def read_export_batches(
+    lines: AsyncIterable[bytes | str] | Iterable[bytes | str], batch_size: int
+) -> AsyncIterator[list[ExportRecord]]:
+    """Parse NDJSON export lines into validated records, `batch_size` at a time."""
+    batch: list[ExportRecord] = []
+
+    def add(line: bytes | str) -> None:
+        if line.strip():
+            batch.append(_EXPORT_RECORD_ADAPTER.validate_json(line))
+
+    if isinstance(lines, AsyncIterable):
+        async for line in lines:
+            add(line)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    else:
+        for line in lines:
+            add(line)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class UnitOfWork(Generic[TContext]):
+    """Writes made while streaming one turn, held until `commit`.
+
+    Pending items are kept by ID, so replacing an item overwrites its pending
+    write, and removing an item that was added in the same batch drops it
+    without touching the store. `commit` hands the pending writes to
+    `Store.commit_unit_of_work` and starts a new batch; `rollback` discards them.
+    """
+
+    def __init__(self, store: "Store[TContext]", thread_id: str, context: TContext):
+        self.store = store
+        self.thread_id = thread_id
+        self.context = context
+        self.items: dict[str, ThreadItem] = {}
+        self.added_item_ids: set[str] = set()
+        self.deleted_item_ids: list[str] = []
+        self.thread: ThreadMetadata | None = None
+
+    @property
+    def pending(self) -> bool:
+        return bool(self.items or self.deleted_item_ids or self.thread)
+
+    def add_item(self, item: ThreadItem) -> None:
+        if item.id in self.deleted_item_ids:
+            # Still stored, so overwrite it instead of deleting it.
+            self.deleted_item_ids.remove(item.id)
+        else:
+            self.added_item_ids.add(item.id)
+        self.items[item.id] = item
+
+    def save_item(self, item: ThreadItem) -> None:
+        if item.id in self.deleted_item_ids:
+            self.deleted_item_ids.remove(item.id)
+        self.items[item.id] = item
+
+    def delete_item(self, item_id: str) -> None:
+        self.items.pop(item_id, None)
+        if item_id in self.added_item_ids:
+            self.added_item_ids.discard(item_id)
+        else:
+            self.deleted_item_ids.append(item_id)
+
+    def save_thread(self, thread: ThreadMetadata) -> None:
+        self.thread = thread.model_copy(deep=True)
+
+    async def commit(self) -> None:
+        if self.pending:
+            await self.store.commit_unit_of_work(self)
+        self.rollback()
+
+    def rollback(self) -> None:
+        self.items = {}
+        self.added_item_ids = set()
+        self.deleted_item_ids = []
+        self.thread = None
+
+
+def _matches_item_filter(
+    item: ThreadItem,
+    types: Collection[str] | None,
+    exclude_types: Collection[str] | None,
+    status: str | None,
+) -> bool:
+    if types is not None and item.type not in types:
+        return False
+    if exclude_types is not None and item.type in exclude_types:
+        return False
+    return status is None or getattr(item, "status", None) == status
+
+
 class AttachmentStore(ABC, Generic[TContext]):
     @abstractmethod
     async def delete_attachment(self, attachment_id: str, context: TContext) -> None:
@@ -88,6 +307,59 @@ class Store(ABC, Generic[TContext]):
     ) -> Page[ThreadItem]:
         pass
 
+    async def load_thread_items_filtered(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+        *,
+        types: Collection[str] | None = None,
+        exclude_types: Collection[str] | None = None,
+        status: str | None = None,
+    ) -> Page[ThreadItem]:
+        """Load a page of thread items matching the given type and status filters.
+
+        `types` keeps only items whose `type` is listed, `exclude_types` drops items
+        whose `type` is listed, and `status` keeps only items with that `status`
+        (client tool calls). The default implementation filters a single page from
+        `load_thread_items` in Python, so pages may come back short; override it to
+        filter in the database and return full pages.
+        """
+        page = await self.load_thread_items(thread_id, after, limit, order, context)
+        page.data = [
+            item
+            for item in page.data
+            if _matches_item_filter(item, types, exclude_types, status)
+        ]
+        return page
+
+    async def load_raw_thread_items(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+        *,
+        exclude_types: Collection[str] | None = None,
+    ) -> Page[RawThreadItem]:
+        """Load a page of thread items as serialized JSON, skipping `exclude_types`.
+
+        Used by list endpoints that only forward items to the client. The default
+        implementation serializes the result of `load_thread_items_filtered`;
+        override it to return stored JSON directly and skip model validation.
+        """
+        items = await self.load_thread_items_filtered(
+            thread_id, after, limit, order, context, exclude_types=exclude_types
+        )
+        return Page(
+            data=[RawThreadItem.from_item(item) for item in items.data],
+            has_more=items.has_more,
+            after=items.after,
+        )
+
     @abstractmethod
     async def save_attachment(self, attachment: Attachment, context: TContext) -> None:
         pass
@@ -139,3 +411,80 @@ class Store(ABC, Generic[TContext]):
         self, thread_id: str, item_id: str, context: TContext
     ) -> None:
         pass
+
+    def begin_unit_of_work(
+        self, thread_id: str, context: TContext
+    ) -> UnitOfWork[TContext]:
+        """Start collecting the writes of a streamed turn on `thread_id`."""
+        return UnitOfWork(self, thread_id, context)
+
+    async def commit_unit_of_work(self, unit: UnitOfWork[TContext]) -> None:
+        """Apply a unit of work's pending item writes, deletions and thread save.
+
+        The default implementation calls `add_thread_item` (for items in
+        `unit.added_item_ids`) or `save_item`, then `delete_thread_item` and
+        `save_thread`; override it to apply them in one transaction.
+        """
+        for item in unit.items.values():
+            if item.id in unit.added_item_ids:
+                await self.add_thread_item(unit.thread_id, item, unit.context)
+            else:
+                await self.save_item(unit.thread_id, item, unit.context)
+        for item_id in unit.deleted_item_ids:
+            await self.delete_thread_item(unit.thread_id, item_id, unit.context)
+        if unit.thread is not None:
+            await self.save_thread(unit.thread, unit.context)
+
+    async def export_ndjson(
+        self, context: TContext, *, batch_size: int = 500
+    ) -> AsyncIterator[bytes]:
+        """Stream the context's threads and their items as NDJSON lines.
+
+        Each thread line is followed by the lines of its items in ascending order
+        (see `ThreadRecord` and `ItemRecord`). The default implementation pages
+        through `load_threads` and `load_thread_items`; override it to stream
+        rows from the database with a cursor.
+        """
+        after: str | None = None
+        while True:
+            threads = await self.load_threads(batch_size, after, "asc", context)
+            for thread in threads.data:
+                yield ThreadRecord(thread=thread).model_dump_json().encode() + b"\n"
+                items_after: str | None = None
+                while True:
+                    items = await self.load_thread_items(
+                        thread.id, items_after, batch_size, "asc", context
+                    )
+                    for item in items.data:
+                        record = ItemRecord(thread_id=thread.id, item=item)
+                        yield record.model_dump_json().encode() + b"\n"
+                    if not items.has_more:
+                        break
+                    items_after = items.after
+            if not threads.has_more:
+                return
+            after = threads.after
+
+    async def import_ndjson(
+        self,
+        lines: AsyncIterable[bytes | str] | Iterable[bytes | str],
+        context: TContext,
+        *,
+        batch_size: int = 500,
+    ) -> int:
+        """Import lines written by `export_ndjson` and return the record count.
+
+        Records are validated and stored for the context's user; existing threads
+        and items with the same IDs are overwritten. The default implementation
+        calls `save_thread` and `save_item` per record; override it to write
+        batches of `batch_size` records at once.
+        """
+        count = 0
+        async for batch in read_export_batches(lines, batch_size):
+            for record in batch:
+                if isinstance(record, ThreadRecord):
+                    await self.save_thread(record.thread, context)
+                else:
+                    await self.save_item(record.thread_id, record.item, context)
+            count += len(batch)
+        return count
@@ -0,0 +1,378 @@
+"""Run a blocking store on a thread pool so it doesn't stall the event loop."""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Collection,
+    Iterable,
+)
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+from .logger import logger
+from .store import RawThreadItem, Store, StoreItemType, TContext, UnitOfWork
+from .types import Attachment, Page, ThreadItem, ThreadMetadata
+
+T = TypeVar("T")
+
+_Call = tuple[Callable[[], Awaitable[Any]], Future, float]
+
+
+@dataclass
+class ThreadPoolStoreStats:
+    calls: int = 0
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    run_time_total: float = 0.0
+    loop_lag_last: float = 0.0
+    loop_lag_max: float = 0.0
+
+
+class ThreadPoolStore(Store[TContext]):
+    """Wrap a store whose async methods block, running its calls on worker threads.
+
+    Meant for stores such as PostgresStore that use a synchronous driver inside
+    `async def` methods. Each call runs on one of `max_workers` threads, in an
+    event loop owned by that thread, so the wrapped store must not rely on the
+    caller's loop. Calls for the same thread (or attachment) run one at a time,
+    in the order they were made; other calls run concurrently. Make sure the
+    wrapped store can serve `max_workers` calls at once, e.g. with a connection
+    pool at least that large. An export holds a worker until it finishes.
+
+    `stats` records per-call queueing and run times. While calls are being
+    made, a task also samples the event loop's scheduling lag every
+    `lag_interval` seconds and logs a warning above `lag_warning`; pass
+    `lag_interval=None` to turn it off. Call `close()` on shutdown.
+    """
+
+    def __init__(
+        self,
+        store: Store[TContext],
+        *,
+        max_workers: int = 8,
+        lag_interval: float | None = 0.5,
+        lag_warning: float = 0.1,
+    ):
+        self.store = store
+        self.stats = ThreadPoolStoreStats()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="store"
+        )
+        self._lag_interval = lag_interval
+        self._lag_warning = lag_warning
+        self._lag_task: asyncio.Task | None = None
+        # Calls waiting behind a running call with the same key.
+        self._queues: dict[str, deque[_Call]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._loops: list[asyncio.AbstractEventLoop] = []
+
+    def close(self) -> None:
+        task = self._lag_task
+        if task is not None and not task.get_loop().is_closed():
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            loops, self._loops = self._loops, []
+        for loop in loops:
+            loop.close()
+
+    # Scheduling
+
+    async def _call(self, key: str | None, call: Callable[[], Awaitable[T]]) -> T:
+        self._watch_loop_lag()
+        future: Future = Future()
+        queued = (call, future, time.perf_counter())
+        if key is None:
+            self._executor.submit(self._run, queued)
+        else:
+            with self._lock:
+                queue = self._queues.get(key)
+                if queue is None:
+                    self._queues[key] = deque([queued])
+                else:
+                    queue.append(queued)
+            if queue is None:
+                self._executor.submit(self._drain, key)
+        return await asyncio.wrap_future(future)
+
+    def _drain(self, key: str) -> None:
+        while True:
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                queued = queue.popleft()
+            self._run(queued)
+
+    def _run(self, queued: _Call) -> None:
+        call, future, submitted_at = queued
+        # Skips calls whose caller was cancelled before they started.
+        if not future.set_running_or_notify_cancel():
+            return
+        loop = getattr(self._local, "loop", None)
+        if loop is None:
+            loop = self._local.loop = asyncio.new_event_loop()
+            with self._lock:
+                self._loops.append(loop)
+        started_at = time.perf_counter()
+        try:
+            future.set_result(loop.run_until_complete(call()))
+        except BaseException as e:
+            future.set_exception(e)
+        finished_at = time.perf_counter()
+        with self._lock:
+            stats = self.stats
+            stats.calls += 1
+            stats.queue_wait_total += started_at - submitted_at
+            stats.queue_wait_max = max(stats.queue_wait_max, started_at - submitted_at)
+            stats.run_time_total += finished_at - started_at
+
+    def _watch_loop_lag(self) -> None:
+        if self._lag_interval is None:
+            return
+        loop = asyncio.get_running_loop()
+        task = self._lag_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._lag_task = loop.create_task(self._sample_loop_lag(self._lag_interval))
+
+    async def _sample_loop_lag(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(loop.time() - start - interval, 0.0)
+            self.stats.loop_lag_last = lag
+            self.stats.loop_lag_max = max(self.stats.loop_lag_max, lag)
+            if lag > self._lag_warning:
+                logger.warning(f"Event loop lagged {lag * 1000:.0f} ms")
+
+    # IDs
+
+    def generate_thread_id(self, context: TContext) -> str:
+        return self.store.generate_thread_id(context)
+
+    def generate_item_id(
+        self, item_type: StoreItemType, thread: ThreadMetadata, context: TContext
+    ) -> str:
+        return self.store.generate_item_id(item_type, thread, context)
+
+    # Threads
+
+    async def load_thread(self, thread_id: str, context: TContext) -> ThreadMetadata:
+        return await self._call(
+            thread_id, lambda: self.store.load_thread(thread_id, context)
+        )
+
+    async def save_thread(self, thread: ThreadMetadata, context: TContext) -> None:
+        await self._call(thread.id, lambda: self.store.save_thread(thread, context))
+
+    async def load_threads(
+        self,
+        limit: int,
+        after: str | None,
+        order: str,
+        context: TContext,
+    ) -> Page[ThreadMetadata]:
+        return await self._call(
+            None, lambda: self.store.load_threads(limit, after, order, context)
+        )
+
+    async def delete_thread(self, thread_id: str, context: TContext) -> None:
+        await self._call(
+            thread_id, lambda: self.store.delete_thread(thread_id, context)
+        )
+
+    # Items
+
+    async def load_thread_items(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+    ) -> Page[ThreadItem]:
+        return await self._call(
+            thread_id,
+            lambda: self.store.load_thread_items(
+                thread_id, after, limit, order, context
+            ),
+        )
+
+    async def load_thread_items_filtered(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+        *,
+        types: Collection[str] | None = None,
+        exclude_types: Collection[str] | None = None,
+        status: str | None = None,
+    ) -> Page[ThreadItem]:
+        return await self._call(
+            thread_id,
+            lambda: self.store.load_thread_items_filtered(
+                thread_id,
+                after,
+                limit,
+                order,
+                context,
+                types=types,
+                exclude_types=exclude_types,
+                status=status,
+            ),
+        )
+
+    async def load_raw_thread_items(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: TContext,
+        *,
+        exclude_types: Collection[str] | None = None,
+    ) -> Page[RawThreadItem]:
+        return await self._call(
+            thread_id,
+            lambda: self.store.load_raw_thread_items(
+                thread_id, after, limit, order, context, exclude_types=exclude_types
+            ),
+        )
+
+    async def load_item(
+        self, thread_id: str, item_id: str, context: TContext
+    ) -> ThreadItem:
+        return await self._call(
+            thread_id, lambda: self.store.load_item(thread_id, item_id, context)
+        )
+
+    async def add_thread_item(
+        self, thread_id: str, item: ThreadItem, context: TContext
+    ) -> None:
+        await self._call(
+            thread_id, lambda: self.store.add_thread_item(thread_id, item, context)
+        )
+
+    async def save_item(
+        self, thread_id: str, item: ThreadItem, context: TContext
+    ) -> None:
+        await self._call(
+            thread_id, lambda: self.store.save_item(thread_id, item, context)
+        )
+
+    async def delete_thread_item(
+        self, thread_id: str, item_id: str, context: TContext
+    ) -> None:
+        await self._call(
+            thread_id,
+            lambda: self.store.delete_thread_item(thread_id, item_id, context),
+        )
+
+    async def commit_unit_of_work(self, unit: UnitOfWork[TContext]) -> None:
+        await self._call(unit.thread_id, lambda: self.store.commit_unit_of_work(unit))
+
+    # Attachments
+
+    async def save_attachment(self, attachment: Attachment, context: TContext) -> None:
+        await self._call(
+            attachment.id, lambda: self.store.save_attachment(attachment, context)
+        )
+
+    async def load_attachment(
+        self, attachment_id: str, context: TContext
+    ) -> Attachment:
+        return await self._call(
+            attachment_id, lambda: self.store.load_attachment(attachment_id, context)
+        )
+
+    async def delete_attachment(self, attachment_id: str, context: TContext) -> None:
+        await self._call(
+            attachment_id,
+            lambda: self.store.delete_attachment(attachment_id, context),
+        )
+
+    # Bulk export and import
+
+    async def export_ndjson(
+        self, context: TContext, *, batch_size: int = 500
+    ) -> AsyncIterator[bytes]:
+        # The wrapped export may hold thread-bound resources such as a cursor, so
+        # it runs on one worker from start to finish and hands lines over through
+        # a bounded queue.
+        caller = asyncio.get_running_loop()
+        lines: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=max(batch_size, 1))
+        stopped = threading.Event()
+
+        def hand_over(line: bytes | None) -> None:
+            asyncio.run_coroutine_threadsafe(lines.put(line), caller).result()
+
+        async def pump() -> None:
+            source = self.store.export_ndjson(context, batch_size=batch_size)
+            try:
+                async for line in source:
+                    if stopped.is_set():
+                        break
+                    hand_over(line)
+            finally:
+                await source.aclose()
+                if not stopped.is_set():
+                    hand_over(None)
+
+        done = asyncio.ensure_future(self._call(None, pump))
+        try:
+            while (line := await lines.get()) is not None:
+                yield line
+            await done
+        finally:
+            # Unblocks the worker if the caller stopped reading early.
+            stopped.set()
+            while not lines.empty():
+                lines.get_nowait()
+            await asyncio.gather(done, return_exceptions=True)
+
+    async def import_ndjson(
+        self,
+        lines: AsyncIterable[bytes | str] | Iterable[bytes | str],
+        context: TContext,
+        *,
+        batch_size: int = 500,
+    ) -> int:
+        # The lines may come from the caller's loop, so read them here and hand
+        # the wrapped store one batch at a time.
+        count = 0
+        batch: list[bytes | str] = []
+        if isinstance(lines, AsyncIterable):
+            async for line in lines:
+                batch.append(line)
+                if len(batch) >= batch_size:
+                    count += await self._import_batch(batch, context, batch_size)
+                    batch = []
+        else:
+            for line in lines:
+                batch.append(line)
+                if len(batch) >= batch_size:
+                    count += await self._import_batch(batch, context, batch_size)
+                    batch = []
+        if batch:
+            count += await self._import_batch(batch, context, batch_size)
+        return count
+
+    async def _import_batch(
+        self, batch: list[bytes | str], context: TContext, batch_size: int
+    ) -> int:
+        return await self._call(
+            None,
+            lambda: self.store.import_ndjson(batch, context, batch_size=batch_size),
+        )
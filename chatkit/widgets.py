@@ -1104,3 +1104,93 @@ WidgetIcon = Literal[
     "write-alt2",
 ]
 """Icon names accepted by widgets that render icons."""
+
+
+def _status_text(status: WidgetStatus | None) -> str | None:
+    return status["text"] if status else None
+
+
+def _chart_summary(chart: Chart) -> str:
+    x_key = chart.xAxis if isinstance(chart.xAxis, str) else chart.xAxis["dataKey"]
+    series = ", ".join(s.label or s.dataKey for s in chart.series)
+    summary = f"Chart of {series} by {x_key} ({len(chart.data)} points)"
+    if chart.data:
+        first, last = chart.data[0].get(x_key), chart.data[-1].get(x_key)
+        summary += f", from {first} to {last}"
+    return summary
+
+
+def _field_text(name: str, value: str | None) -> str:
+    return f"{name}: {value}" if value else name
+
+
+def _widget_text_lines(component: WidgetComponentBase) -> list[str]:
+    """Collect the user-visible text of a widget subtree, one entry per line."""
+    match component:
+        case Text() | Title() | Caption() | Markdown() | Label():
+            return [component.value] if component.value else []
+        case Badge():
+            return [f"[{component.label}]"]
+        case Button():
+            return [f"[Button: {component.label}]"] if component.label else []
+        case Image():
+            return [f"[Image: {component.alt}]"] if component.alt else []
+        case Chart():
+            return [_chart_summary(component)]
+        case Select() | RadioGroup():
+            options = ", ".join(o["label"] for o in component.options or [])
+            return [f"{component.name}: {options}"] if options else []
+        case Checkbox():
+            return [f"[ ] {component.label or component.name}"]
+        case Input() | Textarea():
+            return [_field_text(component.name, component.defaultValue)]
+        case DatePicker():
+            value = (
+                component.defaultValue.isoformat() if component.defaultValue else None
+            )
+            return [_field_text(component.name, value)]
+        case ListViewItem():
+            row = " ".join(
+                line
+                for child in component.children
+                for line in _widget_text_lines(child)
+            )
+            return [f"- {row}"] if row else []
+        case Row():
+            row = " ".join(
+                line
+                for child in component.children or []
+                for line in _widget_text_lines(child)
+            )
+            return [row] if row else []
+        case Transition():
+            return _widget_text_lines(component.children) if component.children else []
+        case _:
+            pass
+
+    lines: list[str] = []
+    status = _status_text(getattr(component, "status", None))
+    if status:
+        lines.append(status)
+    for child in getattr(component, "children", None) or []:
+        lines.extend(_widget_text_lines(child))
+    if isinstance(component, Card):
+        lines.extend(
+            f"[Button: {action['label']}]"
+            for action in (component.confirm, component.cancel)
+            if action
+        )
+    return lines
+
+
+def widget_to_text(widget: WidgetComponentBase, max_chars: int | None = None) -> str:
+    """Render the semantic content of a widget tree as compact plain text.
+
+    Styling, layout and icon props are dropped; titles, text values, list rows,
+    form fields and chart summaries are kept. The result is truncated to
+    ``max_chars`` characters when provided.
+    """
+    text = "\n".join(_widget_text_lines(widget))
+    if max_chars is not None and len(text) > max_chars:
+        text = text[: max(max_chars - 1, 0)] + "…"
+    return text
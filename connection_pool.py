@@ -0,0 +1,75 @@
+"""
+A small pool of reusable psycopg connections, for the primary and for replicas.
+"""
+
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import psycopg
+from psycopg.pq import TransactionStatus
+
+
+class ConnectionPool:
+    """Keeps up to `max_idle` open connections for reuse across store calls.
+
+    Reusing connections saves the connect/auth handshake on every call and lets
+    statements prepared on a connection be executed again without re-parsing.
+    """
+
+    def __init__(
+        self,
+        conninfo: str,
+        max_idle: int,
+        prepare_threshold: int | None,
+        connect_timeout: int | None = None,
+    ):
+        self.conninfo = conninfo
+        self._max_idle = max_idle
+        self._prepare_threshold = prepare_threshold
+        self._connect_timeout = connect_timeout
+        self._idle: list[psycopg.Connection] = []
+        self._lock = threading.Lock()
+
+    def checkout(self) -> psycopg.Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        kwargs = {}
+        if self._connect_timeout is not None:
+            kwargs["connect_timeout"] = self._connect_timeout
+        return psycopg.connect(
+            self.conninfo,
+            autocommit=True,
+            prepare_threshold=self._prepare_threshold,
+            **kwargs,
+        )
+
+    def checkin(self, conn: psycopg.Connection) -> None:
+        if not conn.closed and not conn.broken:
+            if conn.info.transaction_status != TransactionStatus.IDLE:
+                # Only reached when a call failed partway through a transaction.
+                try:
+                    conn.rollback()
+                except psycopg.Error:
+                    conn.close()
+                    return
+            with self._lock:
+                if len(self._idle) < self._max_idle:
+                    self._idle.append(conn)
+                    return
+        conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[psycopg.Connection]:
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
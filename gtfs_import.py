@@ -0,0 +1,274 @@
+"""
+Streaming GTFS importer for the BTS timetable.
+
+Reads `calendar.txt`, `trips.txt`, `stops.txt` and `stop_times.txt` one row at
+a time into compact array-backed tables: each stop_times row becomes four
+machine integers instead of a dict of strings, and no file is held in memory,
+so a large `stop_times.txt` doesn't spike worker memory.
+
+While reading, each route gets a fingerprint over its trips and stop times.
+`GtfsImporter.refresh()` compares them with the previous import and hands the
+timetable only the routes that were added, changed or removed, so a feed
+update that touches one route re-indexes that route's departure boards and
+leaves the rest alone. Stops are matched to network stations by `stop_code`,
+falling back to `stop_id`.
+
+Point BTS_GTFS_DIR at a feed directory to use it instead of the generated
+timetable, and BTS_GTFS_REFRESH_SECONDS to poll it for changes.
+"""
+
+import asyncio
+import csv
+import logging
+import zlib
+from array import array
+from collections.abc import Collection, Iterator, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from bts_network import NETWORK, Network
+from timetable import Timetable, Trip, parse_time
+
+logger = logging.getLogger(__name__)
+
+_DAY_BITS = {"weekday": 1, "saturday": 2, "sunday": 4}
+_WEEKDAY_COLUMNS = ("monday", "tuesday", "wednesday", "thursday", "friday")
+_FILES = ("calendar.txt", "trips.txt", "stops.txt", "stop_times.txt")
+
+
+@dataclass
+class GtfsTables:
+    """A feed reduced to integer columns, with string IDs interned once."""
+
+    route_ids: list[str] = field(default_factory=list)
+    stop_codes: list[str] = field(default_factory=list)
+    trip_ids: list[str] = field(default_factory=list)
+    # Per trip: route index and a bit mask of day types.
+    trip_route: array = field(default_factory=lambda: array("i"))
+    trip_days: array = field(default_factory=lambda: array("b"))
+    # Per stop_times row.
+    stop_trip: array = field(default_factory=lambda: array("i"))
+    stop_index: array = field(default_factory=lambda: array("i"))
+    stop_sequence: array = field(default_factory=lambda: array("i"))
+    stop_seconds: array = field(default_factory=lambda: array("i"))
+    # Order-independent checksum of each route's rows, by route ID.
+    fingerprints: dict[str, int] = field(default_factory=dict)
+
+    def trips(
+        self, network: Network, routes: Collection[str] | None = None
+    ) -> Iterator[Trip]:
+        """Rebuild trips, optionally only those of `routes`, in trip order."""
+        trip = np.frombuffer(self.stop_trip, dtype=np.int32)
+        if not len(trip):
+            return
+        rows = np.arange(len(trip))
+        if routes is not None:
+            wanted = np.isin(
+                np.frombuffer(self.trip_route, dtype=np.int32)[trip],
+                [i for i, route in enumerate(self.route_ids) if route in routes],
+            )
+            rows = np.flatnonzero(wanted)
+        sequence = np.frombuffer(self.stop_sequence, dtype=np.int32)
+        rows = rows[np.lexsort((sequence[rows], trip[rows]))]
+        stops = np.frombuffer(self.stop_index, dtype=np.int32)[rows]
+        seconds = np.frombuffer(self.stop_seconds, dtype=np.int32)[rows]
+        starts = np.flatnonzero(np.diff(trip[rows], prepend=-1))
+        for start, end in zip(starts, [*starts[1:], len(rows)]):
+            t = int(trip[rows[start]])
+            codes = [self.stop_codes[i] for i in stops[start:end]]
+            days = frozenset(
+                d for d, bit in _DAY_BITS.items() if self.trip_days[t] & bit
+            )
+            line = _line_serving(network, codes)
+            if line is None or not days or end - start < 2:
+                logger.warning(
+                    f"Skipping GTFS trip {self.trip_ids[t]}: no line or service"
+                )
+                continue
+            yield Trip(
+                line=line,
+                day_types=days,
+                stops=tuple(zip(codes, seconds[start:end].tolist())),
+                route=self.route_ids[self.trip_route[t]],
+            )
+
+
+def read_feed(directory: str | Path) -> GtfsTables:
+    directory = Path(directory)
+    tables = GtfsTables()
+    fingerprints = tables.fingerprints
+
+    services: dict[str, int] = {}
+    for service_id, *flags in _rows(
+        directory / "calendar.txt",
+        ("service_id", *_WEEKDAY_COLUMNS, "saturday", "sunday"),
+    ):
+        bits = _DAY_BITS["weekday"] if "1" in flags[:5] else 0
+        bits |= _DAY_BITS["saturday"] if flags[5] == "1" else 0
+        bits |= _DAY_BITS["sunday"] if flags[6] == "1" else 0
+        services[service_id] = bits
+
+    routes: dict[str, int] = {}
+    trips: dict[str, int] = {}
+    for route_id, service_id, trip_id in _rows(
+        directory / "trips.txt", ("route_id", "service_id", "trip_id")
+    ):
+        route = routes.get(route_id)
+        if route is None:
+            route = routes[route_id] = len(tables.route_ids)
+            tables.route_ids.append(route_id)
+        trips[trip_id] = len(tables.trip_ids)
+        tables.trip_ids.append(trip_id)
+        tables.trip_route.append(route)
+        days = services.get(service_id, 0)
+        tables.trip_days.append(days)
+        _mix(fingerprints, route_id, f"{trip_id}\x1f{days}")
+
+    stops: dict[str, int] = {}
+    for stop_id, stop_code in _rows(
+        directory / "stops.txt", ("stop_id", "stop_code"), optional=("stop_code",)
+    ):
+        stops[stop_id] = len(tables.stop_codes)
+        tables.stop_codes.append(stop_code or stop_id)
+
+    skipped = 0
+    for row in _rows(
+        directory / "stop_times.txt",
+        ("trip_id", "stop_id", "stop_sequence", "departure_time", "arrival_time"),
+    ):
+        trip_id, stop_id, sequence, departure, arrival = row
+        trip = trips.get(trip_id)
+        stop = stops.get(stop_id)
+        if trip is None or stop is None:
+            skipped += 1
+            continue
+        tables.stop_trip.append(trip)
+        tables.stop_index.append(stop)
+        tables.stop_sequence.append(int(sequence))
+        tables.stop_seconds.append(parse_time(departure or arrival))
+        # Include the station so remapping a stop changes the routes using it.
+        route_id = tables.route_ids[tables.trip_route[trip]]
+        _mix(fingerprints, route_id, "\x1f".join([*row, tables.stop_codes[stop]]))
+    if skipped:
+        logger.warning(f"Skipped {skipped} stop_times rows with unknown trip or stop")
+    return tables
+
+
+@dataclass
+class ImportResult:
+    changed_routes: list[str]
+    boards_rebuilt: int
+    stop_times: int
+
+
+class GtfsImporter:
+    """Keeps a timetable in step with a GTFS directory.
+
+    The first `refresh()` builds `timetable`; later ones update that same
+    object in place, re-indexing only routes whose fingerprint changed, and
+    do nothing at all while the files are unchanged on disk.
+    """
+
+    def __init__(self, directory: str | Path, network: Network = NETWORK):
+        self.directory = Path(directory)
+        self.network = network
+        self.timetable: Timetable | None = None
+        self._fingerprints: dict[str, int] = {}
+        self._stamp: tuple | None = None
+
+    def load(self) -> GtfsTables | None:
+        """Read the feed, or return None if no file changed since the last read.
+
+        Safe to run on a worker thread; it doesn't touch the timetable.
+        """
+        stamp = tuple(
+            (s.st_mtime_ns, s.st_size)
+            for s in (self.directory.joinpath(name).stat() for name in _FILES)
+        )
+        if stamp == self._stamp:
+            return None
+        tables = read_feed(self.directory)
+        self._stamp = stamp
+        return tables
+
+    def apply(self, tables: GtfsTables) -> ImportResult:
+        old, new = self._fingerprints, tables.fingerprints
+        if self.timetable is None:
+            self.timetable = Timetable(self.network, tables.trips(self.network))
+            changed = sorted(new)
+            rebuilt = self.timetable.board_count
+        else:
+            changed = sorted(r for r in {*old, *new} if old.get(r) != new.get(r))
+            rebuilt = 0
+            if changed:
+                rebuilt = self.timetable.replace_sources(
+                    changed, tables.trips(self.network, changed)
+                )
+        self._fingerprints = new
+        logger.info(
+            f"Imported GTFS feed: {len(changed)} of {len(new)} routes changed, "
+            f"{rebuilt} departure boards rebuilt"
+        )
+        return ImportResult(
+            changed_routes=changed,
+            boards_rebuilt=rebuilt,
+            stop_times=len(tables.stop_trip),
+        )
+
+    def refresh(self) -> ImportResult | None:
+        tables = self.load()
+        return None if tables is None else self.apply(tables)
+
+    def build(self) -> Timetable:
+        """Import the feed and return the timetable that refreshes will update."""
+        if self.timetable is None:
+            self.refresh()
+        assert self.timetable is not None
+        return self.timetable
+
+    async def watch(self, interval: float) -> None:
+        """Refresh every `interval` seconds, parsing the feed off the event loop."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                tables = await asyncio.to_thread(self.load)
+                if tables is not None:
+                    self.apply(tables)
+            except Exception as e:
+                logger.error(f"GTFS refresh from {self.directory} failed: {e}")
+
+
+def _mix(fingerprints: dict[str, int], route_id: str, row: str) -> None:
+    # A sum of row checksums doesn't depend on row order, so a feed that is
+    # merely re-sorted doesn't count as changed.
+    digest = zlib.crc32(row.encode()) | (zlib.adler32(row.encode()) << 32)
+    fingerprints[route_id] = (fingerprints.get(route_id, 0) + digest) & (2**64 - 1)
+
+
+def _rows(
+    path: Path, columns: Sequence[str], optional: Collection[str] = ()
+) -> Iterator[list[str]]:
+    """Yield the given columns of each row; missing optional columns are ''."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader, [])]
+        indices = []
+        for column in columns:
+            if column in header:
+                indices.append(header.index(column))
+            elif column in optional:
+                indices.append(None)
+            else:
+                raise ValueError(f"{path.name} has no {column} column")
+        for row in reader:
+            if row:
+                yield [row[i].strip() if i is not None else "" for i in indices]
+
+
+def _line_serving(network: Network, codes: Sequence[str]) -> str | None:
+    for line in network.lines.values():
+        if all(code in line.stations for code in codes):
+            return line.id
+    return None
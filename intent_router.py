@@ -0,0 +1,383 @@
+"""
+Answer simple BTS questions locally, before they reach the model.
+
+`IntentRouter.answer()` classifies a message with keyword patterns and the
+station resolver. When it is confident the message is one of a few simple
+questions about named stations, it answers from the route planner, fare
+matrices or timetable and returns a widget with a plain-text copy:
+
+- route: "How do I get from Mo Chit to Saphan Taksin?"
+- fare: "How much is it from Asok to Siam?"
+- first_last: "First train at Asok?", "Last train from Mo Chit to Bang Wa"
+- next_train: "Next train from Siam to Mo Chit"
+- frequency: "How often do trains run from Siam to On Nut?"
+
+Anything else falls through to the agent: messages naming the wrong number of
+stations, matching more than one kind of question, mentioning another time
+or day, asking about accessibility or disruptions, about a line with a
+current disruption, written in Thai (answers here are English only) or
+longer than a short question. A message must also be just the question:
+once the station names are removed, every word left has to be one the kind
+of question is asked with, so "How much time from Siam to Mo Chit?" or
+"Is the first train from Siam to Asok crowded?" go to the agent. Falling
+through is always safe, so the rules err towards it.
+
+`stats` counts messages, fast-path answers by intent and fall-through
+reasons, and the time spent classifying and answering.
+"""
+
+import logging
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+from bts_matrices import TravelMatrices
+from bts_network import NETWORK, Network
+from chatkit.widgets import Caption, Card, Text, Title
+from service_status import ServiceStatus
+from station_resolver import RESOLVER, Mention, StationResolver
+from timetable import Timetable, service_day
+
+logger = logging.getLogger(__name__)
+
+MAX_LENGTH = 160
+
+_INTENTS = {
+    "first_last": re.compile(
+        r"\b(first|last|earliest|latest)\s+(train|bts|skytrain)\b"
+    ),
+    "next_train": re.compile(r"\bnext\s+(train|bts|skytrain|departure)s?\b"),
+    "frequency": re.compile(
+        r"\bhow\s+often\b|\bfrequen|\bheadway|\bevery\s+how\s+many\b"
+    ),
+    "fare": re.compile(r"\b(fare|fares|price|cost|costs|how\s+much|baht|ticket)\b"),
+    "route": re.compile(
+        r"\bhow\s+(do|can|should)\s+i\s+(get|go|travel)\b|\bhow\s+to\s+(get|go)\b"
+        r"|\b(route|directions?|way)\s+(from|to)\b|\bfrom\b.+\bto\b"
+    ),
+}
+
+# Questions the local data can't answer even when a pattern matches.
+_BLOCKERS = re.compile(
+    r"\b(why|tomorrow|tonight|yesterday|monday|tuesday|wednesday|thursday|friday"
+    r"|saturday|sunday|weekend|holiday|elevator|elevators|lift|wheelchair|"
+    r"accessib\w*|escalator|delay\w*|disrupt\w*|closed|status|mrt|arl|airport|"
+    r"bus|boat|taxi|walk\w*)\b"
+    r"|\d{1,2}(:\d{2})?\s*(am|pm)\b|\b\d{1,2}:\d{2}\b"
+)
+_THAI = re.compile(r"[฀-๿]")
+_FROM = re.compile(r"\bfrom\b")
+_WORD = re.compile(r"[a-z]+")
+
+# Words that can appear in any of the questions without changing the answer.
+_FILLER = frozenset(
+    """a an and at bts can could do does for from get i in is it me of please s
+    skytrain station the there to train trains we what whats""".split()
+)
+# The words each kind of question is asked with. Any other word means the
+# message asks something else as well, so it goes to the agent.
+_VOCABULARY = {
+    "route": frozenset(
+        """best direction directions go how route should take travel way
+        which""".split()
+    ),
+    "fare": frozenset(
+        """baht cost costs fare fares how much price ticket tickets""".split()
+    ),
+    "first_last": frozenset(
+        """depart departs earliest first last latest leave leaves time times
+        when""".split()
+    ),
+    "next_train": frozenset(
+        """departure departures depart departs due leave leaves next time
+        when""".split()
+    ),
+    "frequency": frozenset(
+        """come every frequency frequent frequently headway headways how many
+        minutes often run runs""".split()
+    ),
+}
+
+_STATION_COUNTS = {
+    "route": (2,),
+    "fare": (2,),
+    "first_last": (1, 2),
+    "next_train": (1, 2),
+    "frequency": (2,),
+}
+
+
+def intent_kinds(text: str) -> list[str]:
+    """The kinds of question that lowercase `text` looks like."""
+    kinds = [kind for kind, pattern in _INTENTS.items() if pattern.search(text)]
+    # "from X to Y" alone suggests a route, but not next to a sharper intent.
+    if len(kinds) > 1 and "route" in kinds:
+        kinds.remove("route")
+    return kinds
+
+
+def station_codes(lowered: str, mentions: list[Mention]) -> list[str]:
+    """The distinct stations of `mentions`, with the origin first if there are two.
+
+    "to Y from X" names X as the origin even though Y comes first.
+    """
+    stations: list[str] = []
+    for mention in mentions:
+        if mention.match.code not in stations:
+            stations.append(mention.match.code)
+    if len(stations) == 2:
+        keyword = _FROM.search(lowered)
+        if keyword is not None:
+            after = [m for m in mentions if m.start >= keyword.end()]
+            if after and after[0].match.code == stations[1]:
+                stations.reverse()
+    return stations
+
+
+@dataclass(frozen=True)
+class Intent:
+    kind: str
+    # Station codes, origin first.
+    stations: tuple[str, ...]
+
+
+@dataclass
+class FastAnswer:
+    intent: Intent
+    text: str
+    widget: Card
+
+
+@dataclass
+class IntentRouterStats:
+    messages: int = 0
+    answered: int = 0
+    answered_by_intent: dict[str, int] = field(default_factory=dict)
+    fell_through: dict[str, int] = field(default_factory=dict)
+    # Time spent in answer(): answered messages, then ones passed on.
+    answer_seconds_total: float = 0.0
+    answer_seconds_max: float = 0.0
+    check_seconds_total: float = 0.0
+    # Time the agent took on messages that fell through, as recorded by the
+    # server, for comparison.
+    agent_responses: int = 0
+    agent_seconds_total: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.answered / self.messages if self.messages else 0.0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "hit_rate": round(self.hit_rate, 4)}
+
+
+class IntentRouter:
+    def __init__(
+        self,
+        matrices: TravelMatrices,
+        timetable: Timetable,
+        *,
+        resolver: StationResolver = RESOLVER,
+        network: Network = NETWORK,
+        status: ServiceStatus | None = None,
+    ):
+        self.matrices = matrices
+        self.timetable = timetable
+        self.status = status
+        self.resolver = resolver
+        self.network = network
+        self.stats = IntentRouterStats()
+
+    def classify(self, text: str) -> Intent | str:
+        """The intent of `text`, or the reason it should go to the agent."""
+        if len(text) > MAX_LENGTH:
+            return "too_long"
+        if _THAI.search(text):
+            return "thai"
+        lowered = text.lower()
+        if _BLOCKERS.search(lowered):
+            return "unsupported"
+        kinds = intent_kinds(lowered)
+        if len(kinds) != 1:
+            return "no_intent" if not kinds else "ambiguous"
+        kind = kinds[0]
+
+        mentions = self.resolver.find_in_text(text)
+        stations = station_codes(lowered, mentions)
+        if len(stations) not in _STATION_COUNTS[kind]:
+            return "stations"
+        rest = lowered
+        for mention in sorted(mentions, key=lambda m: m.start, reverse=True):
+            rest = rest[: mention.start] + " " + rest[mention.end :]
+        allowed = _FILLER | _VOCABULARY[kind]
+        if any(word not in allowed for word in _WORD.findall(rest)):
+            return "extra_words"
+        # Scheduled answers would be wrong while a line is disrupted.
+        if self.status is not None and self.status.snapshot.affecting(
+            stations, self.network
+        ):
+            return "disrupted"
+        return Intent(kind=kind, stations=tuple(stations))
+
+    def answer(self, text: str, *, when: datetime | None = None) -> FastAnswer | None:
+        """Answer `text` locally, or return None to hand it to the agent."""
+        start = time.perf_counter()
+        intent = self.classify(text)
+        answer = None
+        if isinstance(intent, Intent):
+            answer = getattr(self, f"_answer_{intent.kind}")(intent, when)
+            reason = "no_service"
+        else:
+            reason = intent
+        elapsed = time.perf_counter() - start
+
+        stats = self.stats
+        stats.messages += 1
+        if answer is None:
+            stats.fell_through[reason] = stats.fell_through.get(reason, 0) + 1
+            stats.check_seconds_total += elapsed
+            return None
+        kind = answer.intent.kind
+        stats.answered += 1
+        stats.answered_by_intent[kind] = stats.answered_by_intent.get(kind, 0) + 1
+        stats.answer_seconds_total += elapsed
+        stats.answer_seconds_max = max(stats.answer_seconds_max, elapsed)
+        logger.debug(f"Answered {kind} locally in {elapsed * 1000:.2f} ms")
+        return answer
+
+    def record_agent_response(self, seconds: float) -> None:
+        self.stats.agent_responses += 1
+        self.stats.agent_seconds_total += seconds
+
+    # Answers
+
+    def _name(self, code: str) -> str:
+        return self.network.name(code)
+
+    def _answer_route(self, intent: Intent, when: datetime | None) -> FastAnswer:
+        origin, destination = intent.stations
+        route = self.network.route(origin, destination)
+        costs = self.matrices.lookup([origin], [destination])
+        steps = []
+        for n, leg in enumerate(route.legs):
+            line = self.network.lines[leg.line].name
+            verb = "Take" if n == 0 else f"Change at {self._name(leg.stations[0])} to"
+            stops = "stop" if leg.stops == 1 else "stops"
+            steps.append(
+                f"{verb} the {line} towards "
+                f"{self._name(leg.towards)}, {leg.stops} {stops} to "
+                f"{self._name(leg.stations[-1])}."
+            )
+        changes = {0: "no changes", 1: "1 change"}.get(
+            route.transfers, f"{route.transfers} changes"
+        )
+        summary = (
+            f"About {round(route.seconds / 60)} min, {changes}, "
+            f"{int(costs.fares[0])} baht."
+        )
+        return self._reply(
+            intent,
+            f"{self._name(origin)} to {self._name(destination)}",
+            steps,
+            summary,
+        )
+
+    def _answer_fare(self, intent: Intent, when: datetime | None) -> FastAnswer:
+        origin, destination = intent.stations
+        costs = self.matrices.lookup([origin], [destination])
+        fare = int(costs.fares[0])
+        line = (
+            f"The fare from {self._name(origin)} to {self._name(destination)} "
+            f"is {fare} baht."
+        )
+        summary = (
+            f"About {round(int(costs.seconds[0]) / 60)} min, "
+            f"{int(costs.hops[0])} stops."
+        )
+        return self._reply(intent, f"{fare} baht", [line], summary)
+
+    def _answer_first_last(
+        self, intent: Intent, when: datetime | None
+    ) -> FastAnswer | None:
+        origin = intent.stations[0]
+        if len(intent.stations) == 2:
+            destinations = [intent.stations[1]]
+        else:
+            # Every direction from the station.
+            destinations = []
+            for line in self.network.lines_at(origin):
+                stations = self.network.lines[line].stations
+                destinations += [t for t in (stations[0], stations[-1]) if t != origin]
+        day = None if when is None else service_day(when)[0]
+        lines = []
+        for destination in destinations:
+            first_last = self.timetable.first_last(origin, destination, day)
+            if first_last is None:
+                continue
+            label = (
+                f"to {self._name(destination)}"
+                if len(intent.stations) == 2
+                else f"towards {self._name(destination)}"
+            )
+            lines.append(
+                f"{label}: first {first_last.first.time:%H:%M}, "
+                f"last {first_last.last.time:%H:%M}"
+            )
+        if not lines:
+            return None
+        return self._reply(
+            intent,
+            f"First and last trains from {self._name(origin)}",
+            [line[0].upper() + line[1:] for line in lines],
+            "Scheduled times for today.",
+        )
+
+    def _answer_next_train(
+        self, intent: Intent, when: datetime | None
+    ) -> FastAnswer | None:
+        origin = intent.stations[0]
+        destination = intent.stations[1] if len(intent.stations) == 2 else None
+        departures = self.timetable.next_departures(
+            origin, destination, when=when, count=3 if destination else 4
+        )
+        if not departures:
+            return None
+        lines = [
+            f"{d.time:%H:%M} {self.network.lines[d.line].name} towards "
+            f"{self._name(d.terminates)}"
+            for d in departures
+        ]
+        title = f"Next trains from {self._name(origin)}"
+        if destination is not None:
+            title += f" to {self._name(destination)}"
+        return self._reply(intent, title, lines, "Scheduled departures.")
+
+    def _answer_frequency(
+        self, intent: Intent, when: datetime | None
+    ) -> FastAnswer | None:
+        origin, destination = intent.stations
+        headway = self.timetable.headway(origin, destination, when=when)
+        if headway is None:
+            return None
+        minutes = round(headway / 60, 1)
+        line = (
+            f"Trains from {self._name(origin)} towards {self._name(destination)} "
+            f"run about every {minutes:g} minutes at this time."
+        )
+        return self._reply(
+            intent, f"Every {minutes:g} min", [line], "From the timetable."
+        )
+
+    def _reply(
+        self, intent: Intent, title: str, lines: list[str], caption: str
+    ) -> FastAnswer:
+        widget = Card(
+            children=[
+                Title(value=title, size="sm"),
+                *(Text(value=line) for line in lines),
+                Caption(value=caption),
+            ]
+        )
+        text = "\n".join([title, *lines, caption])
+        return FastAnswer(intent=intent, text=text, widget=widget)
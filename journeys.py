@@ -0,0 +1,368 @@
+"""
+Multi-criteria journey search over the timetable.
+
+`JourneyPlanner.search()` runs McRAPTOR over the timetable's trip patterns
+and returns, in one pass, the journeys no other journey beats on every
+criterion at once: arrival time, transfers, fare and the number of stations
+without step-free access the rider has to use. Round k of the search rides
+k trains, so the rounds give each transfer count its own set of journeys,
+and a journey only survives if nothing with as few transfers arrives as
+early, costs as little and is as accessible.
+
+Fares are pluggable through `FareModel`. A journey's fare is only known at
+the end, since fares aren't additive, so the search compares fare states:
+one state covers another when no continuation can make it cost more.
+`BtsFares` prices trips as bts_matrices does, so a journey along the
+planned route costs what `trip_costs` reports.
+
+Closed segments (from the service status) stop trains crossing them; delays
+don't shift the timetable.
+"""
+
+import logging
+from collections.abc import Collection, Hashable, Iterable
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Protocol
+
+import numpy as np
+
+from bts_matrices import EMPTY_FARE, FareState, fare_amount, ride_fare
+from bts_network import Network
+from timetable import (
+    MIN_CONNECTION_SECONDS,
+    Pattern,
+    Timetable,
+    day_type,
+    now,
+    service_day,
+)
+
+logger = logging.getLogger(__name__)
+
+# Stations known to lack step-free access from street to platform. None are
+# listed for BTS, so what counts is lifts reported out of service in the
+# status feed (see rerouting.step_free_outages).
+NO_STEP_FREE: frozenset[str] = frozenset()
+
+MAX_TRANSFERS = 3
+
+# Sort keys for each way of choosing between journeys, best first.
+PREFERENCES = {
+    "fastest": lambda j: (j.arrival, j.transfers, j.fare, len(j.no_step_free)),
+    "fewest_transfers": lambda j: (j.transfers, j.arrival, j.fare),
+    "cheapest": lambda j: (j.fare, j.arrival, j.transfers),
+    "step_free": lambda j: (len(j.no_step_free), j.arrival, j.transfers),
+}
+
+
+class FareModel(Protocol):
+    """How a fare builds up over a journey.
+
+    A fare state is an opaque value: `board` and `ride` extend it as the
+    journey boards a train and travels one segment, and `amount` prices it.
+    `covers(a, b)` says that whatever follows, `a` won't end up costing more
+    than `b`; it must only hold when that's certain, or cheaper journeys are
+    pruned.
+    """
+
+    empty: Hashable
+
+    def board(self, state: Any, line: str, station: str) -> Any: ...
+
+    def ride(self, state: Any, line: str, a: str, b: str) -> Any: ...
+
+    def amount(self, state: Any) -> int: ...
+
+    def covers(self, a: Any, b: Any) -> bool: ...
+
+
+class BtsFares:
+    """BTS fares: one fare for the trip, whichever trains it rides."""
+
+    empty: FareState = EMPTY_FARE
+
+    def board(self, state: FareState, line: str, station: str) -> FareState:
+        return state
+
+    def ride(self, state: FareState, line: str, a: str, b: str) -> FareState:
+        return ride_fare(state, (a, b))
+
+    def amount(self, state: FareState) -> int:
+        return fare_amount(state)
+
+    def covers(self, a: FareState, b: FareState) -> bool:
+        return a[0] <= b[0] and a[1] <= b[1]
+
+
+@dataclass(frozen=True)
+class JourneyLeg:
+    line: str
+    board: str
+    alight: str
+    # The line terminus the train heads towards.
+    towards: str
+    depart: datetime
+    arrive: datetime
+    stops: int
+
+
+@dataclass(frozen=True)
+class Journey:
+    legs: tuple[JourneyLeg, ...]
+    fare: int
+    # Where the journey starts, changes or ends without step-free access.
+    no_step_free: tuple[str, ...]
+
+    @property
+    def departure(self) -> datetime:
+        return self.legs[0].depart
+
+    @property
+    def arrival(self) -> datetime:
+        return self.legs[-1].arrive
+
+    @property
+    def transfers(self) -> int:
+        return len(self.legs) - 1
+
+    def as_dict(self, network: Network) -> dict[str, Any]:
+        name = network.name
+        return {
+            "depart": self.departure.strftime("%H:%M"),
+            "arrive": self.arrival.strftime("%H:%M"),
+            "minutes": round((self.arrival - self.departure).total_seconds() / 60),
+            "transfers": self.transfers,
+            "fare": self.fare,
+            "step_free": not self.no_step_free,
+            "no_step_free_at": [name(code) for code in self.no_step_free],
+            "legs": [
+                {
+                    "line": network.lines[leg.line].name,
+                    "board": name(leg.board),
+                    "alight": name(leg.alight),
+                    "towards": name(leg.towards),
+                    "depart": leg.depart.strftime("%H:%M"),
+                    "arrive": leg.arrive.strftime("%H:%M"),
+                    "stops": leg.stops,
+                }
+                for leg in self.legs
+            ],
+        }
+
+
+class _Label:
+    """A way of reaching a station, with what it took to get there."""
+
+    __slots__ = ("arrival", "fare", "access", "parent", "leg")
+
+    def __init__(self, arrival, fare, access, parent=None, leg=None):
+        self.arrival: int = arrival
+        self.fare = fare
+        # Stations used so far without step-free access.
+        self.access: int = access
+        self.parent: _Label | None = parent
+        # (pattern index, trip, boarding stop index, alighting stop index)
+        self.leg: tuple[int, int, int, int] | None = leg
+
+
+class JourneyPlanner:
+    def __init__(
+        self,
+        timetable: Timetable,
+        fares: FareModel | None = None,
+        *,
+        no_step_free: Collection[str] = NO_STEP_FREE,
+        max_transfers: int = MAX_TRANSFERS,
+    ):
+        self.timetable = timetable
+        self.network = timetable.network
+        self.fares = fares if fares is not None else BtsFares()
+        self.no_step_free = frozenset(no_step_free)
+        self.max_transfers = max_transfers
+        # Per day type: the patterns, and (pattern, stop index) pairs by station.
+        self._indexes: dict[
+            str, tuple[list[Pattern], dict[str, list[tuple[int, int]]]]
+        ] = {}
+        self._revision = -1
+
+    def _index(
+        self, day_kind: str
+    ) -> tuple[list[Pattern], dict[str, list[tuple[int, int]]]]:
+        if self._revision != self.timetable.revision:
+            self._indexes.clear()
+            self._revision = self.timetable.revision
+        if day_kind not in self._indexes:
+            patterns = self.timetable.patterns(day_kind)
+            by_stop: dict[str, list[tuple[int, int]]] = {}
+            for p, pattern in enumerate(patterns):
+                for i, stop in enumerate(pattern.stops[:-1]):
+                    by_stop.setdefault(stop, []).append((p, i))
+            self._indexes[day_kind] = (patterns, by_stop)
+        return self._indexes[day_kind]
+
+    def search(
+        self,
+        origin: str,
+        destination: str,
+        *,
+        when: datetime | None = None,
+        day_kind: str | None = None,
+        closed: Iterable[tuple[str, str, str]] = (),
+        no_step_free: Collection[str] = (),
+        prefer: str = "fastest",
+        limit: int = 5,
+    ) -> list[Journey]:
+        """Non-dominated journeys leaving `origin` at or after `when`.
+
+        `closed` holds (line, station, station) segments no train can cross,
+        and `no_step_free` stations to treat as inaccessible on top of the
+        planner's own. Up to `limit` journeys are returned, best first by
+        `prefer` (a key of PREFERENCES), keeping the best one for each other
+        preference when there are more. Journeys stay within the service day.
+        """
+        origin = self.network.resolve(origin)
+        destination = self.network.resolve(destination)
+        if origin == destination:
+            raise ValueError("Origin and destination are the same station")
+        if prefer not in PREFERENCES:
+            raise ValueError(
+                f"Unknown preference {prefer!r}. Use one of: {', '.join(PREFERENCES)}"
+            )
+        day, seconds = service_day(when or now())
+        patterns, by_stop = self._index(day_kind or day_type(day))
+        blocked = set()
+        for line, a, b in closed:
+            blocked.update(((line, a, b), (line, b, a)))
+        inaccessible = self.no_step_free | frozenset(no_step_free)
+        fares = self.fares
+
+        def dominates(a: _Label, b: _Label) -> bool:
+            return (
+                a.arrival <= b.arrival
+                and a.access <= b.access
+                and fares.covers(a.fare, b.fare)
+            )
+
+        def insert(label: _Label, stop: str, bag: dict[str, list[_Label]]) -> bool:
+            # A journey already found, or a label from this round or an earlier
+            # one (so with no more transfers), may beat it.
+            for other in (*best.get(destination, ()), *best.get(stop, ())):
+                if dominates(other, label):
+                    return False
+            for labels in (best.setdefault(stop, []), bag.setdefault(stop, [])):
+                labels[:] = [other for other in labels if not dominates(label, other)]
+                labels.append(label)
+            return True
+
+        root = _Label(seconds, fares.empty, int(origin in inaccessible))
+        rounds: list[dict[str, list[_Label]]] = [{origin: [root]}]
+        best: dict[str, list[_Label]] = {origin: [root]}
+        marked = {origin}
+        for _ in range(self.max_transfers + 1):
+            # Each pattern is scanned once, from the first marked stop on it.
+            queue: dict[int, int] = {}
+            for stop in marked:
+                for p, i in by_stop.get(stop, ()):
+                    if i < queue.get(p, len(patterns[p].stops)):
+                        queue[p] = i
+            previous, current = rounds[-1], {}
+            marked = set()
+            for p, start in queue.items():
+                pattern = patterns[p]
+                stops, times, line = pattern.stops, pattern.times, pattern.line
+                # [label boarded from, trip, boarding stop index, fare state]
+                riders: list[list[Any]] = []
+                for i in range(start, len(stops)):
+                    stop = stops[i]
+                    if riders and (line, stops[i - 1], stop) in blocked:
+                        riders = []
+                    for rider in riders:
+                        label, trip, boarded = rider[0], rider[1], rider[2]
+                        rider[3] = fares.ride(rider[3], line, stops[i - 1], stop)
+                        arrived = _Label(
+                            int(times[i, trip]),
+                            rider[3],
+                            label.access + (stop in inaccessible),
+                            label,
+                            (p, trip, boarded, i),
+                        )
+                        if insert(arrived, stop, current):
+                            marked.add(stop)
+                    if i == len(stops) - 1:
+                        break
+                    for label in previous.get(stop, ()):
+                        ready = label.arrival
+                        if label.parent is not None:
+                            ready += MIN_CONNECTION_SECONDS
+                        trip = int(np.searchsorted(times[i], ready, side="left"))
+                        if trip == times.shape[1]:
+                            continue
+                        rider = [label, trip, i, fares.board(label.fare, line, stop)]
+                        # Riders share what's left of the pattern, so an earlier
+                        # train with a covering fare and access beats a later one.
+                        if not any(_beats(other, rider, fares) for other in riders):
+                            riders = [r for r in riders if not _beats(rider, r, fares)]
+                            riders.append(rider)
+            rounds.append(current)
+            if not marked:
+                break
+
+        journeys = [
+            self._journey(label, patterns, inaccessible, day)
+            for bag in rounds[1:]
+            for label in bag.get(destination, ())
+        ]
+        return _select(journeys, prefer, limit)
+
+    def _journey(
+        self,
+        label: _Label,
+        patterns: list[Pattern],
+        inaccessible: frozenset[str],
+        day: date,
+    ) -> Journey:
+        midnight = datetime.combine(day, time())
+        legs = []
+        end = label
+        while label.leg is not None:
+            p, trip, boarded, alighted = label.leg
+            pattern = patterns[p]
+            legs.append(
+                JourneyLeg(
+                    line=pattern.line,
+                    board=pattern.stops[boarded],
+                    alight=pattern.stops[alighted],
+                    towards=pattern.towards,
+                    depart=midnight
+                    + timedelta(seconds=int(pattern.times[boarded, trip])),
+                    arrive=midnight
+                    + timedelta(seconds=int(pattern.times[alighted, trip])),
+                    stops=alighted - boarded,
+                )
+            )
+            assert label.parent is not None
+            label = label.parent
+        legs.reverse()
+        stations = [legs[0].board, *(leg.alight for leg in legs)]
+        return Journey(
+            legs=tuple(legs),
+            fare=self.fares.amount(end.fare),
+            no_step_free=tuple(code for code in stations if code in inaccessible),
+        )
+
+
+def _beats(a: list[Any], b: list[Any], fares: FareModel) -> bool:
+    return a[1] <= b[1] and a[0].access <= b[0].access and fares.covers(a[3], b[3])
+
+
+def _select(journeys: list[Journey], prefer: str, limit: int) -> list[Journey]:
+    """Up to `limit` journeys by `prefer`, keeping the best for each preference."""
+    ranked = sorted(journeys, key=PREFERENCES[prefer])
+    chosen = ranked[:1]
+    for key in PREFERENCES.values():
+        top = min(journeys, key=key, default=None)
+        if top is not None and top not in chosen and len(chosen) < limit:
+            chosen.append(top)
+    chosen += [j for j in ranked if j not in chosen][: limit - len(chosen)]
+    return sorted(chosen[:limit], key=PREFERENCES[prefer])
@@ -1,8 +1,15 @@
+import asyncio
+import os
+from datetime import date
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from chatkit.thread_pool_store import ThreadPoolStore
 from postgres_store import PostgresStore
 from my_server import MyChatKitServer  # import your custom server class
+from bts_network import NETWORK
+from bts_tools import GTFS, STATUS, TIMETABLE
+from station_resolver import RESOLVER
 from request_context import RequestContext
 from pydantic import ValidationError
 import json
@@ -21,7 +28,9 @@ app.add_middleware(
 # Initialize store and server
 try:
     print("Initializing PostgresStore...")
-    store = PostgresStore()
+    # PostgresStore blocks on queries; run it on worker threads so concurrent
+    # streams don't wait on each other.
+    store = ThreadPoolStore(PostgresStore())
     print("PostgresStore initialized successfully")
 
     print("Initializing MyChatKitServer...")
@@ -33,6 +42,24 @@ except Exception as e:
     traceback.print_exc()
     raise
 
+# Keep references so background tasks aren't garbage collected.
+background_tasks = set()
+
+@app.on_event("startup")
+async def start_gtfs_refresh():
+    """Poll the GTFS feed for changes when BTS_GTFS_REFRESH_SECONDS is set."""
+    interval = os.getenv("BTS_GTFS_REFRESH_SECONDS")
+    if GTFS is not None and interval:
+        task = asyncio.create_task(GTFS.watch(float(interval)))
+        background_tasks.add(task)
+
+@app.on_event("startup")
+async def start_status_polling():
+    """Poll the service status feed when BTS_STATUS_SOURCE is set."""
+    if STATUS.source is not None:
+        task = asyncio.create_task(STATUS.watch())
+        background_tasks.add(task)
+
 @app.get("/")
 async def health_check():
     """Health check endpoint for monitoring and root access."""
@@ -41,10 +68,60 @@ async def health_check():
         "service": "BTS Tracker ChatKit Server",
         "endpoints": {
             "chatkit": "/chatkit (POST)",
+            "departures": "/timetable/departures?station=...&destination=...&count=3 (GET)",
+            "first_last": "/timetable/first-last?origin=...&destination=...&day=YYYY-MM-DD (GET)",
+            "status": "/status (GET)",
+            "fast_path_metrics": "/metrics/fast-path (GET)",
+            "response_cache_metrics": "/metrics/response-cache (GET)",
             "health": "/ (GET)"
         }
     }
 
+@app.get("/timetable/departures")
+async def timetable_departures(station: str, destination: str | None = None, count: int = 3):
+    """Next departures from a station, optionally only towards a destination."""
+    try:
+        departures = TIMETABLE.next_departures(
+            RESOLVER.resolve(station),
+            RESOLVER.resolve(destination) if destination else None,
+            count=min(max(count, 1), 50),
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": "Invalid query", "message": str(e)})
+    return {"departures": [d.as_dict(NETWORK) for d in departures]}
+
+@app.get("/timetable/first-last")
+async def timetable_first_last(origin: str, destination: str, day: date | None = None):
+    """First and last trains from origin that reach destination on a day (default today)."""
+    try:
+        first_last = TIMETABLE.first_last(RESOLVER.resolve(origin), RESOLVER.resolve(destination), day)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": "Invalid query", "message": str(e)})
+    if first_last is None:
+        return {"first": None, "last": None}
+    return {"first": first_last.first.as_dict(NETWORK), "last": first_last.last.as_dict(NETWORK)}
+
+@app.get("/status")
+async def service_status():
+    """Current disruptions from the service status feed."""
+    if STATUS.source is None:
+        return {"enabled": False}
+    return {"enabled": True, "stale": STATUS.stale, **STATUS.snapshot.as_dict(NETWORK)}
+
+@app.get("/metrics/fast-path")
+async def fast_path_metrics():
+    """How many messages the local intent router answered, and how quickly."""
+    if server.router is None:
+        return {"enabled": False}
+    return {"enabled": True, **server.router.stats.as_dict()}
+
+@app.get("/metrics/response-cache")
+async def response_cache_metrics():
+    """Hits, misses and evictions of the cache of agent answers."""
+    if server.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "entries": len(server.cache), **server.cache.stats.as_dict()}
+
 @app.post("/chatkit")
 async def chatkit_endpoint(request: Request):
     print(f"=== Received ChatKit request ===")
@@ -0,0 +1,301 @@
+"""
+Versioned schema migrations for PostgresStore.
+
+Applied versions are recorded in the `schema_version` table. Workers first check
+that table and return immediately when the schema is current; otherwise they take
+a Postgres advisory lock so only one process migrates while the others wait.
+
+Each migration runs in its own transaction and must be idempotent, so a schema
+created before the `schema_version` table existed is adopted without changes.
+Migrations marked `concurrently` run outside a transaction, one statement at a
+time, so they can use `CREATE INDEX CONCURRENTLY` without blocking writes.
+
+Run `python migrations.py` to migrate ahead of a deploy.
+"""
+
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary application-wide key for pg_advisory_lock.
+MIGRATION_LOCK_KEY = 7_204_318_552
+LOCK_POLL_INTERVAL = 0.5
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: tuple[str, ...]
+    concurrently: bool = False
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        1,
+        "initial schema",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS threads (
+                id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL,
+                data JSONB NOT NULL,
+                PRIMARY KEY (id, user_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                id TEXT PRIMARY KEY,
+                thread_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL,
+                data JSONB NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS attachments (
+                id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                data JSONB NOT NULL,
+                PRIMARY KEY (id, user_id)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS items_thread_user_created_idx
+                ON items (thread_id, user_id, created_at DESC)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS threads_user_created_idx
+                ON threads (user_id, created_at DESC)
+            """,
+        ),
+    ),
+    Migration(
+        2,
+        "item type and status columns",
+        (
+            # Denormalized discriminator and status columns so item lookups
+            # can filter by type/status in the database.
+            """
+            ALTER TABLE items
+                ADD COLUMN IF NOT EXISTS type TEXT,
+                ADD COLUMN IF NOT EXISTS status TEXT
+            """,
+            """
+            UPDATE items
+            SET type = data->'item'->>'type',
+                status = data->'item'->>'status'
+            WHERE type IS NULL
+            """,
+        ),
+    ),
+    Migration(
+        3,
+        "item payload column",
+        (
+            # Encoded payloads (see payload_codec.py) live in `payload`;
+            # `data` stays populated for rows stored as JSONB.
+            """
+            ALTER TABLE items
+                ADD COLUMN IF NOT EXISTS payload BYTEA,
+                ALTER COLUMN data DROP NOT NULL
+            """,
+        ),
+    ),
+    Migration(
+        4,
+        "item type/status index",
+        (
+            # Drop any invalid index left behind by an interrupted build.
+            "DROP INDEX CONCURRENTLY IF EXISTS items_thread_user_type_status_idx",
+            """
+            CREATE INDEX CONCURRENTLY items_thread_user_type_status_idx
+                ON items (thread_id, user_id, type, status, created_at DESC)
+            """,
+        ),
+        concurrently=True,
+    ),
+    Migration(
+        5,
+        "item (id, user_id) unique index",
+        (
+            # Upserts conflict on (id, user_id), which works for both the flat
+            # and the user-partitioned items layout (see partition_items.py).
+            "DROP INDEX CONCURRENTLY IF EXISTS items_id_user_key",
+            """
+            CREATE UNIQUE INDEX CONCURRENTLY items_id_user_key
+                ON items (id, user_id)
+            """,
+        ),
+        concurrently=True,
+    ),
+    Migration(
+        6,
+        "thread activity and archive",
+        (
+            # Last activity per thread, used by retention.py to find stale threads.
+            "ALTER TABLE threads ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ",
+            """
+            UPDATE threads t
+            SET updated_at = coalesce(
+                (
+                    SELECT max(i.created_at) FROM items i
+                    WHERE i.thread_id = t.id AND i.user_id = t.user_id
+                ),
+                t.created_at
+            )
+            WHERE updated_at IS NULL
+            """,
+            """
+            ALTER TABLE threads
+                ALTER COLUMN updated_at SET DEFAULT now(),
+                ALTER COLUMN updated_at SET NOT NULL
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS archived_threads (
+                id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                archived_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                bundle BYTEA NOT NULL,
+                PRIMARY KEY (id, user_id)
+            )
+            """,
+        ),
+    ),
+    Migration(
+        7,
+        "thread activity index",
+        (
+            "DROP INDEX CONCURRENTLY IF EXISTS threads_updated_idx",
+            "CREATE INDEX CONCURRENTLY threads_updated_idx ON threads (updated_at)",
+        ),
+        concurrently=True,
+    ),
+    Migration(
+        8,
+        "item attachment ids column",
+        (
+            # Denormalized attachment IDs of user messages, so retention.py can
+            # find the other messages that use an attachment. Rows stored with
+            # a payload codec are filled in by retention.backfill_attachment_ids.
+            "ALTER TABLE items ADD COLUMN IF NOT EXISTS attachment_ids TEXT[]",
+            """
+            UPDATE items
+            SET attachment_ids = ARRAY(
+                SELECT a->>'id'
+                FROM jsonb_array_elements(
+                    coalesce(data->'item'->'attachments', '[]'::jsonb)
+                ) AS a
+            )
+            WHERE type = 'user_message' AND data IS NOT NULL
+                AND attachment_ids IS NULL
+            """,
+        ),
+    ),
+    Migration(
+        9,
+        "item attachment ids indexes",
+        (
+            "DROP INDEX CONCURRENTLY IF EXISTS items_attachment_ids_idx",
+            """
+            CREATE INDEX CONCURRENTLY items_attachment_ids_idx
+                ON items USING gin (attachment_ids)
+            """,
+            # User messages whose attachment IDs haven't been filled in yet.
+            "DROP INDEX CONCURRENTLY IF EXISTS items_attachment_ids_pending_idx",
+            """
+            CREATE INDEX CONCURRENTLY items_attachment_ids_pending_idx
+                ON items (user_id)
+                WHERE type = 'user_message' AND attachment_ids IS NULL
+            """,
+        ),
+        concurrently=True,
+    ),
+]
+
+
+def _applied_versions(conn: psycopg.Connection) -> set[int] | None:
+    row = conn.execute("SELECT to_regclass('schema_version')").fetchone()
+    if row is None or row[0] is None:
+        return None
+    return {v for (v,) in conn.execute("SELECT version FROM schema_version")}
+
+
+def _try_lock(conn: psycopg.Connection) -> bool:
+    row = conn.execute(
+        "SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_KEY,)
+    ).fetchone()
+    return bool(row and row[0])
+
+
+def _apply(conn: psycopg.Connection, migration: Migration) -> None:
+    logger.info(f"Applying migration {migration.version}: {migration.name}")
+    if migration.concurrently:
+        for statement in migration.statements:
+            conn.execute(statement)
+        conn.execute(
+            "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+            (migration.version, migration.name),
+        )
+        return
+
+    with conn.transaction():
+        for statement in migration.statements:
+            conn.execute(statement)
+        conn.execute(
+            "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+            (migration.version, migration.name),
+        )
+
+
+def migrate(conninfo: str, migrations: list[Migration] = MIGRATIONS) -> list[int]:
+    """Apply pending migrations in version order and return the applied versions."""
+    versions = [m.version for m in migrations]
+    if versions != sorted(set(versions)):
+        raise ValueError("Migration versions must be unique and in ascending order")
+
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        applied = _applied_versions(conn)
+        if applied is not None and applied.issuperset(versions):
+            return []
+
+        # Poll instead of blocking in pg_advisory_lock: CREATE INDEX CONCURRENTLY
+        # waits for every open transaction, including a blocked lock call.
+        while not _try_lock(conn):
+            time.sleep(LOCK_POLL_INTERVAL)
+            applied = _applied_versions(conn)
+            if applied is not None and applied.issuperset(versions):
+                return []
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """
+            )
+            # Another worker may have migrated while we waited for the lock.
+            applied = _applied_versions(conn) or set()
+            pending = [m for m in migrations if m.version not in applied]
+            for migration in pending:
+                _apply(conn, migration)
+            return [m.version for m in pending]
+        finally:
+            conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    conninfo = os.getenv("DATABASE_URL")
+    if not conninfo:
+        raise SystemExit("DATABASE_URL must be set to run migrations.")
+    applied = migrate(conninfo)
+    print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
@@ -1,11 +1,23 @@
 import os
+import time
 from typing import Any, AsyncIterator
 
 from agents import Agent, Runner
+from bts_tools import BTS_TOOLS, MATRICES, STATUS, TIMETABLE
+from intent_router import IntentRouter
+from response_cache import ResponseCache, cacheable_texts, replay
+from station_resolver import RESOLVER
 from chatkit.agents import AgentContext, stream_agent_response, ThreadItemConverter
-from chatkit.server import ChatKitServer
-from chatkit.types import ThreadMetadata, UserMessageItem, ThreadStreamEvent
-from postgres_store import PostgresStore
+from chatkit.server import ChatKitServer, stream_widget
+from chatkit.types import (
+    AssistantMessageItem,
+    ThreadItemDoneEvent,
+    ThreadItemRemovedEvent,
+    ThreadMetadata,
+    ThreadStreamEvent,
+    UserMessageItem,
+)
+from chatkit.store import Store
 
 
 class MyChatKitServer(ChatKitServer):
@@ -16,7 +28,7 @@ class MyChatKitServer(ChatKitServer):
     routes, and real-time status information.
     """
 
-    def __init__(self, store: PostgresStore):
+    def __init__(self, store: Store):
         super().__init__(store)
 
         # Initialize the AI agent
@@ -28,10 +40,27 @@ class MyChatKitServer(ChatKitServer):
             name="BTS Train Assistant",
             model=model,
             instructions=instructions,
+            tools=BTS_TOOLS,
         )
 
-        # Thread item converter for transforming ChatKit items to agent input
-        self.converter = ThreadItemConverter()
+        # Thread item converter for transforming ChatKit items to agent input.
+        # Widgets are sent as compact text to keep history prompts small.
+        self.converter = ThreadItemConverter(
+            widget_format="text", widget_max_chars=2000
+        )
+
+        # Answers simple route, fare and schedule questions without the model.
+        # Set BTS_FAST_PATH=0 to send everything to the agent.
+        self.router = (
+            IntentRouter(MATRICES, TIMETABLE, status=STATUS)
+            if os.getenv("BTS_FAST_PATH", "1") != "0"
+            else None
+        )
+
+        # Replays earlier agent answers to the same question.
+        # BTS_RESPONSE_CACHE_SIZE=0 turns the cache off.
+        cache_size = int(os.getenv("BTS_RESPONSE_CACHE_SIZE", "1024"))
+        self.cache = ResponseCache(cache_size) if cache_size > 0 else None
 
     def _get_instructions(self) -> str:
         """
@@ -50,13 +79,19 @@ When users ask questions, you should:
 - Classify their question type (schedule_query, route_planning, or realtime_status)
 - Extract relevant details like station names, times, and directions
 - Be concise and friendly in your responses
-- If you don't have specific real-time data, acknowledge it and provide general guidance
+- For delays, closures or whether a line is running normally, call `service_status`; if it reports no live feed or stale data, say so and give general guidance
+- When a trip runs through a disruption (`plan_route` lists them) or the user asks for another way, call `alternate_route`; if BTS service is cut, suggest covering the gap between the stations it names by taxi, bus or MRT
+- Station names may be misspelled, in Thai, or landmarks; a system note lists the stations found in the latest message, and `find_station` resolves others
+- For routes and travel times, call the `plan_route` tool instead of working them out yourself; use `line_stations` to check which stations a line serves
+- For fares, or to compare several destinations, call the `trip_costs` tool
+- When the user cares about more than speed (fewest transfers, cheapest, step-free access for a wheelchair or luggage) or travels at a given time, call `plan_journey` and offer the options it returns
+- For schedules, call `next_trains`, `first_and_last_trains` or `train_frequency` rather than quoting general operating hours
 
 The BTS has two lines:
-- **Sukhumvit Line** (Light Green): Mo Chit to Kheha/Samrong
-- **Silom Line** (Dark Green): National Stadium to Bang Wa
+- **Sukhumvit Line** (Light Green): Khu Khot to Kheha, via Mo Chit and Siam
+- **Silom Line** (Dark Green): National Stadium to Bang Wa, via Siam
 
-Operating hours: Approximately 5:30 AM - midnight daily (may vary by station)
+Operating hours: Approximately 5:15 AM - midnight daily; the timetable tools have exact times per station
 
 Be helpful, professional, and focused on transit information."""
 
@@ -76,13 +111,33 @@ Be helpful, professional, and focused on transit information."""
         4. Handles tool calls and custom actions
         """
 
-        # Create agent context for streaming events
-        agent_context = AgentContext(
-            thread=thread,
-            store=self.store,
-            request_context=context,
+        text = (
+            " ".join(part.text for part in input_user_message.content)
+            if input_user_message
+            else ""
         )
 
+        def generate_id(item_type: Any) -> str:
+            return self.store.generate_item_id(item_type, thread, context)
+
+        # Tell the user about disruptions that started or ended since this
+        # thread last heard.
+        for notice in STATUS.notices(thread.metadata):
+            yield notice
+
+        # Answer simple questions from local data, skipping history and model.
+        if text and self.router is not None:
+            answer = self.router.answer(text)
+            if answer is not None:
+                async for event in stream_widget(
+                    thread,
+                    answer.widget,
+                    copy_text=answer.text,
+                    generate_id=generate_id,
+                ):
+                    yield event
+                return
+
         # Load thread history from database
         items = await self.store.load_thread_items(
             thread.id,
@@ -92,6 +147,38 @@ Be helpful, professional, and focused on transit information."""
             context=context,
         )
 
+        # Replay the agent's answer to the same question, if still fresh. Later
+        # messages are answered in the light of earlier ones, so only a
+        # thread's first message is cached.
+        cache_key = None
+        if (
+            text
+            and self.cache is not None
+            and not input_user_message.attachments
+            and not any(
+                isinstance(item, (UserMessageItem, AssistantMessageItem))
+                and item.id != input_user_message.id
+                for item in items.data
+            )
+        ):
+            cache_key = self.cache.key(
+                text, status_version=STATUS.snapshot.version
+            )
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                async for event in replay(thread, cached, generate_id):
+                    yield event
+                return
+        started = time.perf_counter()
+
+        # Create agent context for streaming events
+        agent_context = AgentContext(
+            thread=thread,
+            store=self.store,
+            request_context=context,
+        )
+
         # Convert thread items to agent input format
         agent_input = await self.converter.to_agent_input(items.data)
 
@@ -100,6 +187,12 @@ Be helpful, professional, and focused on transit information."""
             new_input = await self.converter.to_agent_input(input_user_message)
             agent_input.extend(new_input)
 
+            # Resolve station names locally so the model doesn't have to guess
+            # at spellings, Thai names or landmarks.
+            hint = RESOLVER.hint(text)
+            if hint:
+                agent_input.append({"role": "system", "content": hint})
+
         # Run the agent and stream responses
         result = Runner.run_streamed(
             self.agent,
@@ -107,9 +200,28 @@ Be helpful, professional, and focused on transit information."""
             # You can add additional parameters here:
             # temperature=0.7,
             # max_tokens=4096,
-            # tools=[...],  # Add custom tools
         )
 
         # Stream the agent's response through ChatKit
+        answer_items = []
+        status_version = STATUS.snapshot.version
         async for event in stream_agent_response(agent_context, result):
-            yield event
\ No newline at end of file
+            # Pass on status changes that land while the answer streams.
+            if STATUS.snapshot.version != status_version:
+                status_version = STATUS.snapshot.version
+                for notice in STATUS.notices(thread.metadata):
+                    yield notice
+            if isinstance(event, ThreadItemDoneEvent):
+                answer_items.append(event.item)
+            elif isinstance(event, ThreadItemRemovedEvent):
+                # Withdrawn by a guardrail; never cache a partial answer.
+                cache_key = None
+            yield event
+
+        if cache_key is not None:
+            texts = cacheable_texts(answer_items)
+            if texts is not None:
+                self.cache.put(cache_key, texts)
+
+        if self.router is not None:
+            self.router.record_agent_response(time.perf_counter() - started)
\ No newline at end of file
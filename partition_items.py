@@ -0,0 +1,203 @@
+"""
+Convert PostgresStore's flat `items` table into a table hash-partitioned by user.
+
+Each partition has its own indexes and its own autovacuum cycle. Every
+PostgresStore query filters on `user_id`, so Postgres prunes each query to a
+single partition. The conversion runs online:
+
+1. create `items_partitioned` (PARTITION BY HASH (user_id)) and its partitions;
+2. install a trigger that mirrors writes on `items` into the new table;
+3. copy existing rows in keyset-ordered batches, each in its own short transaction;
+4. in one brief transaction, swap the tables and keep the old one as `items_flat`.
+
+Run `python partition_items.py --partitions 16` with DATABASE_URL set, then drop
+`items_flat` once the new layout is verified. Partitioned parents don't support
+`CREATE INDEX CONCURRENTLY`, so later index migrations on `items` must build
+indexes on each partition instead.
+"""
+
+import argparse
+import logging
+import os
+
+import psycopg
+
+from migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "id, thread_id, user_id, created_at, type, status, data, payload, attachment_ids"
+)
+
+
+def is_partitioned(conn: psycopg.Connection, table: str = "items") -> bool:
+    row = conn.execute(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,)
+    ).fetchone()
+    return row is not None and row[0] == "p"
+
+
+def create_partitioned_table(conn: psycopg.Connection, partitions: int) -> None:
+    with conn.transaction():
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items_partitioned (
+                id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL,
+                type TEXT,
+                status TEXT,
+                data JSONB,
+                payload BYTEA,
+                attachment_ids TEXT[],
+                PRIMARY KEY (id, user_id)
+            ) PARTITION BY HASH (user_id)
+            """
+        )
+        for remainder in range(partitions):
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS items_p{remainder}
+                    PARTITION OF items_partitioned
+                    FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})
+                """
+            )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS items_part_thread_user_created_idx
+                ON items_partitioned (thread_id, user_id, created_at DESC)
+            """
+        )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS items_part_thread_user_type_status_idx
+                ON items_partitioned (thread_id, user_id, type, status, created_at DESC)
+            """
+        )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS items_part_attachment_ids_idx
+                ON items_partitioned USING gin (attachment_ids)
+            """
+        )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS items_part_attachment_ids_pending_idx
+                ON items_partitioned (user_id)
+                WHERE type = 'user_message' AND attachment_ids IS NULL
+            """
+        )
+
+
+def install_mirror_trigger(conn: psycopg.Connection) -> None:
+    with conn.transaction():
+        conn.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION items_mirror_to_partitioned() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    DELETE FROM items_partitioned
+                    WHERE id = OLD.id AND user_id = OLD.user_id;
+                    RETURN OLD;
+                END IF;
+                INSERT INTO items_partitioned ({COLUMNS})
+                VALUES (NEW.id, NEW.thread_id, NEW.user_id, NEW.created_at,
+                        NEW.type, NEW.status, NEW.data, NEW.payload,
+                        NEW.attachment_ids)
+                ON CONFLICT (id, user_id) DO UPDATE SET
+                    thread_id = EXCLUDED.thread_id,
+                    created_at = EXCLUDED.created_at,
+                    type = EXCLUDED.type,
+                    status = EXCLUDED.status,
+                    data = EXCLUDED.data,
+                    payload = EXCLUDED.payload,
+                    attachment_ids = EXCLUDED.attachment_ids;
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """
+        )
+        conn.execute("DROP TRIGGER IF EXISTS items_mirror ON items")
+        conn.execute(
+            """
+            CREATE TRIGGER items_mirror
+                AFTER INSERT OR UPDATE OR DELETE ON items
+                FOR EACH ROW EXECUTE FUNCTION items_mirror_to_partitioned()
+            """
+        )
+
+
+def backfill(conn: psycopg.Connection, batch_size: int) -> int:
+    """Copy rows in id order, one short transaction per batch."""
+    copied = 0
+    last_id = ""
+    while True:
+        with conn.transaction():
+            # Rows already mirrored by the trigger are newer, so keep them.
+            # FOR SHARE holds off deletes of the batch until it is copied, so
+            # the trigger then removes the copy too; rows deleted before the
+            # lock are skipped rather than copied back.
+            row = conn.execute(
+                f"""
+                WITH batch AS (
+                    SELECT {COLUMNS} FROM items
+                    WHERE id > %s
+                    ORDER BY id
+                    LIMIT %s
+                    FOR SHARE
+                ), copied AS (
+                    INSERT INTO items_partitioned ({COLUMNS})
+                    SELECT {COLUMNS} FROM batch
+                    ON CONFLICT (id, user_id) DO NOTHING
+                )
+                SELECT count(*), max(id) FROM batch
+                """,
+                (last_id, batch_size),
+            ).fetchone()
+        if row is None or row[1] is None:
+            return copied
+        copied += row[0]
+        last_id = row[1]
+        logger.info(f"Copied {copied} items (up to id {last_id})")
+
+
+def swap_tables(conn: psycopg.Connection) -> None:
+    with conn.transaction():
+        conn.execute("LOCK TABLE items IN ACCESS EXCLUSIVE MODE")
+        conn.execute("DROP TRIGGER items_mirror ON items")
+        conn.execute("DROP FUNCTION items_mirror_to_partitioned()")
+        conn.execute("ALTER TABLE items RENAME TO items_flat")
+        conn.execute("ALTER TABLE items_partitioned RENAME TO items")
+
+
+def partition_items_table(
+    conninfo: str, partitions: int = 16, batch_size: int = 5000
+) -> None:
+    # The conversion assumes the flat layout produced by the latest migrations.
+    migrate(conninfo)
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        if is_partitioned(conn):
+            logger.info("items is already partitioned")
+            return
+        if conn.execute("SELECT to_regclass('items_flat')").fetchone() != (None,):
+            raise RuntimeError("items_flat already exists; drop it before converting")
+        create_partitioned_table(conn, partitions)
+        install_mirror_trigger(conn)
+        copied = backfill(conn, batch_size)
+        swap_tables(conn)
+        logger.info(f"Partitioned items into {partitions} partitions ({copied} rows)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hash-partition items by user_id.")
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    conninfo = os.getenv("DATABASE_URL")
+    if not conninfo:
+        raise SystemExit("DATABASE_URL must be set.")
+    partition_items_table(conninfo, args.partitions, args.batch_size)
@@ -0,0 +1,126 @@
+"""
+Pluggable encodings for stored item payloads.
+
+Every encoded payload starts with a one-byte codec version so rows written with
+different codecs can live side by side and be decoded transparently.
+"""
+
+import json
+import os
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any
+
+
+class PayloadCodec(ABC):
+    """Encodes JSON-compatible payloads to bytes prefixed with a version byte."""
+
+    version: int
+    name: str
+
+    @abstractmethod
+    def _encode(self, raw: bytes) -> bytes: ...
+
+    @abstractmethod
+    def _decode(self, body: bytes) -> bytes: ...
+
+    def encode(self, data: Any) -> bytes:
+        raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode(
+            "utf-8"
+        )
+        return bytes([self.version]) + self._encode(raw)
+
+    def decode_json(self, payload: bytes) -> bytes:
+        """Return the JSON text stored in a payload encoded by this codec."""
+        return self._decode(payload[1:])
+
+
+class CompactJsonCodec(PayloadCodec):
+    """Whitespace-free UTF-8 JSON."""
+
+    version = 1
+    name = "json"
+
+    def _encode(self, raw: bytes) -> bytes:
+        return raw
+
+    def _decode(self, body: bytes) -> bytes:
+        return body
+
+
+class ZlibCodec(PayloadCodec):
+    """Compact JSON compressed with zlib (always available)."""
+
+    version = 2
+    name = "zlib"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def _encode(self, raw: bytes) -> bytes:
+        return zlib.compress(raw, self.level)
+
+    def _decode(self, body: bytes) -> bytes:
+        return zlib.decompress(body)
+
+
+class ZstdCodec(PayloadCodec):
+    """Compact JSON compressed with zstd. Requires the `zstandard` package."""
+
+    version = 3
+    name = "zstd"
+
+    def __init__(self, level: int = 3):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError(
+                "The zstd payload codec requires the 'zstandard' package."
+            ) from e
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def _encode(self, raw: bytes) -> bytes:
+        return self._compressor.compress(raw)
+
+    def _decode(self, body: bytes) -> bytes:
+        return self._decompressor.decompress(body)
+
+
+_CODEC_TYPES: dict[str, type[PayloadCodec]] = {
+    codec.name: codec for codec in (CompactJsonCodec, ZlibCodec, ZstdCodec)
+}
+_CODEC_TYPES_BY_VERSION: dict[int, type[PayloadCodec]] = {
+    codec.version: codec for codec in _CODEC_TYPES.values()
+}
+_decoders: dict[int, PayloadCodec] = {}
+
+
+def get_codec(name: str) -> PayloadCodec:
+    """Return a codec by name ("json", "zlib" or "zstd")."""
+    codec_type = _CODEC_TYPES.get(name)
+    if codec_type is None:
+        raise ValueError(f"Unknown payload codec: {name}")
+    return codec_type()
+
+
+def codec_from_env() -> PayloadCodec | None:
+    """Return the codec named by ITEM_PAYLOAD_CODEC, or None to store plain JSONB."""
+    name = os.getenv("ITEM_PAYLOAD_CODEC", "jsonb")
+    return None if name == "jsonb" else get_codec(name)
+
+
+def decode_payload_json(payload: bytes) -> bytes:
+    """Decode a payload written by any codec back to its JSON text."""
+    version = payload[0]
+    decoder = _decoders.get(version)
+    if decoder is None:
+        codec_type = _CODEC_TYPES_BY_VERSION.get(version)
+        if codec_type is None:
+            raise ValueError(f"Unknown payload codec version: {version}")
+        decoder = _decoders[version] = codec_type()
+    return decoder.decode_json(payload)
+
+
+def decode_payload(payload: bytes) -> Any:
+    return json.loads(decode_payload_json(payload))
@@ -1,15 +1,41 @@
+import json
 import os
+from collections.abc import AsyncIterable, AsyncIterator, Collection, Iterable
 from contextlib import contextmanager
-from typing import Any, Iterator
+from typing import Any, ContextManager, Iterator
 
 import psycopg
-from chatkit.store import NotFoundError, Store
-from chatkit.types import Attachment, Page, ThreadItem, ThreadMetadata
+from chatkit.store import (
+    NotFoundError,
+    RawThreadItem,
+    Store,
+    ThreadRecord,
+    UnitOfWork,
+    read_export_batches,
+    strip_item_nones,
+)
+from chatkit.types import (
+    Attachment,
+    Page,
+    ThreadItem,
+    ThreadMetadata,
+    UserMessageItem,
+)
 from psycopg.rows import tuple_row
 from psycopg.types.json import Json
 from pydantic import BaseModel
 
+from connection_pool import ConnectionPool
+from migrations import migrate
+from payload_codec import (
+    PayloadCodec,
+    codec_from_env,
+    decode_payload,
+    decode_payload_json,
+)
+from replica_routing import ReplicaRouter, router_from_env
 from request_context import RequestContext
+from retention import ThreadArchive, archive_from_env, rehydrate_thread
 from sample_widget import SampleWidget
 
 class ThreadData(BaseModel):
@@ -24,75 +50,126 @@ class AttachmentData(BaseModel):
 class SampleWidgetData(BaseModel):
     widget: SampleWidget
 
-class PostgresStore(Store[RequestContext]):
-    """Chat data store backed by Render Postgres."""
+_UPSERT_THREAD = """
+    INSERT INTO threads (id, user_id, created_at, updated_at, data)
+    VALUES (%s, %s, %s, now(), %s)
+    ON CONFLICT (id, user_id)
+    DO UPDATE SET created_at = EXCLUDED.created_at,
+        updated_at = EXCLUDED.updated_at,
+        data = EXCLUDED.data
+"""
+
+# Also bumps the thread's last activity for retention, at most once a minute so
+# streamed updates don't rewrite the thread row.
+_UPSERT_ITEM = """
+    WITH touched AS (
+        UPDATE threads SET updated_at = now()
+        WHERE id = %s AND user_id = %s
+            AND updated_at < now() - interval '1 minute'
+    )
+    INSERT INTO items
+        (id, thread_id, user_id, created_at, type, status, data, payload,
+         attachment_ids)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (id, user_id) DO UPDATE SET data = EXCLUDED.data,
+        payload = EXCLUDED.payload,
+        created_at = EXCLUDED.created_at,
+        type = EXCLUDED.type,
+        status = EXCLUDED.status,
+        attachment_ids = EXCLUDED.attachment_ids
+"""
+
+
+def _attachment_ids(item: ThreadItem) -> list[str] | None:
+    # Kept in items.attachment_ids so retention can find shared attachments.
+    if isinstance(item, UserMessageItem):
+        return [attachment.id for attachment in item.attachments]
+    return None
+
 
-    def __init__(self) -> None:
-        conninfo = os.getenv("DATABASE_URL")
+class PostgresStore(Store[RequestContext]):
+    """Chat data store backed by Render Postgres.
+
+    Item payloads are stored as JSONB by default. Pass a `payload_codec` (or set
+    ITEM_PAYLOAD_CODEC to "json", "zlib" or "zstd") to store them as encoded bytes
+    instead; rows written either way are read transparently.
+
+    Threads moved to the cold tier by retention.py are restored from `archive`
+    (THREAD_ARCHIVE_DIR or the `archived_threads` table by default) the next
+    time they are loaded.
+
+    With `replica_router` (or DATABASE_REPLICA_URLS) set, list and history reads
+    go to a replica unless the user wrote recently or every replica lags; see
+    replica_routing.py.
+
+    Connections run in autocommit mode and are reused from a small pool
+    (`pool_size` idle connections); every statement is prepared server-side the
+    first time a connection runs it (`prepare_threshold=0`; pass None to disable,
+    e.g. behind a transaction-mode pgbouncer). Operations with several statements
+    run them in a transaction sent as one pipelined round trip.
+
+    `conninfo` defaults to DATABASE_URL; pass one per database when sharding with
+    chatkit.sharded_store.ShardedStore.
+    """
+
+    def __init__(
+        self,
+        payload_codec: PayloadCodec | None = None,
+        archive: ThreadArchive | None = None,
+        replica_router: ReplicaRouter | None = None,
+        pool_size: int = 10,
+        prepare_threshold: int | None = 0,
+        conninfo: str | None = None,
+    ) -> None:
+        conninfo = conninfo or os.getenv("DATABASE_URL")
         if not conninfo:
             raise RuntimeError(
                 "DATABASE_URL must be set to connect to Render Postgres."
             )
         self._conninfo: str = conninfo
+        self._payload_codec = payload_codec or codec_from_env()
+        self._archive = archive or archive_from_env()
+        self._replica_router = replica_router or router_from_env(
+            pool_size=pool_size, prepare_threshold=prepare_threshold
+        )
+        self._pool = ConnectionPool(conninfo, pool_size, prepare_threshold)
         self._init_schema()
 
-    @contextmanager
-    def _connection(self) -> Iterator[psycopg.Connection]:
-        with psycopg.connect(self._conninfo) as conn:
-            yield conn
+    def _connection(self) -> ContextManager[psycopg.Connection]:
+        return self._pool.connection()
 
-    def _init_schema(self) -> None:
+    @contextmanager
+    def _read_connection(
+        self, context: RequestContext
+    ) -> Iterator[psycopg.Connection]:
+        """Connection for reads that may be served by a replica."""
+        if self._replica_router is not None:
+            with self._replica_router.read_connection(context.user_id) as conn:
+                if conn is not None:
+                    yield conn
+                    return
         with self._connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS threads (
-                        id TEXT NOT NULL,
-                        user_id TEXT NOT NULL,
-                        created_at TIMESTAMPTZ NOT NULL,
-                        data JSONB NOT NULL,
-                        PRIMARY KEY (id, user_id)
-                    )
-                    """
-                )
-
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS items (
-                        id TEXT PRIMARY KEY,
-                        thread_id TEXT NOT NULL,
-                        user_id TEXT NOT NULL,
-                        created_at TIMESTAMPTZ NOT NULL,
-                        data JSONB NOT NULL
-                    )
-                    """
-                )
-
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS attachments (
-                        id TEXT NOT NULL,
-                        user_id TEXT NOT NULL,
-                        data JSONB NOT NULL,
-                        PRIMARY KEY (id, user_id)
-                    )
-                    """
-                )
+            yield conn
 
-                cur.execute(
-                    """
-                    CREATE INDEX IF NOT EXISTS items_thread_user_created_idx
-                        ON items (thread_id, user_id, created_at DESC)
-                    """
-                )
+    @contextmanager
+    def _write_connection(
+        self, context: RequestContext
+    ) -> Iterator[psycopg.Connection]:
+        """Primary connection; the user's reads stick to the primary afterwards."""
+        try:
+            with self._connection() as conn:
+                yield conn
+        finally:
+            self._note_write(context)
+
+    def _note_write(self, context: RequestContext) -> None:
+        # Keeps the user's reads on the primary until replicas catch up.
+        if self._replica_router is not None:
+            self._replica_router.note_write(context.user_id)
 
-                cur.execute(
-                    """
-                    CREATE INDEX IF NOT EXISTS threads_user_created_idx
-                        ON threads (user_id, created_at DESC)
-                    """
-                )
-            conn.commit()
+    def _init_schema(self) -> None:
+        # Returns after a single query when the schema is already current.
+        migrate(self._conninfo)
 
     async def load_thread(
         self, thread_id: str, context: RequestContext
@@ -107,59 +184,97 @@ class PostgresStore(Store[RequestContext]):
                 )
                 row = cur.fetchone()
                 if row is None:
-                    raise NotFoundError(f"Thread {thread_id} not found")
+                    if not rehydrate_thread(conn, self._archive, user_id, thread_id):
+                        raise NotFoundError(f"Thread {thread_id} not found")
+                    self._note_write(context)
+                    cur.execute(
+                        "SELECT data FROM threads WHERE id = %s AND user_id = %s",
+                        (thread_id, user_id),
+                    )
+                    row = cur.fetchone()
+                    if row is None:
+                        raise NotFoundError(f"Thread {thread_id} not found")
                 return ThreadData.model_validate(row[0]).thread
 
     async def save_thread(
         self, thread: ThreadMetadata, context: RequestContext
     ) -> None:
-        with self._connection() as conn:
+        with self._write_connection(context) as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO threads (id, user_id, created_at, data)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (id, user_id)
-                    DO UPDATE SET created_at = EXCLUDED.created_at, data = EXCLUDED.data
-                    """,
-                    (
-                        thread.id,
-                        context.user_id,
-                        thread.created_at,
-                        Json(
-                            ThreadData(thread=thread).model_dump(
-                                mode="json", round_trip=True
-                            )
-                        ),
-                    ),
-                )
-            conn.commit()
+                cur.execute(_UPSERT_THREAD, self._thread_params(thread, context))
+
+    @staticmethod
+    def _thread_params(thread: ThreadMetadata, context: RequestContext) -> tuple:
+        return (
+            thread.id,
+            context.user_id,
+            thread.created_at,
+            Json(ThreadData(thread=thread).model_dump(mode="json", round_trip=True)),
+        )
 
     async def save_item(
         self, thread_id: str, item: ThreadItem, context: RequestContext
     ) -> None:
-        with self._connection() as conn:
+        with self._write_connection(context) as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO items (id, thread_id, user_id, created_at, data)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data,
-                        created_at = EXCLUDED.created_at
-                    """,
-                    (
-                        item.id,
-                        thread_id,
-                        context.user_id,
-                        item.created_at,
-                        Json(
-                            ItemData(item=item).model_dump(
-                                mode="json", round_trip=True
-                            )
-                        ),
-                    ),
-                )
-            conn.commit()
+                cur.execute(_UPSERT_ITEM, self._item_params(thread_id, item, context))
+
+    def _item_params(
+        self, thread_id: str, item: ThreadItem, context: RequestContext
+    ) -> tuple:
+        item_data = ItemData(item=item).model_dump(mode="json", round_trip=True)
+        if self._payload_codec is None:
+            data, payload = Json(item_data), None
+        else:
+            data, payload = None, self._payload_codec.encode(item_data)
+        return (
+            thread_id,
+            context.user_id,
+            item.id,
+            thread_id,
+            context.user_id,
+            item.created_at,
+            item.type,
+            getattr(item, "status", None),
+            data,
+            payload,
+            _attachment_ids(item),
+        )
+
+    async def commit_unit_of_work(self, unit: UnitOfWork[RequestContext]) -> None:
+        context = unit.context
+        with self._write_connection(context) as conn:
+            # One transaction for the whole unit, sent as a single round trip.
+            with conn.pipeline(), conn.transaction(), conn.cursor() as cur:
+                if unit.items:
+                    cur.executemany(
+                        _UPSERT_ITEM,
+                        [
+                            self._item_params(unit.thread_id, item, context)
+                            for item in unit.items.values()
+                        ],
+                    )
+                if unit.deleted_item_ids:
+                    cur.execute(
+                        """
+                        DELETE FROM items
+                        WHERE id = ANY(%s) AND thread_id = %s AND user_id = %s
+                        """,
+                        (unit.deleted_item_ids, unit.thread_id, context.user_id),
+                    )
+                if unit.thread is not None:
+                    cur.execute(_UPSERT_THREAD, self._thread_params(unit.thread, context))
+
+    @staticmethod
+    def _raw_item_json(data: Any, payload: bytes | None) -> str:
+        item = data["item"] if payload is None else decode_payload(payload)["item"]
+        return json.dumps(strip_item_nones(item), ensure_ascii=False)
+
+    @staticmethod
+    def _item_from_row(data: Any, payload: bytes | None) -> ThreadItem:
+        if payload is not None:
+            return ItemData.model_validate_json(decode_payload_json(payload)).item
+        return ItemData.model_validate(data).item
 
     async def load_item(
         self, thread_id: str, item_id: str, context: RequestContext
@@ -168,7 +283,7 @@ class PostgresStore(Store[RequestContext]):
             with conn.cursor(row_factory=tuple_row) as cur:
                 cur.execute(
                     """
-                    SELECT data
+                    SELECT data, payload
                     FROM items
                     WHERE id = %s AND thread_id = %s AND user_id = %s
                     """,
@@ -179,38 +294,43 @@ class PostgresStore(Store[RequestContext]):
                     raise NotFoundError(
                         f"Item {item_id} not found in thread {thread_id}"
                     )
-                return ItemData.model_validate(row[0]).item
+                return self._item_from_row(row[0], row[1])
 
     async def delete_thread(
         self, thread_id: str, context: RequestContext
     ) -> None:
-        with self._connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        with self._write_connection(context) as conn:
+            # BEGIN, the deletes and COMMIT go out in a single round trip.
+            with conn.pipeline(), conn.transaction():
+                conn.execute(
                     "DELETE FROM items WHERE thread_id = %s AND user_id = %s",
                     (thread_id, context.user_id),
                 )
-                cur.execute(
+                conn.execute(
                     "DELETE FROM threads WHERE id = %s AND user_id = %s",
                     (thread_id, context.user_id),
                 )
-            conn.commit()
+                if self._archive.in_database:
+                    self._archive.delete(conn, context.user_id, thread_id)
+            # An archive outside the database only loses the bundle once the
+            # rows are gone for good, so a failed commit leaves both in place.
+            if not self._archive.in_database:
+                self._archive.delete(conn, context.user_id, thread_id)
 
     async def delete_attachment(
         self, attachment_id: str, context: RequestContext
     ) -> None:
-        with self._connection() as conn:
+        with self._write_connection(context) as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     "DELETE FROM attachments WHERE id = %s AND user_id = %s",
                     (attachment_id, context.user_id),
                 )
-            conn.commit()
 
     async def delete_thread_item(
         self, thread_id: str, item_id: str, context: RequestContext
     ) -> None:
-        with self._connection() as conn:
+        with self._write_connection(context) as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -219,7 +339,6 @@ class PostgresStore(Store[RequestContext]):
                     """,
                     (item_id, thread_id, context.user_id),
                 )
-            conn.commit()
     async def add_thread_item(
         self, thread_id: str, item: ThreadItem, context: RequestContext
     ) -> None:
@@ -229,7 +348,7 @@ class PostgresStore(Store[RequestContext]):
     async def load_attachment(
         self, attachment_id: str, context: RequestContext
     ) -> Attachment:
-        with self._connection() as conn:
+        with self._read_connection(context) as conn:
             with conn.cursor(row_factory=tuple_row) as cur:
                 cur.execute(
                     """
@@ -249,7 +368,7 @@ class PostgresStore(Store[RequestContext]):
     async def save_attachment(
         self, attachment: Attachment, context: RequestContext
     ) -> None:
-        with self._connection() as conn:
+        with self._write_connection(context) as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -264,38 +383,125 @@ class PostgresStore(Store[RequestContext]):
                         Json({"attachment": attachment.model_dump(mode="json", round_trip=True)}),
                     ),
                 )
-            conn.commit()
+
+    def _select_thread_items(
+        self,
+        cur: psycopg.Cursor,
+        columns: str,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: RequestContext,
+        types: Collection[str] | None = None,
+        exclude_types: Collection[str] | None = None,
+        status: str | None = None,
+    ) -> list[tuple]:
+        # Pagination support
+        order_clause = "ASC" if order == "asc" else "DESC"
+
+        conditions = ["thread_id = %s", "user_id = %s"]
+        params: list[Any] = [thread_id, context.user_id]
+        if after:
+            conditions.append("id > %s")
+            params.append(after)
+        if types is not None:
+            conditions.append("type = ANY(%s)")
+            params.append(list(types))
+        if exclude_types is not None:
+            conditions.append("type <> ALL(%s)")
+            params.append(list(exclude_types))
+        if status is not None:
+            conditions.append("status = %s")
+            params.append(status)
+        params.append(limit + 1)
+
+        cur.execute(
+            f"""
+            SELECT {columns} FROM items
+            WHERE {" AND ".join(conditions)}
+            ORDER BY created_at {order_clause} LIMIT %s
+            """,
+            params,
+        )
+        return cur.fetchall()
 
     async def load_thread_items(
         self, thread_id: str, after: str | None, limit: int, order: str, context: RequestContext
     ) -> Page[ThreadItem]:
-        with self._connection() as conn:
+        return await self.load_thread_items_filtered(
+            thread_id, after, limit, order, context
+        )
+
+    async def load_thread_items_filtered(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: RequestContext,
+        *,
+        types: Collection[str] | None = None,
+        exclude_types: Collection[str] | None = None,
+        status: str | None = None,
+    ) -> Page[ThreadItem]:
+        with self._read_connection(context) as conn:
             with conn.cursor(row_factory=tuple_row) as cur:
-                # Pagination support
-                order_clause = "ASC" if order == "asc" else "DESC"
+                rows = self._select_thread_items(
+                    cur,
+                    "data, payload",
+                    thread_id,
+                    after,
+                    limit,
+                    order,
+                    context,
+                    types=types,
+                    exclude_types=exclude_types,
+                    status=status,
+                )
+                items = [self._item_from_row(row[0], row[1]) for row in rows]
 
-                if after:
-                    cur.execute(
-                        f"""
-                        SELECT data FROM items
-                        WHERE thread_id = %s AND user_id = %s AND id > %s
-                        ORDER BY created_at {order_clause} LIMIT %s
-                        """,
-                        (thread_id, context.user_id, after, limit + 1)
-                    )
-                else:
-                    cur.execute(
-                        f"""
-                        SELECT data FROM items
-                        WHERE thread_id = %s AND user_id = %s
-                        ORDER BY created_at {order_clause} LIMIT %s
-                        """,
-                        (thread_id, context.user_id, limit + 1)
+                # Check if there are more items
+                has_more = len(items) > limit
+                if has_more:
+                    items = items[:limit]
+
+                next_cursor = items[-1].id if items and has_more else None
+                return Page(data=items, has_more=has_more, after=next_cursor)
+
+    async def load_raw_thread_items(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: RequestContext,
+        *,
+        exclude_types: Collection[str] | None = None,
+    ) -> Page[RawThreadItem]:
+        # Stored items are returned as JSON without validation; None fields are
+        # dropped so the JSON matches what ChatKit sends to clients.
+        with self._read_connection(context) as conn:
+            with conn.cursor(row_factory=tuple_row) as cur:
+                rows = self._select_thread_items(
+                    cur,
+                    "id, type, data, payload",
+                    thread_id,
+                    after,
+                    limit,
+                    order,
+                    context,
+                    exclude_types=exclude_types,
+                )
+                items = [
+                    RawThreadItem.model_construct(
+                        id=row[0],
+                        type=row[1],
+                        data=self._raw_item_json(row[2], row[3]),
                     )
-                rows = cur.fetchall()
-                items = [ItemData.model_validate(row[0]).item for row in rows]
+                    for row in rows
+                ]
 
-                # Check if there are more items
                 has_more = len(items) > limit
                 if has_more:
                     items = items[:limit]
@@ -306,7 +512,7 @@ class PostgresStore(Store[RequestContext]):
     async def load_threads(
         self, limit: int, after: str | None, order: str, context: RequestContext
     ) -> Page[ThreadMetadata]:
-        with self._connection() as conn:
+        with self._read_connection(context) as conn:
             with conn.cursor(row_factory=tuple_row) as cur:
                 order_clause = "ASC" if order == "asc" else "DESC"
 
@@ -337,4 +543,149 @@ class PostgresStore(Store[RequestContext]):
                     threads = threads[:limit]
 
                 next_cursor = threads[-1].id if threads and has_more else None
-                return Page(data=threads, has_more=has_more, after=next_cursor)
\ No newline at end of file
+                return Page(data=threads, has_more=has_more, after=next_cursor)
+
+    async def export_ndjson(
+        self, context: RequestContext, *, batch_size: int = 500
+    ) -> AsyncIterator[bytes]:
+        # A named (server-side) cursor fetches `batch_size` rows per round trip,
+        # so memory stays flat however many rows are exported. Threads and items
+        # come from one query, sorted so each thread is followed by its items.
+        with self._read_connection(context) as conn, conn.transaction():
+            with conn.cursor(name="export_rows", row_factory=tuple_row) as cur:
+                cur.itersize = batch_size
+                cur.execute(
+                    """
+                    SELECT id AS thread_id, 0 AS kind, created_at, id,
+                           data::text, NULL::bytea
+                    FROM threads WHERE user_id = %s
+                    UNION ALL
+                    SELECT thread_id, 1, created_at, id, data::text, payload
+                    FROM items WHERE user_id = %s
+                    ORDER BY thread_id, kind, created_at, id
+                    """,
+                    (context.user_id, context.user_id),
+                )
+                for thread_id, kind, _, _, data, payload in cur:
+                    if kind == 0:
+                        yield data.encode() + b"\n"
+                        continue
+                    # Stored item JSON is {"item": ...}; splice the thread ID in.
+                    item_json = (
+                        data.encode() if payload is None else decode_payload_json(payload)
+                    )
+                    yield (
+                        b'{"thread_id":'
+                        + json.dumps(thread_id).encode()
+                        + b","
+                        + item_json[1:]
+                        + b"\n"
+                    )
+
+    async def import_ndjson(
+        self,
+        lines: AsyncIterable[bytes | str] | Iterable[bytes | str],
+        context: RequestContext,
+        *,
+        batch_size: int = 500,
+    ) -> int:
+        # Each batch is COPYed into temp tables and upserted from there in one
+        # transaction, since COPY itself can't resolve conflicts.
+        count = 0
+        with self._write_connection(context) as conn:
+            async for batch in read_export_batches(lines, batch_size):
+                with conn.transaction(), conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        CREATE TEMP TABLE import_threads
+                            (id TEXT, created_at TIMESTAMPTZ, data JSONB)
+                        ON COMMIT DROP
+                        """
+                    )
+                    cur.execute(
+                        """
+                        CREATE TEMP TABLE import_items (
+                            id TEXT, thread_id TEXT, created_at TIMESTAMPTZ,
+                            type TEXT, status TEXT, data JSONB, payload BYTEA,
+                            attachment_ids TEXT[]
+                        ) ON COMMIT DROP
+                        """
+                    )
+                    with cur.copy(
+                        "COPY import_threads (id, created_at, data) FROM STDIN"
+                    ) as copy:
+                        for r in batch:
+                            if isinstance(r, ThreadRecord):
+                                copy.write_row(
+                                    (
+                                        r.thread.id,
+                                        r.thread.created_at,
+                                        Json(
+                                            ThreadData(thread=r.thread).model_dump(
+                                                mode="json", round_trip=True
+                                            )
+                                        ),
+                                    )
+                                )
+                    with cur.copy(
+                        """
+                        COPY import_items
+                            (id, thread_id, created_at, type, status, data, payload,
+                             attachment_ids)
+                        FROM STDIN
+                        """
+                    ) as copy:
+                        for r in batch:
+                            if isinstance(r, ThreadRecord):
+                                continue
+                            item_data = ItemData(item=r.item).model_dump(
+                                mode="json", round_trip=True
+                            )
+                            copy.write_row(
+                                (
+                                    r.item.id,
+                                    r.thread_id,
+                                    r.item.created_at,
+                                    r.item.type,
+                                    getattr(r.item, "status", None),
+                                    None
+                                    if self._payload_codec
+                                    else Json(item_data),
+                                    self._payload_codec.encode(item_data)
+                                    if self._payload_codec
+                                    else None,
+                                    _attachment_ids(r.item),
+                                )
+                            )
+                    cur.execute(
+                        """
+                        INSERT INTO threads (id, user_id, created_at, data)
+                        SELECT id, %s, created_at, data FROM import_threads
+                        ON CONFLICT (id, user_id) DO UPDATE SET
+                            created_at = EXCLUDED.created_at,
+                            updated_at = EXCLUDED.updated_at,
+                            data = EXCLUDED.data
+                        """,
+                        (context.user_id,),
+                    )
+                    cur.execute(
+                        """
+                        INSERT INTO items
+                            (id, thread_id, user_id, created_at, type, status,
+                             data, payload, attachment_ids)
+                        SELECT id, thread_id, %s, created_at, type, status,
+                            data, payload, attachment_ids
+                        FROM import_items
+                        ON CONFLICT (id, user_id) DO UPDATE SET
+                            thread_id = EXCLUDED.thread_id,
+                            created_at = EXCLUDED.created_at,
+                            type = EXCLUDED.type,
+                            status = EXCLUDED.status,
+                            data = EXCLUDED.data,
+                            payload = EXCLUDED.payload,
+                            attachment_ids = EXCLUDED.attachment_ids
+                        """,
+                        (context.user_id,),
+                    )
+                count += len(batch)
+        return count
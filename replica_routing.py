@@ -0,0 +1,177 @@
+"""
+Read-replica routing for PostgresStore.
+
+History and list reads (`load_threads`, `load_thread_items`, `load_attachment`, ...)
+can be served by streaming replicas so they don't compete with streaming writes on
+the primary. Routing rules:
+
+- read-your-writes: after a user writes, their reads stay on the primary for
+  `sticky_seconds` (by default the maximum tolerated lag plus one lag check
+  interval, so a replica used afterwards has already replayed the write);
+- lag-aware: a replica's replay lag is measured at most every
+  `lag_check_interval` seconds, and replicas lagging more than `max_lag` are
+  skipped;
+- failover: a replica that can't be reached is skipped for `retry_after`
+  seconds. When no replica qualifies the read goes to the primary.
+
+Each replica has its own connection pool, like the primary's, so replica
+reads reuse connections and their prepared statements; the lag query runs on a
+pooled connection once per `lag_check_interval`, not on every read.
+
+Stickiness is tracked in memory, so it only covers reads handled by the process
+that performed the write.
+
+Configure with DATABASE_REPLICA_URLS (comma-separated DSNs) and optionally
+REPLICA_MAX_LAG_SECONDS.
+"""
+
+import itertools
+import logging
+import os
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import psycopg
+
+from connection_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Zero when the replica has replayed everything it received, so an idle primary
+# doesn't make replicas look stale.
+_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(
+            extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+"""
+
+# Prune expired stickiness entries once the table grows past this size.
+_MAX_STICKY_USERS = 10_000
+
+
+@dataclass
+class _Replica:
+    pool: ConnectionPool
+    lag: float = 0.0
+    lag_checked_at: float = float("-inf")
+    unavailable_until: float = float("-inf")
+
+
+class ReplicaRouter:
+    def __init__(
+        self,
+        replicas: Sequence[str],
+        max_lag: float = 5.0,
+        sticky_seconds: float | None = None,
+        lag_check_interval: float = 1.0,
+        retry_after: float = 30.0,
+        connect_timeout: int = 2,
+        pool_size: int = 10,
+        prepare_threshold: int | None = 0,
+    ):
+        if not replicas:
+            raise ValueError("ReplicaRouter needs at least one replica DSN")
+        self._replicas = [
+            _Replica(
+                ConnectionPool(conninfo, pool_size, prepare_threshold, connect_timeout)
+            )
+            for conninfo in replicas
+        ]
+        self._next = itertools.cycle(self._replicas)
+        self.max_lag = max_lag
+        self.sticky_seconds = (
+            max_lag + lag_check_interval if sticky_seconds is None else sticky_seconds
+        )
+        self.lag_check_interval = lag_check_interval
+        self.retry_after = retry_after
+        self._last_write: dict[str, float] = {}
+
+    def note_write(self, user_id: str) -> None:
+        now = time.monotonic()
+        if len(self._last_write) >= _MAX_STICKY_USERS:
+            cutoff = now - self.sticky_seconds
+            self._last_write = {u: t for u, t in self._last_write.items() if t > cutoff}
+        self._last_write[user_id] = now
+
+    def is_sticky(self, user_id: str) -> bool:
+        last_write = self._last_write.get(user_id)
+        return (
+            last_write is not None
+            and time.monotonic() - last_write < self.sticky_seconds
+        )
+
+    def _lag_ok(self, replica: _Replica, conn: psycopg.Connection) -> bool:
+        now = time.monotonic()
+        if now - replica.lag_checked_at >= self.lag_check_interval:
+            row = conn.execute(_LAG_QUERY).fetchone()
+            replica.lag = float(row[0]) if row else 0.0
+            replica.lag_checked_at = now
+            if replica.lag > self.max_lag:
+                logger.warning(
+                    f"Replica lag {replica.lag:.1f}s exceeds {self.max_lag}s; "
+                    "reading from primary"
+                )
+        return replica.lag <= self.max_lag
+
+    @contextmanager
+    def read_connection(self, user_id: str) -> Iterator[psycopg.Connection | None]:
+        """A pooled connection to a usable replica, or None to use the primary."""
+        picked = None if self.is_sticky(user_id) else self._pick()
+        if picked is None:
+            yield None
+            return
+        replica, conn = picked
+        try:
+            yield conn
+        finally:
+            replica.pool.checkin(conn)
+
+    def _pick(self) -> tuple[_Replica, psycopg.Connection] | None:
+        now = time.monotonic()
+        for _ in range(len(self._replicas)):
+            replica = next(self._next)
+            if replica.unavailable_until > now:
+                continue
+            try:
+                conn = replica.pool.checkout()
+            except psycopg.OperationalError as e:
+                logger.warning(f"Replica unavailable, using primary: {e}")
+                replica.unavailable_until = now + self.retry_after
+                continue
+            try:
+                if self._lag_ok(replica, conn):
+                    return replica, conn
+            except psycopg.Error as e:
+                logger.warning(f"Replica lag check failed: {e}")
+                replica.unavailable_until = now + self.retry_after
+            replica.pool.checkin(conn)
+        return None
+
+    def close(self) -> None:
+        for replica in self._replicas:
+            replica.pool.close()
+
+
+def router_from_env(
+    pool_size: int = 10, prepare_threshold: int | None = 0
+) -> ReplicaRouter | None:
+    """Build a router from DATABASE_REPLICA_URLS, or None when it isn't set."""
+    replicas = [
+        dsn.strip()
+        for dsn in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+        if dsn.strip()
+    ]
+    if not replicas:
+        return None
+    return ReplicaRouter(
+        replicas,
+        max_lag=float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5")),
+        pool_size=pool_size,
+        prepare_threshold=prepare_threshold,
+    )
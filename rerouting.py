@@ -0,0 +1,170 @@
+"""
+Routes that take current disruptions into account.
+
+`LiveRoutes` keeps its own copy of the network whose segment times follow
+the service status snapshot: closed stretches are cut and delays are spread
+over the segments of the delayed stretch, so crossing all of it costs the
+reported delay. When the snapshot version changes, the next lookup updates
+the copy with `Network.set_penalties()`, which repairs only the shortest
+paths the changed segments touch, so a status change costs a fraction of a
+rebuild and lookups stay table reads.
+
+`alternate()` compares the scheduled route with the live one. The BTS lines
+only meet at Siam, so a closure usually leaves no BTS route at all; the
+answer then names the last station the trip can reach by BTS and the first
+station from which BTS service to the destination runs again, to bridge by
+other transport.
+"""
+
+import itertools
+import logging
+import math
+import re
+from dataclasses import dataclass
+from typing import Any
+
+from bts_network import NETWORK, Network, NoRouteError, Route
+from service_status import Disruption, ServiceStatus, StatusSnapshot
+
+logger = logging.getLogger(__name__)
+
+_LIFTS = re.compile(r"\b(elevators?|lifts?)\b", re.IGNORECASE)
+
+
+def segment_penalties(
+    snapshot: StatusSnapshot, network: Network = NETWORK
+) -> dict[tuple[str, str, str], int | None]:
+    """Extra seconds per segment for the disruptions in `snapshot`.
+
+    None marks a closed segment. Notices don't slow anything down.
+    """
+    penalties: dict[tuple[str, str, str], int | None] = {}
+    for disruption in snapshot.disruptions:
+        if disruption.kind == "notice" or len(disruption.stations) < 2:
+            continue
+        segments = list(itertools.pairwise(disruption.stations))
+        extra = math.ceil(disruption.delay_minutes * 60 / len(segments))
+        for a, b in segments:
+            key = (disruption.line, a, b)
+            if disruption.kind == "closed" or penalties.get(key, 0) is None:
+                penalties[key] = None
+            else:
+                penalties[key] = penalties.get(key, 0) + extra
+    return penalties
+
+
+def closed_segments(
+    snapshot: StatusSnapshot, network: Network = NETWORK
+) -> set[tuple[str, str, str]]:
+    """(line, station, station) segments no train runs over right now."""
+    penalties = segment_penalties(snapshot, network)
+    return {key for key, extra in penalties.items() if extra is None}
+
+
+def step_free_outages(snapshot: StatusSnapshot) -> set[str]:
+    """Stations that notices report as having a lift out of service."""
+    return {
+        code
+        for disruption in snapshot.disruptions
+        if disruption.kind == "notice" and _LIFTS.search(disruption.message)
+        for code in disruption.stations
+    }
+
+
+@dataclass(frozen=True)
+class AlternateRoute:
+    scheduled: Route
+    # The fastest route under current disruptions; None if BTS can't do it.
+    live: Route | None
+    # Disruptions on the scheduled route.
+    disruptions: tuple[Disruption, ...]
+    # With no live route: where BTS service stops, and where it resumes.
+    reachable: str | None = None
+    resumes: str | None = None
+
+    def as_dict(self, network: Network) -> dict[str, Any]:
+        result: dict[str, Any] = {
+            "scheduled": self.scheduled.as_dict(network),
+            "disruptions": [d.as_dict(network) for d in self.disruptions],
+            "live": self.live.as_dict(network) if self.live else None,
+        }
+        if self.live is not None:
+            result["extra_minutes"] = round(
+                (self.live.seconds - self.scheduled.seconds) / 60
+            )
+        elif self.reachable is not None and self.resumes is not None:
+            result["bts_reaches"] = network.name(self.reachable)
+            result["bts_resumes_at"] = network.name(self.resumes)
+        return result
+
+
+class LiveRoutes:
+    def __init__(self, status: ServiceStatus, network: Network = NETWORK):
+        self.status = status
+        self.scheduled = network
+        self.network = Network(
+            network.stations.values(),
+            network.lines.values(),
+            transfer_seconds=network.transfer_seconds,
+        )
+        self.version = 0
+
+    def sync(self) -> None:
+        """Catch up with the status snapshot, if it changed since last time."""
+        snapshot = self.status.snapshot
+        if snapshot.version == self.version:
+            return
+        stats = self.network.set_penalties(segment_penalties(snapshot, self.scheduled))
+        self.version = snapshot.version
+        logger.info(
+            f"Rerouted for status version {snapshot.version}: "
+            f"{stats.segments} segments changed, {stats.origins} origins and "
+            f"{stats.platforms} platforms repaired"
+        )
+
+    def route(self, origin: str, destination: str) -> Route:
+        """The fastest route now; NoRouteError if disruptions cut it off."""
+        self.sync()
+        return self.network.route(origin, destination)
+
+    def disruptions_on(self, route: Route) -> tuple[Disruption, ...]:
+        return tuple(d for d in self.status.snapshot.disruptions if _on_route(d, route))
+
+    def alternate(self, origin: str, destination: str) -> AlternateRoute:
+        self.sync()
+        scheduled = self.scheduled.route(origin, destination)
+        disruptions = self.disruptions_on(scheduled)
+        try:
+            live = self.network.route(origin, destination)
+        except NoRouteError:
+            pass
+        else:
+            return AlternateRoute(scheduled, live, disruptions)
+
+        stations = [scheduled.origin]
+        for leg in scheduled.legs:
+            stations += leg.stations[1:]
+        reachable = max(
+            (s for s in stations if self.network.reachable(scheduled.origin, s)),
+            key=stations.index,
+        )
+        resumes = min(
+            (s for s in stations if self.network.reachable(s, scheduled.destination)),
+            key=stations.index,
+        )
+        return AlternateRoute(scheduled, None, disruptions, reachable, resumes)
+
+
+def _on_route(disruption: Disruption, route: Route) -> bool:
+    for leg in route.legs:
+        if leg.line != disruption.line:
+            continue
+        if disruption.kind == "notice":
+            if set(leg.stations) & set(disruption.stations):
+                return True
+            continue
+        segments = set(itertools.pairwise(leg.stations))
+        stretch = disruption.stations
+        if segments & {*itertools.pairwise(stretch), *zip(stretch[1:], stretch)}:
+            return True
+    return False
@@ -0,0 +1,271 @@
+"""
+Cache of agent answers to repeated transit questions.
+
+Many users ask the same thing in different words ("how do I get from Siam to
+Mo Chit", "Siam to Mochit how to go?"). `ResponseCache.key()` reduces a
+message to what decides its answer: the kind of question, the stations it
+names (resolved to codes, so spellings, Thai names and landmarks agree, with
+the origin first), the words that can change the answer ("first" or "last",
+"with a wheelchair") and, for answers that depend on the time, the current
+time bucket.
+
+Each kind has its own lifetime: route and fare answers only change with the
+network and live for hours, schedule answers for a few minutes, and answers
+about disruptions for a minute. Entries are evicted least recently used
+first once the cache holds `max_entries` answers or `max_chars` of text.
+
+Only messages that stand on their own are cached: they must name a station
+and not refer back to the conversation ("there", "instead", ...). The agent
+also reads the earlier messages of a thread ("I use a wheelchair"), so
+callers should only look up and store answers for a thread's first message.
+Cached answers are replayed as a streamed assistant message, so clients and
+the store see the same events as for a fresh answer.
+"""
+
+import logging
+import re
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable, Iterable
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from chatkit.types import (
+    AssistantMessageContent,
+    AssistantMessageContentPartAdded,
+    AssistantMessageContentPartDone,
+    AssistantMessageContentPartTextDelta,
+    AssistantMessageItem,
+    ThreadItemAddedEvent,
+    ThreadItemDoneEvent,
+    ThreadItemUpdated,
+    ThreadMetadata,
+    ThreadStreamEvent,
+)
+from intent_router import intent_kinds, station_codes
+from station_resolver import RESOLVER, STOPWORDS, StationResolver, fold
+
+logger = logging.getLogger(__name__)
+
+# Seconds an answer stays valid, by kind of question.
+TTLS = {
+    "route": 6 * 3600,
+    "fare": 6 * 3600,
+    "first_last": 3600,
+    "frequency": 600,
+    "next_train": 60,
+    "realtime": 60,
+    "general": 1800,
+}
+# Answers to these kinds depend on the time of asking, so questions asked in
+# different buckets of this many seconds get separate entries.
+TIME_BUCKETS = {"frequency": 900, "next_train": 60, "realtime": 60}
+
+MAX_LENGTH = 240
+# Characters per streamed delta when replaying an answer.
+REPLAY_CHUNK = 48
+
+_REALTIME = re.compile(
+    r"\b(delay\w*|disrupt\w*|status|closed|closure|suspended|running)\b"
+)
+# Words that ask about the time of departure. Without a sharper keyword, the
+# answer names trains leaving around now, so it's cached like next_train.
+_DEPARTING = frozenset(
+    """arrive arrives arriving depart departing departs departure departures
+    leave leaves leaving now schedule soon time times today when""".split()
+)
+# Words that point back at earlier messages in the conversation.
+_CONTEXT = frozenset(
+    """again also another back else instead other same that them then there
+    these this those way""".split()
+)
+_WORD = re.compile(r"\w+")
+# Words that phrase a question without changing its answer, folded. Station
+# name stopwords such as "last" and "next" do change it, so they stay.
+_FILLER = frozenset(
+    fold(word)
+    for word in (
+        *(STOPWORDS - {"last", "next"}),
+        *"""about be best cost costs direction directions fare fares get
+        going hello hi how much price route should tell thanks ticket way
+        what's ride run often frequently departure departures please know
+        need want would like could""".split(),
+    )
+)
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Messages that couldn't be cached at all.
+    skipped: int = 0
+    stores: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "hit_rate": round(self.hit_rate, 4)}
+
+
+@dataclass
+class _Entry:
+    texts: list[str]
+    expires: float
+    size: int
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_chars: int = 2_000_000,
+        *,
+        resolver: StationResolver = RESOLVER,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.resolver = resolver
+        self.clock = clock
+        self.stats = ResponseCacheStats()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._chars = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, text: str, *, status_version: int = 0) -> str | None:
+        """The cache key for a message, or None if it can't be cached.
+
+        Answers given under one version of the service status aren't reused
+        under another.
+        """
+        key = self._key(text)
+        if key is None:
+            self.stats.skipped += 1
+            return None
+        return f"{key}|{status_version}"
+
+    def _key(self, text: str) -> str | None:
+        if len(text) > MAX_LENGTH:
+            return None
+        mentions = self.resolver.find_in_text(text)
+        if not mentions:
+            return None
+        lowered = text.lower()
+        if _CONTEXT.intersection(_WORD.findall(lowered)):
+            return None
+
+        kinds = intent_kinds(lowered)
+        if _REALTIME.search(lowered):
+            kind = "realtime"
+        elif len(kinds) == 1:
+            kind = kinds[0]
+        else:
+            kind = "general"
+        # Whatever else the message says may change the answer ("with a
+        # wheelchair", "cheapest"), so it stays in the key, minus station
+        # names and the usual ways of phrasing the question.
+        rest = lowered
+        for mention in reversed(mentions):
+            rest = rest[: mention.start] + " " + rest[mention.end :]
+        words = {fold(w) for w in _WORD.findall(rest)}
+        if kind in ("route", "general") and not _DEPARTING.isdisjoint(words):
+            kind = "next_train"
+        words -= _FILLER
+        parts = [
+            kind,
+            ",".join(station_codes(lowered, mentions)),
+            " ".join(sorted(words)),
+        ]
+        bucket = TIME_BUCKETS.get(kind)
+        if bucket:
+            parts.append(str(int(self.clock() // bucket)))
+        return "|".join(parts)
+
+    def get(self, key: str) -> list[str] | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires <= self.clock():
+            self._remove(key)
+            self.stats.expirations += 1
+            entry = None
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry.texts
+
+    def put(self, key: str, texts: list[str]) -> None:
+        size = sum(len(t) for t in texts)
+        if not texts or size > self.max_chars:
+            return
+        if key in self._entries:
+            self._remove(key)
+        kind = key.split("|", 1)[0]
+        self._entries[key] = _Entry(texts, self.clock() + TTLS[kind], size)
+        self._chars += size
+        self.stats.stores += 1
+        logger.debug(f"Cached answer for {key!r}")
+        while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+            self._remove(next(iter(self._entries)))
+            self.stats.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        self._chars -= self._entries.pop(key).size
+
+
+def cacheable_texts(items: Iterable[object]) -> list[str] | None:
+    """The text of a finished answer, or None if it wasn't plain messages."""
+    texts = []
+    for item in items:
+        if not isinstance(item, AssistantMessageItem):
+            return None
+        texts += [content.text for content in item.content]
+    return texts or None
+
+
+async def replay(
+    thread: ThreadMetadata,
+    texts: list[str],
+    generate_id: Callable[[str], str],
+) -> AsyncIterator[ThreadStreamEvent]:
+    """Stream cached text as a new assistant message."""
+    item = AssistantMessageItem(
+        id=generate_id("message"),
+        thread_id=thread.id,
+        content=[],
+        created_at=datetime.now(),
+    )
+    yield ThreadItemAddedEvent(item=item)
+    for index, text in enumerate(texts):
+        yield ThreadItemUpdated(
+            item_id=item.id,
+            update=AssistantMessageContentPartAdded(
+                content_index=index, content=AssistantMessageContent(text="")
+            ),
+        )
+        for start in range(0, len(text), REPLAY_CHUNK):
+            yield ThreadItemUpdated(
+                item_id=item.id,
+                update=AssistantMessageContentPartTextDelta(
+                    content_index=index, delta=text[start : start + REPLAY_CHUNK]
+                ),
+            )
+        yield ThreadItemUpdated(
+            item_id=item.id,
+            update=AssistantMessageContentPartDone(
+                content_index=index, content=AssistantMessageContent(text=text)
+            ),
+        )
+    yield ThreadItemDoneEvent(
+        item=item.model_copy(
+            update={"content": [AssistantMessageContent(text=t) for t in texts]}
+        )
+    )
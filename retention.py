@@ -0,0 +1,431 @@
+"""
+Retention for PostgresStore: move threads untouched for N days to a cold tier.
+
+A stale thread, its items and the attachments its messages reference are packed
+into one zlib-compressed bundle and removed from the hot tables, which keeps the
+`threads`/`items` indexes sized to recent activity. Bundles live either in the
+`archived_threads` table or, when THREAD_ARCHIVE_DIR is set, as one file per
+thread under that directory.
+
+Archived threads don't appear in thread lists. `PostgresStore.load_thread`
+rehydrates an archived thread transparently the next time it is opened.
+
+Run `python retention.py --days 90` with DATABASE_URL set, e.g. from a nightly
+cron job. Work is done in batches of `--batch-size` threads, each in its own
+short transaction that skips rows locked by live requests.
+"""
+
+import argparse
+import base64
+import hashlib
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote
+
+import psycopg
+from psycopg.types.json import Json
+
+from migrations import migrate
+from payload_codec import ZlibCodec, decode_payload
+
+logger = logging.getLogger(__name__)
+
+_BUNDLE_CODEC = ZlibCodec(level=9)
+
+
+class ThreadArchive(ABC):
+    """Cold storage for archived thread bundles, keyed by (user_id, thread_id).
+
+    `in_database` says whether writes go through the connection and so take
+    part in its transaction. Other archives are written before the transaction
+    commits and deleted again if it rolls back; their deletes wait for commit.
+    """
+
+    in_database = True
+
+    @abstractmethod
+    def put(
+        self, conn: psycopg.Connection, user_id: str, thread_id: str, bundle: bytes
+    ) -> None: ...
+
+    @abstractmethod
+    def get(
+        self, conn: psycopg.Connection, user_id: str, thread_id: str
+    ) -> bytes | None: ...
+
+    @abstractmethod
+    def delete(
+        self, conn: psycopg.Connection, user_id: str, thread_id: str
+    ) -> None: ...
+
+
+class TableArchive(ThreadArchive):
+    """Stores bundles in the `archived_threads` table of the same database."""
+
+    def put(
+        self, conn: psycopg.Connection, user_id: str, thread_id: str, bundle: bytes
+    ) -> None:
+        conn.execute(
+            """
+            INSERT INTO archived_threads (id, user_id, bundle) VALUES (%s, %s, %s)
+            ON CONFLICT (id, user_id)
+            DO UPDATE SET bundle = EXCLUDED.bundle, archived_at = now()
+            """,
+            (thread_id, user_id, bundle),
+        )
+
+    def get(
+        self, conn: psycopg.Connection, user_id: str, thread_id: str
+    ) -> bytes | None:
+        row = conn.execute(
+            "SELECT bundle FROM archived_threads WHERE id = %s AND user_id = %s",
+            (thread_id, user_id),
+        ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def delete(self, conn: psycopg.Connection, user_id: str, thread_id: str) -> None:
+        conn.execute(
+            "DELETE FROM archived_threads WHERE id = %s AND user_id = %s",
+            (thread_id, user_id),
+        )
+
+
+class FileArchive(ThreadArchive):
+    """Stores one bundle file per thread under `directory/<user hash>/`."""
+
+    in_database = False
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+
+    def _path(self, user_id: str, thread_id: str) -> Path:
+        user_dir = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+        return self.directory / user_dir / f"{quote(thread_id, safe='')}.bundle"
+
+    def put(
+        self, conn: psycopg.Connection, user_id: str, thread_id: str, bundle: bytes
+    ) -> None:
+        path = self._path(user_id, thread_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so a crash never leaves a truncated bundle behind.
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(bundle)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def get(
+        self, conn: psycopg.Connection, user_id: str, thread_id: str
+    ) -> bytes | None:
+        try:
+            return self._path(user_id, thread_id).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, conn: psycopg.Connection, user_id: str, thread_id: str) -> None:
+        self._path(user_id, thread_id).unlink(missing_ok=True)
+
+
+def archive_from_env() -> ThreadArchive:
+    """Return a FileArchive under THREAD_ARCHIVE_DIR if set, else a TableArchive."""
+    directory = os.getenv("THREAD_ARCHIVE_DIR")
+    return FileArchive(directory) if directory else TableArchive()
+
+
+def _item_attachment_ids(data: Any, payload: bytes | None) -> list[str]:
+    item = (decode_payload(payload) if payload is not None else data)["item"]
+    return [a["id"] for a in item.get("attachments") or []]
+
+
+def pack_thread(
+    conn: psycopg.Connection, user_id: str, thread_id: str
+) -> dict[str, Any] | None:
+    """Collect a thread's rows into a JSON-compatible bundle."""
+    thread = conn.execute(
+        """
+        SELECT created_at, updated_at, data FROM threads
+        WHERE id = %s AND user_id = %s
+        """,
+        (thread_id, user_id),
+    ).fetchone()
+    if thread is None:
+        return None
+
+    items = conn.execute(
+        """
+        SELECT id, created_at, type, status, data, payload FROM items
+        WHERE thread_id = %s AND user_id = %s
+        """,
+        (thread_id, user_id),
+    ).fetchall()
+    attachment_ids = sorted({
+        a for item in items for a in _item_attachment_ids(item[4], item[5])
+    })
+    attachments = conn.execute(
+        "SELECT id, data FROM attachments WHERE user_id = %s AND id = ANY(%s)",
+        (user_id, attachment_ids),
+    ).fetchall()
+
+    return {
+        "thread": {
+            "created_at": thread[0].isoformat(),
+            "updated_at": thread[1].isoformat(),
+            "data": thread[2],
+        },
+        "items": [
+            {
+                "id": item_id,
+                "created_at": created_at.isoformat(),
+                "type": type_,
+                "status": status,
+                "data": data,
+                "payload": None
+                if payload is None
+                else base64.b64encode(payload).decode("ascii"),
+            }
+            for item_id, created_at, type_, status, data, payload in items
+        ],
+        "attachments": [{"id": a_id, "data": data} for a_id, data in attachments],
+    }
+
+
+def unpack_thread(
+    conn: psycopg.Connection, user_id: str, thread_id: str, bundle: dict[str, Any]
+) -> None:
+    """Write a bundle back to the hot tables; rows already present are kept."""
+    thread = bundle["thread"]
+    # Rehydrating counts as activity so the thread isn't archived again at once.
+    conn.execute(
+        """
+        INSERT INTO threads (id, user_id, created_at, updated_at, data)
+        VALUES (%s, %s, %s, now(), %s)
+        ON CONFLICT (id, user_id) DO NOTHING
+        """,
+        (thread_id, user_id, thread["created_at"], Json(thread["data"])),
+    )
+    with conn.cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO items
+                (id, thread_id, user_id, created_at, type, status, data, payload,
+                 attachment_ids)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (id, user_id) DO NOTHING
+            """,
+            [_item_row(user_id, thread_id, item) for item in bundle["items"]],
+        )
+        cur.executemany(
+            """
+            INSERT INTO attachments (id, user_id, data) VALUES (%s, %s, %s)
+            ON CONFLICT (id, user_id) DO NOTHING
+            """,
+            [(a["id"], user_id, Json(a["data"])) for a in bundle["attachments"]],
+        )
+
+
+def _item_row(user_id: str, thread_id: str, item: dict[str, Any]) -> tuple:
+    payload = None if item["payload"] is None else base64.b64decode(item["payload"])
+    return (
+        item["id"],
+        thread_id,
+        user_id,
+        item["created_at"],
+        item["type"],
+        item["status"],
+        None if item["data"] is None else Json(item["data"]),
+        payload,
+        _item_attachment_ids(item["data"], payload)
+        if item["type"] == "user_message"
+        else None,
+    )
+
+
+def _attachments_used_elsewhere(
+    conn: psycopg.Connection, user_id: str, thread_id: str, attachment_ids: list[str]
+) -> set[str]:
+    """The attachments in `attachment_ids` that the user's other threads use."""
+    if not attachment_ids:
+        return set()
+    shared = {
+        a
+        for (a,) in conn.execute(
+            """
+            SELECT DISTINCT a FROM items, unnest(attachment_ids) AS a
+            WHERE user_id = %s AND thread_id <> %s
+                AND attachment_ids && %s::text[] AND a = ANY(%s)
+            """,
+            (user_id, thread_id, attachment_ids, attachment_ids),
+        ).fetchall()
+    }
+    # Messages written before attachment_ids was filled in, if any are left.
+    pending = conn.execute(
+        """
+        SELECT data, payload FROM items
+        WHERE user_id = %s AND thread_id <> %s
+            AND type = 'user_message' AND attachment_ids IS NULL
+        """,
+        (user_id, thread_id),
+    ).fetchall()
+    for data, payload in pending:
+        shared.update(_item_attachment_ids(data, payload))
+    return shared & set(attachment_ids)
+
+
+def backfill_attachment_ids(conn: psycopg.Connection, batch_size: int = 1000) -> int:
+    """Fill in `items.attachment_ids` for user messages stored without it.
+
+    Migration 8 fills JSONB rows; rows stored with a payload codec are decoded
+    here, one short transaction per batch.
+    """
+    filled = 0
+    while True:
+        with conn.transaction():
+            rows = conn.execute(
+                """
+                SELECT id, user_id, data, payload FROM items
+                WHERE type = 'user_message' AND attachment_ids IS NULL
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (batch_size,),
+            ).fetchall()
+            with conn.cursor() as cur:
+                cur.executemany(
+                    """
+                    UPDATE items SET attachment_ids = %s
+                    WHERE id = %s AND user_id = %s
+                    """,
+                    [
+                        (_item_attachment_ids(data, payload), item_id, user_id)
+                        for item_id, user_id, data, payload in rows
+                    ],
+                )
+        if not rows:
+            return filled
+        filled += len(rows)
+        logger.info(f"Filled in attachment ids for {filled} items")
+
+
+def _delete_hot_rows(
+    conn: psycopg.Connection, user_id: str, thread_id: str, bundle: dict[str, Any]
+) -> None:
+    conn.execute(
+        "DELETE FROM items WHERE thread_id = %s AND user_id = %s",
+        (thread_id, user_id),
+    )
+    # Attachments other threads still show stay hot; the bundle keeps a copy.
+    attachment_ids = [a["id"] for a in bundle["attachments"]]
+    shared = _attachments_used_elsewhere(conn, user_id, thread_id, attachment_ids)
+    conn.execute(
+        "DELETE FROM attachments WHERE user_id = %s AND id = ANY(%s)",
+        (user_id, [a for a in attachment_ids if a not in shared]),
+    )
+    conn.execute(
+        "DELETE FROM threads WHERE id = %s AND user_id = %s", (thread_id, user_id)
+    )
+
+
+def archive_batch(
+    conn: psycopg.Connection,
+    archive: ThreadArchive,
+    older_than_days: float,
+    batch_size: int,
+) -> int:
+    """Archive up to `batch_size` stale threads in one transaction."""
+    written: list[tuple[str, str]] = []
+    try:
+        with conn.transaction():
+            # SKIP LOCKED leaves threads that a live request is writing to.
+            stale = conn.execute(
+                """
+                SELECT id, user_id FROM threads
+                WHERE updated_at < now() - make_interval(secs => %s)
+                ORDER BY updated_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (older_than_days * 86400, batch_size),
+            ).fetchall()
+            for thread_id, user_id in stale:
+                bundle = pack_thread(conn, user_id, thread_id)
+                if bundle is None:
+                    continue
+                archive.put(conn, user_id, thread_id, _BUNDLE_CODEC.encode(bundle))
+                if not archive.in_database:
+                    written.append((user_id, thread_id))
+                _delete_hot_rows(conn, user_id, thread_id, bundle)
+    except BaseException:
+        # The hot rows are still there; don't leave bundles that shadow them.
+        for user_id, thread_id in written:
+            archive.delete(conn, user_id, thread_id)
+        raise
+    return len(stale)
+
+
+def archive_stale_threads(
+    conninfo: str,
+    older_than_days: float,
+    archive: ThreadArchive | None = None,
+    batch_size: int = 100,
+    max_batches: int | None = None,
+) -> int:
+    """Archive threads idle for `older_than_days`; returns the number archived."""
+    migrate(conninfo)
+    archive = archive or archive_from_env()
+    archived = 0
+    batches = 0
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        backfill_attachment_ids(conn)
+        while max_batches is None or batches < max_batches:
+            count = archive_batch(conn, archive, older_than_days, batch_size)
+            if count == 0:
+                break
+            archived += count
+            batches += 1
+            logger.info(f"Archived {archived} threads")
+    return archived
+
+
+def rehydrate_thread(
+    conn: psycopg.Connection, archive: ThreadArchive, user_id: str, thread_id: str
+) -> bool:
+    """Restore an archived thread to the hot tables; False if it isn't archived."""
+    raw = archive.get(conn, user_id, thread_id)
+    if raw is None:
+        return False
+    with conn.transaction():
+        unpack_thread(conn, user_id, thread_id, decode_payload(raw))
+    archive.delete(conn, user_id, thread_id)
+    logger.info(f"Rehydrated archived thread {thread_id}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive idle threads.")
+    parser.add_argument(
+        "--days",
+        type=float,
+        default=float(os.getenv("THREAD_RETENTION_DAYS", "90")),
+        help="Archive threads with no activity for this many days.",
+    )
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    conninfo = os.getenv("DATABASE_URL")
+    if not conninfo:
+        raise SystemExit("DATABASE_URL must be set.")
+    total = archive_stale_threads(
+        conninfo, args.days, batch_size=args.batch_size, max_batches=args.max_batches
+    )
+    print(f"Archived {total} threads")
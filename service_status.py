@@ -0,0 +1,364 @@
+"""
+Live BTS service status: disruptions polled from a feed into a snapshot.
+
+`ServiceStatus.watch()` polls a status source and keeps `snapshot`, an
+immutable `StatusSnapshot` of current disruptions that is swapped whole
+whenever the feed changes and carries a version number that goes up with
+each change. Readers (the agent tool, the intent router, the response
+cache) only read that attribute, so answering a question never waits on the
+feed.
+
+Sources return the feed as a dict:
+
+    {"disruptions": [{"id": "silom-signal", "line": "silom", "from": "S2",
+      "to": "S6", "kind": "delay", "delay_minutes": 10,
+      "message": "Signal fault at Chong Nonsi"}]}
+
+`kind` is "closed", "delay" or "notice"; "from" and "to" bound the affected
+stretch, and leaving them out means the whole line. `FileStatusSource` reads
+a JSON file, `HttpStatusSource` fetches one, and `SimulatedStatusSource`
+makes up plausible disruptions. Running this module writes simulated feeds
+to a file, which doubles as a local HTTP feed when served with
+`python -m http.server`:
+
+    python service_status.py --output status.json --interval 10
+
+Point BTS_STATUS_SOURCE at a file, an http(s) URL or "simulate" to enable
+it, and BTS_STATUS_REFRESH_SECONDS to change the polling interval.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections.abc import Iterable, MutableMapping
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Protocol
+
+import httpx
+
+from bts_network import NETWORK, Network
+from chatkit.types import NoticeEvent
+from timetable import BANGKOK
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("closed", "delay", "notice")
+REFRESH_SECONDS = 30.0
+# A snapshot this many polling intervals old is reported as stale.
+STALE_INTERVALS = 4
+
+_LEVELS = {"closed": "danger", "delay": "warning", "notice": "info"}
+
+
+@dataclass(frozen=True)
+class Disruption:
+    id: str
+    line: str
+    kind: str
+    # Affected stations in line order; the whole line if the feed named none.
+    stations: tuple[str, ...]
+    message: str
+    delay_minutes: int = 0
+
+    def summary(self, network: Network) -> str:
+        line = network.lines[self.line]
+        if self.stations == line.stations:
+            where = line.name
+        else:
+            where = (
+                f"{line.name}, {network.name(self.stations[0])}"
+                f"–{network.name(self.stations[-1])}"
+            )
+        what = {
+            "closed": "No service",
+            "delay": f"Delays of up to {self.delay_minutes} min",
+            "notice": "Notice",
+        }[self.kind]
+        return f"{what} on the {where}: {self.message}"
+
+    def as_dict(self, network: Network) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "line": network.lines[self.line].name,
+            "kind": self.kind,
+            "from": network.name(self.stations[0]),
+            "to": network.name(self.stations[-1]),
+            "stations": [network.name(code) for code in self.stations],
+            "delay_minutes": self.delay_minutes,
+            "message": self.message,
+        }
+
+
+@dataclass(frozen=True)
+class StatusSnapshot:
+    version: int = 0
+    # When the feed was last read successfully; None if it never was.
+    checked_at: datetime | None = None
+    # When the disruptions last changed.
+    changed_at: datetime | None = None
+    disruptions: tuple[Disruption, ...] = ()
+
+    def affecting(
+        self, stations: Iterable[str], network: Network = NETWORK
+    ) -> list[Disruption]:
+        """Disruptions on any line serving one of `stations`."""
+        lines = {line for code in stations for line in network.lines_at(code)}
+        return [d for d in self.disruptions if d.line in lines]
+
+    def as_dict(self, network: Network) -> dict[str, Any]:
+        return {
+            "version": self.version,
+            "checked_at": _isoformat(self.checked_at),
+            "changed_at": _isoformat(self.changed_at),
+            "disruptions": [d.as_dict(network) for d in self.disruptions],
+        }
+
+
+class StatusSource(Protocol):
+    """Where disruptions come from; `fetch()` returns the feed as a dict."""
+
+    async def fetch(self) -> dict[str, Any]: ...
+
+
+class FileStatusSource:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    async def fetch(self) -> dict[str, Any]:
+        return await asyncio.to_thread(self._read)
+
+    def _read(self) -> dict[str, Any]:
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+class HttpStatusSource:
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    async def fetch(self) -> dict[str, Any]:
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.get(self.url)
+            response.raise_for_status()
+            return response.json()
+
+
+class SimulatedStatusSource:
+    """Starts and clears made-up disruptions at random, reproducibly.
+
+    Each fetch clears every disruption older than its duration and starts a
+    new one with probability `rate`.
+    """
+
+    _MESSAGES = {
+        "closed": ["Track maintenance", "Power failure", "Police incident"],
+        "delay": ["Signal fault", "Train fault", "Heavy crowding"],
+        "notice": [
+            "Platform doors out of service",
+            "Escalator maintenance",
+            "Elevator out of service",
+        ],
+    }
+
+    def __init__(self, seed: int = 0, rate: float = 0.2, network: Network = NETWORK):
+        self.random = random.Random(seed)
+        self.rate = rate
+        self.network = network
+        self.fetches = 0
+        self._active: list[tuple[int, dict[str, Any]]] = []  # (until, entry)
+
+    async def fetch(self) -> dict[str, Any]:
+        return self.step()
+
+    def step(self) -> dict[str, Any]:
+        self.fetches += 1
+        self._active = [(u, d) for u, d in self._active if u > self.fetches]
+        if self.random.random() < self.rate:
+            self._active.append((
+                self.fetches + self.random.randint(2, 10),
+                self._disruption(),
+            ))
+        return {"disruptions": [d for _, d in self._active]}
+
+    def _disruption(self) -> dict[str, Any]:
+        rng = self.random
+        line = rng.choice(list(self.network.lines.values()))
+        kind = rng.choices(KINDS, weights=(1, 3, 2))[0]
+        start = rng.randrange(len(line.stations) - 1)
+        end = min(start + rng.randint(1, 4), len(line.stations) - 1)
+        return {
+            "id": f"sim-{self.fetches}",
+            "line": line.id,
+            "from": line.stations[start],
+            "to": line.stations[end],
+            "kind": kind,
+            "delay_minutes": rng.choice((5, 10, 15, 20)) if kind == "delay" else 0,
+            "message": rng.choice(self._MESSAGES[kind]),
+        }
+
+
+def parse_feed(payload: dict[str, Any], network: Network = NETWORK) -> list[Disruption]:
+    """Disruptions in a feed; malformed entries are logged and skipped."""
+    disruptions = []
+    for entry in payload.get("disruptions", []):
+        try:
+            disruptions.append(_parse_disruption(entry, network))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Skipping status entry {entry!r}: {e}")
+    return disruptions
+
+
+def _parse_disruption(entry: dict[str, Any], network: Network) -> Disruption:
+    line = network.lines[entry["line"]]
+    kind = entry["kind"]
+    if kind not in KINDS:
+        raise ValueError(f"unknown kind {kind!r}")
+    stations = line.stations
+    if entry.get("from") or entry.get("to"):
+        i = line.stations.index(entry.get("from") or entry["to"])
+        j = line.stations.index(entry.get("to") or entry["from"])
+        stations = line.stations[min(i, j) : max(i, j) + 1]
+    return Disruption(
+        id=str(entry["id"]),
+        line=line.id,
+        kind=kind,
+        stations=stations,
+        message=str(entry.get("message", "")),
+        delay_minutes=int(entry.get("delay_minutes") or 0),
+    )
+
+
+class ServiceStatus:
+    """The latest snapshot of a status source, refreshed by `watch()`."""
+
+    def __init__(
+        self,
+        source: StatusSource | None,
+        network: Network = NETWORK,
+        *,
+        interval: float = REFRESH_SECONDS,
+    ):
+        self.source = source
+        self.network = network
+        self.interval = interval
+        self.snapshot = StatusSnapshot()
+        self.failures = 0
+
+    @property
+    def stale(self) -> bool:
+        """Whether the snapshot can't be trusted to reflect the feed."""
+        checked = self.snapshot.checked_at
+        if checked is None:
+            return True
+        age = (datetime.now(BANGKOK) - checked).total_seconds()
+        return age > STALE_INTERVALS * self.interval
+
+    async def refresh(self) -> bool:
+        """Read the source once; return whether the disruptions changed."""
+        assert self.source is not None
+        disruptions = tuple(parse_feed(await self.source.fetch(), self.network))
+        now = datetime.now(BANGKOK)
+        previous = self.snapshot
+        changed = disruptions != previous.disruptions
+        self.snapshot = StatusSnapshot(
+            version=previous.version + changed,
+            checked_at=now,
+            changed_at=now if changed else previous.changed_at,
+            disruptions=disruptions,
+        )
+        self.failures = 0
+        if changed:
+            logger.info(
+                f"Service status version {self.snapshot.version}: "
+                f"{len(disruptions)} disruptions"
+            )
+        return changed
+
+    async def watch(self) -> None:
+        """Poll the source every `interval` seconds, forever."""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Reading service status failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def notices(self, seen: MutableMapping[str, Any]) -> list[NoticeEvent]:
+        """Notices for what changed since a thread last saw the status.
+
+        `seen` is the thread's metadata. The disruptions a thread has been
+        told about are kept there, so each change is announced once per
+        thread, whichever worker answers it.
+        """
+        snapshot = self.snapshot
+        told: dict[str, str] = seen.get("status_told") or {}
+        current = {d.id: d.summary(self.network) for d in snapshot.disruptions}
+        if current == told:
+            return []
+        events = [
+            NoticeEvent(
+                level=_LEVELS[d.kind],
+                title="Service update",
+                message=current[d.id],
+            )
+            for d in snapshot.disruptions
+            if told.get(d.id) != current[d.id]
+        ]
+        events += [
+            NoticeEvent(level="info", title="Service restored", message=summary)
+            for key, summary in told.items()
+            if key not in current
+        ]
+        if current:
+            seen["status_told"] = current
+        else:
+            del seen["status_told"]
+        return events
+
+
+def source_from_env(value: str | None) -> StatusSource | None:
+    """The source BTS_STATUS_SOURCE names: a path, a URL or "simulate"."""
+    if not value:
+        return None
+    if value == "simulate":
+        return SimulatedStatusSource(seed=int(time.time()))
+    if value.startswith(("http://", "https://")):
+        return HttpStatusSource(value)
+    return FileStatusSource(value)
+
+
+def _isoformat(value: datetime | None) -> str | None:
+    return value.isoformat(timespec="seconds") if value is not None else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Write simulated BTS service status feeds to a file."
+    )
+    parser.add_argument("--output", required=True, help="JSON file to write")
+    parser.add_argument("--interval", type=float, default=REFRESH_SECONDS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    simulator = SimulatedStatusSource(seed=args.seed, rate=args.rate)
+    output = Path(args.output)
+    while True:
+        payload = simulator.step()
+        # Replace the file whole so readers never see half of it.
+        partial = output.with_suffix(output.suffix + ".tmp")
+        partial.write_text(json.dumps(payload, ensure_ascii=False, indent=2))
+        partial.replace(output)
+        print(f"{len(payload['disruptions'])} disruptions")
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
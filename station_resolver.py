@@ -0,0 +1,313 @@
+"""
+Fuzzy BTS station lookup over English and Thai names, spellings and landmarks.
+
+Every station is indexed under its code, English name, Thai name, common
+alternative romanizations ("Asoke", "Thonglor", "Morchit") and nearby
+landmarks ("Siam Paragon", "Terminal 21"). Names are folded before indexing:
+case, spacing and punctuation are dropped and common romanization differences
+(ph/p, th/t, kh/k, doubled letters) are collapsed, so many variants match
+exactly. Other queries are ranked by the overlap of their character trigrams
+with each name, with a bonus for prefixes, looked up in a prebuilt trigram
+index and a sorted prefix table rather than by scanning every name.
+
+`RESOLVER.search()` returns ranked matches; `find_in_text()` picks station
+mentions out of a whole message, so requests can be annotated before they
+reach the model.
+"""
+
+import bisect
+import logging
+import re
+import unicodedata
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+
+from bts_network import NETWORK, Network, UnknownStationError
+
+logger = logging.getLogger(__name__)
+
+# A single best match at or above this score is taken as the station meant.
+MIN_SCORE = 0.5
+# Fuzzy matches inside free text must be closer than standalone queries.
+MIN_TEXT_SCORE = 0.75
+
+ALIASES: dict[str, list[str]] = {
+    "N8": ["Morchit", "Chatuchak Park", "Chatuchak Market", "JJ Market"],
+    "N7": ["Saphan Kwai", "Sapan Kwai"],
+    "N5": ["Aree"],
+    "N3": ["Anusawari", "Anusawari Chai", "Victory Monument"],
+    "N2": ["Phayathai", "Airport Rail Link", "ARL"],
+    "N1": ["Ratchatewi"],
+    "N9": ["Lat Phrao", "Central Ladprao", "Ladprao"],
+    "N13": ["Kaset", "Kasetsart"],
+    "CEN": [
+        "Siam Square",
+        "Siam Paragon",
+        "Siam Center",
+        "Siam Discovery",
+        "Paragon",
+    ],
+    "W1": ["MBK", "MBK Center", "Jim Thompson House", "Sanam Kila"],
+    "E1": [
+        "Chidlom",
+        "Central World",
+        "CentralWorld",
+        "Central Chidlom",
+        "Erawan Shrine",
+    ],
+    "E2": ["Ploenchit", "Ploen Chit", "Central Embassy"],
+    "E3": ["Nana Plaza"],
+    "E4": ["Asoke", "Terminal 21", "MRT Sukhumvit"],
+    "E5": [
+        "Phromphong",
+        "Prompong",
+        "Promphong",
+        "EmQuartier",
+        "Emporium",
+        "Benjasiri Park",
+    ],
+    "E6": ["Thonglor", "Thong Lor", "Thonglo"],
+    "E7": ["Ekamai", "Eastern Bus Terminal", "Ekkamai Bus Terminal"],
+    "E8": ["Prakanong", "Phrakhanong"],
+    "E9": ["Onnut", "On Nuch"],
+    "E12": ["Udomsuk"],
+    "E13": ["Bangna"],
+    "E14": ["Baring"],
+    "E15": ["Samrong Station"],
+    "E17": ["Erawan Museum"],
+    "S2": [
+        "Saladaeng",
+        "Sala Deng",
+        "Silom",
+        "MRT Silom",
+        "Lumpini Park",
+        "Lumphini Park",
+    ],
+    "S3": ["Chongnonsi", "Chong Nonsri", "King Power Mahanakhon", "Mahanakhon"],
+    "S6": ["Taksin", "Sathorn Pier", "Sathon Pier", "Central Pier", "Asiatique"],
+    "S7": ["Krungthonburi", "Iconsiam", "Gold Line"],
+    "S8": ["Wongwian Yai Circle", "Wong Wian Yai"],
+    "S12": ["Bangwa", "MRT Bang Wa"],
+}
+
+# Words that never start a station mention in a message.
+STOPWORDS = frozenset(
+    """a an and any are at bts by can do does for from get go going how i in is
+    it last line me my next of on or please skytrain station stations take
+    the there time to train trains travel what when where which will with
+    you""".split()
+)
+
+_LATIN_WORD = re.compile(r"[A-Za-z0-9]+")
+_THAI = re.compile(r"[฀-๿]")
+
+_FOLDS = [
+    (re.compile(r"ph"), "p"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"kh"), "k"),
+    (re.compile(r"ee"), "i"),
+    (re.compile(r"oo"), "u"),
+    (re.compile(r"([a-z])\1+"), r"\1"),
+]
+
+
+def fold(text: str) -> str:
+    """Reduce a name to the form it is indexed and matched under."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    # Thai vowels and tone marks are combining marks, not letters.
+    text = "".join(
+        ch for ch in text if ch.isalnum() or unicodedata.category(ch).startswith("M")
+    )
+    for pattern, replacement in _FOLDS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _trigrams(folded: str) -> set[str]:
+    padded = f"^{folded}$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class Match:
+    code: str
+    name: str
+    # The name or alias that matched.
+    matched: str
+    score: float
+
+
+@dataclass(frozen=True)
+class Mention:
+    match: Match
+    # The span of the message that names the station.
+    text: str
+    start: int
+    end: int
+
+
+class StationResolver:
+    """Trigram and prefix index over every name a station goes by."""
+
+    def __init__(
+        self,
+        network: Network = NETWORK,
+        aliases: Mapping[str, Iterable[str]] = ALIASES,
+    ):
+        self.network = network
+        self._names: list[tuple[str, str, str]] = []  # (folded, code, shown)
+        self._exact: dict[str, int] = {}
+        for station in network.stations.values():
+            for name in (
+                station.code,
+                station.name,
+                station.name_th,
+                *aliases.get(station.code, ()),
+            ):
+                self._add(name, station.code)
+        self._grams: list[set[str]] = [_trigrams(f) for f, _, _ in self._names]
+        self._postings: dict[str, list[int]] = {}
+        for i, grams in enumerate(self._grams):
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+        # Sorted folded names for prefix lookups by bisection.
+        self._prefixes = sorted((f, i) for i, (f, _, _) in enumerate(self._names))
+        self._prefix_keys = [f for f, _ in self._prefixes]
+        # Thai names, longest first so they win over names they contain.
+        self._thai = sorted(
+            ((f, i) for i, (f, _, _) in enumerate(self._names) if _THAI.search(f)),
+            key=lambda entry: -len(entry[0]),
+        )
+        logger.debug(f"Indexed {len(self._names)} station names")
+
+    def _add(self, name: str, code: str) -> None:
+        folded = fold(name)
+        if not folded:
+            return
+        existing = self._exact.get(folded)
+        if existing is not None and self._names[existing][1] != code:
+            raise ValueError(
+                f"{name!r} names both {self._names[existing][1]} and {code}"
+            )
+        if existing is None:
+            self._exact[folded] = len(self._names)
+            self._names.append((folded, code, name))
+
+    def search(self, query: str, limit: int = 5) -> list[Match]:
+        """Stations that `query` may name, best first, one entry per station."""
+        folded = fold(query)
+        if not folded:
+            return []
+        scores: dict[int, float] = {}
+        exact = self._exact.get(folded)
+        if exact is not None:
+            scores[exact] = 1.0
+        if len(folded) >= 2:
+            keys = self._prefix_keys
+            for j in range(bisect.bisect_left(keys, folded), len(keys)):
+                key, i = self._prefixes[j]
+                if not key.startswith(folded):
+                    break
+                # Longer completions of the query rank below closer ones.
+                prefix_score = 0.6 + 0.35 * len(folded) / len(key)
+                scores[i] = max(scores.get(i, 0.0), prefix_score)
+        grams = _trigrams(folded)
+        overlaps: dict[int, int] = {}
+        for gram in grams:
+            for i in self._postings.get(gram, ()):
+                overlaps[i] = overlaps.get(i, 0) + 1
+        for i, overlap in overlaps.items():
+            dice = 2 * overlap / (len(grams) + len(self._grams[i]))
+            if dice > scores.get(i, 0.0):
+                scores[i] = dice
+
+        best: dict[str, Match] = {}
+        for i, score in sorted(scores.items(), key=lambda item: -item[1]):
+            _, code, shown = self._names[i]
+            if code not in best:
+                best[code] = Match(
+                    code=code,
+                    name=self.network.name(code),
+                    matched=shown,
+                    score=round(score, 3),
+                )
+                if len(best) == limit:
+                    break
+        return list(best.values())
+
+    def resolve(self, query: str) -> str:
+        """The code of the station `query` names, or UnknownStationError.
+
+        The error lists the closest candidates, so it can be shown as is.
+        """
+        matches = self.search(query, limit=3)
+        if matches and matches[0].score >= MIN_SCORE:
+            return matches[0].code
+        message = f"Unknown BTS station: {query!r}."
+        if matches:
+            message += " Did you mean " + " or ".join(m.name for m in matches) + "?"
+        raise UnknownStationError(message)
+
+    def find_in_text(self, text: str) -> list[Mention]:
+        """Station mentions in a message, longest first where they overlap."""
+        mentions: list[Mention] = []
+        taken: list[tuple[int, int]] = []
+
+        def claim(match: Match, start: int, end: int) -> None:
+            if any(start < e and s < end for s, e in taken):
+                return
+            taken.append((start, end))
+            mentions.append(Mention(match, text[start:end], start, end))
+
+        # Thai has no spaces between words, so look for each Thai name directly.
+        if _THAI.search(text):
+            folded_text = fold(text)
+            for folded, i in self._thai:
+                if folded not in folded_text:
+                    continue
+                _, code, shown = self._names[i]
+                start = text.find(shown)
+                end = start + len(shown)
+                if start == -1:
+                    # Written with spaces or punctuation: report it without a span.
+                    start = end = 0
+                claim(Match(code, self.network.name(code), shown, 1.0), start, end)
+
+        words = list(_LATIN_WORD.finditer(text))
+        # Exact names anywhere take precedence over fuzzy matches, which could
+        # otherwise swallow part of a neighbouring name.
+        for fuzzy in (False, True):
+            for size in (4, 3, 2, 1):
+                for k in range(len(words) - size + 1):
+                    window = words[k : k + size]
+                    start, end = window[0].start(), window[-1].end()
+                    if any(start < e and s < end for s, e in taken):
+                        continue
+                    phrase = " ".join(w.group() for w in window)
+                    if not fuzzy:
+                        exact = self._exact.get(fold(phrase))
+                        # Names may start or end with a stopword ("On Nut").
+                        if exact is None or (size == 1 and phrase.lower() in STOPWORDS):
+                            continue
+                        _, code, shown = self._names[exact]
+                        match = Match(code, self.network.name(code), shown, 1.0)
+                        claim(match, start, end)
+                    elif len(phrase) >= 4 and not any(
+                        w.group().lower() in STOPWORDS for w in window
+                    ):
+                        matches = self.search(phrase, limit=1)
+                        if matches and matches[0].score >= MIN_TEXT_SCORE:
+                            claim(matches[0], start, end)
+        mentions.sort(key=lambda m: m.start)
+        return mentions
+
+    def hint(self, text: str) -> str | None:
+        """A note naming the stations a message mentions, for the model."""
+        mentions = self.find_in_text(text)
+        if not mentions:
+            return None
+        parts = [f'"{m.text}" = {m.match.name} ({m.match.code})' for m in mentions]
+        return "Stations mentioned by the user: " + "; ".join(parts) + "."
+
+
+RESOLVER = StationResolver()
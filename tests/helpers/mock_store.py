@@ -1,10 +1,17 @@
+import json
 import sqlite3
+from collections.abc import AsyncIterable, AsyncIterator, Collection, Iterable
 from pathlib import Path
 from typing import Any
 
 from pydantic import BaseModel
 
-from chatkit.store import NotFoundError, Store
+from chatkit.store import (
+    NotFoundError,
+    Store,
+    ThreadRecord,
+    read_export_batches,
+)
 from chatkit.types import (
     Attachment,
     Page,
@@ -121,6 +128,22 @@ class SQLiteStore(Store[RequestContext]):
         limit: int,
         order: str,
         context: RequestContext,
+    ) -> Page[ThreadItem]:
+        return await self.load_thread_items_filtered(
+            thread_id, after, limit, order, context
+        )
+
+    async def load_thread_items_filtered(
+        self,
+        thread_id: str,
+        after: str | None,
+        limit: int,
+        order: str,
+        context: RequestContext,
+        *,
+        types: Collection[str] | None = None,
+        exclude_types: Collection[str] | None = None,
+        status: str | None = None,
     ) -> Page[ThreadItem]:
         with self._create_connection() as conn:
             created_after: str | None = None
@@ -143,6 +166,15 @@ class SQLiteStore(Store[RequestContext]):
                     " AND created_at > ?" if order == "asc" else " AND created_at < ?"
                 )
                 params.append(created_after)
+            if types is not None:
+                query += f" AND json_extract(data, '$.item.type') IN ({', '.join('?' * len(types))})"
+                params.extend(types)
+            if exclude_types is not None:
+                query += f" AND json_extract(data, '$.item.type') NOT IN ({', '.join('?' * len(exclude_types))})"
+                params.extend(exclude_types)
+            if status is not None:
+                query += " AND json_extract(data, '$.item.status') = ?"
+                params.append(status)
 
             query += f" ORDER BY created_at {order} LIMIT ?"
             params.append(limit + 1)
@@ -304,6 +336,69 @@ class SQLiteStore(Store[RequestContext]):
             )
             conn.commit()
 
+    async def export_ndjson(
+        self, context: RequestContext, *, batch_size: int = 500
+    ) -> AsyncIterator[bytes]:
+        # Threads and items in one query, each thread followed by its items.
+        with self._create_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, 0, created_at, data FROM threads WHERE user_id = ?
+                UNION ALL
+                SELECT thread_id, 1, created_at, data FROM items WHERE user_id = ?
+                ORDER BY 1, 2, 3
+                """,
+                (context.user_id, context.user_id),
+            )
+            while batch := rows.fetchmany(batch_size):
+                for thread_id, kind, _, data in batch:
+                    if kind == 0:
+                        yield data.encode() + b"\n"
+                    else:
+                        # Stored item JSON is {"item": ...}; splice the thread ID in.
+                        yield f'{{"thread_id":{json.dumps(thread_id)},{data[1:]}\n'.encode()
+
+    async def import_ndjson(
+        self,
+        lines: AsyncIterable[bytes | str] | Iterable[bytes | str],
+        context: RequestContext,
+        *,
+        batch_size: int = 500,
+    ) -> int:
+        count = 0
+        async for batch in read_export_batches(lines, batch_size):
+            with self._create_connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO threads (id, user_id, created_at, data) VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            r.thread.id,
+                            context.user_id,
+                            r.thread.created_at.isoformat(),
+                            ThreadData(thread=r.thread).model_dump_json(),
+                        )
+                        for r in batch
+                        if isinstance(r, ThreadRecord)
+                    ],
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO items (id, thread_id, user_id, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            r.item.id,
+                            r.thread_id,
+                            context.user_id,
+                            r.item.created_at.isoformat(),
+                            ItemData(item=r.item).model_dump_json(),
+                        )
+                        for r in batch
+                        if not isinstance(r, ThreadRecord)
+                    ],
+                )
+                conn.commit()
+            count += len(batch)
+        return count
+
     async def save_sample_widget(
         self,
         widget: SampleWidget,
@@ -0,0 +1,13 @@
+import json
+from typing import Any
+
+from agents import FunctionTool
+from agents.tool_context import ToolContext
+
+
+async def invoke_tool(tool: FunctionTool, **arguments: Any) -> str:
+    args = json.dumps(arguments)
+    context = ToolContext(
+        context=None, tool_name=tool.name, tool_call_id="call_1", tool_arguments=args
+    )
+    return await tool.on_invoke_tool(context, args)
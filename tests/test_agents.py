@@ -467,6 +467,52 @@ async def test_input_item_converter_to_input_items_mixed():
     assert "created_at" not in text
 
 
+async def test_input_item_converter_widget_text_format():
+    item = WidgetItem(
+        id="wd_123",
+        widget=Card(
+            padding={"x": 4, "y": 3},
+            children=[Text(value="Mo Chit", color="secondary", weight="medium")],
+        ),
+        thread_id=thread.id,
+        created_at=datetime.now(),
+    )
+
+    input_items = await ThreadItemConverter(widget_format="text").to_agent_input(item)
+    assert len(input_items) == 1
+    text = input_items[0]["content"][0]["text"]  # type: ignore
+    assert text == (
+        "The following graphical UI widget (id: wd_123) was displayed to the user:"
+        "\nMo Chit"
+    )
+
+    input_items = await ThreadItemConverter(
+        widget_format="text", widget_max_chars=4
+    ).to_agent_input(item)
+    assert input_items[0]["content"][0]["text"].endswith(":\nMo …")  # type: ignore
+
+
+async def test_input_item_converter_subclass_without_super_init():
+    class LegacyConverter(ThreadItemConverter):
+        def __init__(self, prefix: str):
+            self.prefix = prefix
+
+    item = WidgetItem(
+        id="wd_123",
+        widget=Card(children=[Text(value="Mo Chit")]),
+        thread_id=thread.id,
+        created_at=datetime.now(),
+    )
+    input_items = await LegacyConverter("x").to_agent_input(item)
+    assert '"Mo Chit"' in input_items[0]["content"][0]["text"]  # type: ignore
+
+    class CompactConverter(LegacyConverter):
+        widget_format = "text"
+
+    input_items = await CompactConverter("x").to_agent_input(item)
+    assert input_items[0]["content"][0]["text"].endswith(":\nMo Chit")  # type: ignore
+
+
 async def test_input_item_converter_user_input_with_tags():
     class MyThreadItemConverter(ThreadItemConverter):
         def tag_to_message_content(self, tag):
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from bts_matrices import FARE_CAP, TravelMatrices, route_fare
+from bts_network import NETWORK, UnknownStationError
+
+MATRICES = TravelMatrices.build()
+
+
+def test_matrices_match_planner():
+    for origin in ["N24", "N8", "CEN", "E9", "S12"]:
+        for destination in ["N3", "CEN", "E23", "W1", "S6"]:
+            route = NETWORK.route(origin, destination)
+            i, j = MATRICES.index[origin], MATRICES.index[destination]
+            assert MATRICES.seconds[i, j] == route.seconds
+            assert MATRICES.hops[i, j] == route.stops
+            assert MATRICES.transfers[i, j] == route.transfers
+            assert MATRICES.fares[i, j] == route_fare(route)
+
+
+def test_fares():
+    assert MATRICES.lookup(["Siam"], ["Siam"]).fares[0] == 0
+    # One core station, then the same trip extended into the east section.
+    assert route_fare(NETWORK.route("E8", "E9")) == 17
+    assert route_fare(NETWORK.route("E8", "E10")) == 17 + 15
+    # Within an extension section only the section fee applies.
+    assert route_fare(NETWORK.route("E11", "E14")) == 15
+    assert MATRICES.fares.max() == FARE_CAP
+    assert (MATRICES.fares == MATRICES.fares.T).all()
+
+
+def test_batch_lookup():
+    costs = MATRICES.lookup(["Mo Chit", "N8", "asok"], ["Siam", "S12", "E4"])
+    assert costs.origins == ["N8", "N8", "E4"]
+    assert costs.seconds.tolist() == [
+        NETWORK.travel_seconds("N8", "CEN"),
+        NETWORK.travel_seconds("N8", "S12"),
+        0,
+    ]
+    assert costs.transfers.tolist() == [0, 1, 0]
+
+    with pytest.raises(UnknownStationError):
+        MATRICES.lookup(["Siam"], ["Hogwarts"])
+    with pytest.raises(ValueError):
+        MATRICES.lookup(["Siam"], [])
+
+
+def test_save_and_load_memory_mapped(tmp_path):
+    MATRICES.save(tmp_path)
+    loaded = TravelMatrices.load(tmp_path)
+    assert isinstance(loaded.data, np.memmap)
+    assert np.array_equal(loaded.data, MATRICES.data)
+    assert loaded.lookup(["N8"], ["S12"]).fares.tolist() == [
+        MATRICES.fares[MATRICES.index["N8"], MATRICES.index["S12"]]
+    ]
+
+
+def test_stale_file_is_rebuilt(tmp_path):
+    MATRICES.save(tmp_path)
+    (tmp_path / "stations.json").write_text('{"stations": ["N8"], "layers": []}')
+    with pytest.raises(ValueError):
+        TravelMatrices.load(tmp_path)
+    rebuilt = TravelMatrices.load_or_build(tmp_path)
+    assert not isinstance(rebuilt.data, np.memmap)
+    assert rebuilt.codes == MATRICES.codes
+    assert isinstance(
+        TravelMatrices.load_or_build(tmp_path / "missing").data, np.ndarray
+    )
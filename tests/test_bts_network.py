@@ -0,0 +1,158 @@
+import itertools
+import json
+import random
+
+import pytest
+from helpers.tools import invoke_tool
+
+from bts_network import (
+    NETWORK,
+    TRANSFER_SECONDS,
+    Line,
+    Network,
+    NoRouteError,
+    Station,
+    UnknownStationError,
+)
+from bts_tools import line_stations, plan_route, trip_costs
+
+
+def test_route_on_one_line():
+    route = NETWORK.route("Mo Chit", "Asok")
+    assert route.transfers == 0
+    (leg,) = route.legs
+    assert leg.line == "sukhumvit"
+    assert leg.stations[0] == "N8" and leg.stations[-1] == "E4"
+    assert leg.towards == "E23"
+    assert route.seconds == leg.seconds
+
+
+def test_route_changes_at_siam():
+    route = NETWORK.route("N8", "S6")
+    assert [leg.line for leg in route.legs] == ["sukhumvit", "silom"]
+    assert route.legs[0].stations[-1] == route.legs[1].stations[0] == "CEN"
+    assert route.legs[1].towards == "S12"
+    assert route.seconds == sum(leg.seconds for leg in route.legs) + TRANSFER_SECONDS
+
+
+def test_route_to_siam_does_not_transfer():
+    assert NETWORK.route("W1", "CEN").transfers == 0
+    assert NETWORK.route("CEN", "E1").transfers == 0
+
+
+def test_route_to_same_station():
+    route = NETWORK.route("Siam", "siam")
+    assert route.legs == ()
+    assert route.seconds == 0
+
+
+def test_tables_match_search():
+    codes = list(NETWORK.stations)
+    for origin in codes[::7]:
+        for destination in codes[::5]:
+            route = NETWORK.route(origin, destination)
+            assert route == NETWORK.shortest_path(origin, destination)
+            assert route.seconds == NETWORK.travel_seconds(origin, destination)
+            assert route.seconds == NETWORK.travel_seconds(destination, origin)
+
+
+def test_unknown_station():
+    with pytest.raises(UnknownStationError):
+        NETWORK.route("Mo Chit", "Hogwarts")
+
+
+def _ring() -> Network:
+    """Two lines that meet at both ends, so trips can go either way round."""
+    stations = [Station(code, code, code) for code in "ABCDEFGH"]
+    return Network(
+        stations,
+        [
+            Line("inner", "Inner", "#000", tuple("ABCDE"), (60, 60, 60, 60)),
+            Line("outer", "Outer", "#fff", tuple("AFGHE"), (90, 90, 90, 90)),
+        ],
+        transfer_seconds=30,
+    )
+
+
+def test_penalties_reroute():
+    network = _ring()
+    assert [leg.line for leg in network.route("B", "D").legs] == ["inner"]
+
+    stats = network.set_penalties({("inner", "C", "D"): None})
+    assert stats.segments == 1 and stats.origins > 0
+    route = network.route("B", "D")
+    assert [leg.line for leg in route.legs] == ["inner", "outer", "inner"]
+    assert route.seconds == 60 + 30 + 360 + 30 + 60
+
+    network.set_penalties({("inner", "C", "D"): 30})
+    assert network.travel_seconds("B", "D") == 150
+    network.set_penalties({})
+    assert network.travel_seconds("B", "D") == 120
+
+
+def test_penalties_on_a_tree_cut_routes():
+    network = Network(NETWORK.stations.values(), NETWORK.lines.values())
+    network.set_penalties({("silom", "S3", "S2"): None})
+    assert not network.reachable("CEN", "S6")
+    with pytest.raises(NoRouteError):
+        network.route("CEN", "S6")
+    assert network.travel_seconds("S6", "S3") == NETWORK.travel_seconds("S6", "S3")
+    # Penalties only ever touch the network they're set on.
+    assert NETWORK.reachable("CEN", "S6")
+
+
+def test_incremental_repair_matches_search():
+    network = _ring()
+    segments = [
+        (line.id, a, b)
+        for line in network.lines.values()
+        for a, b in itertools.pairwise(line.stations)
+    ]
+    rng = random.Random(3)
+    for _ in range(100):
+        chosen = rng.sample(segments, rng.randint(0, 4))
+        network.set_penalties({
+            segment: None if rng.random() < 0.3 else rng.randint(0, 400)
+            for segment in chosen
+        })
+        for origin, destination in itertools.product("ABCDEFGH", repeat=2):
+            if not network.reachable(origin, destination):
+                with pytest.raises(NoRouteError):
+                    network.shortest_path(origin, destination)
+                continue
+            assert (
+                network.route(origin, destination).seconds
+                == network.shortest_path(origin, destination).seconds
+            )
+
+
+async def test_plan_route_tool():
+    result = json.loads(
+        await invoke_tool(plan_route, origin="mo chit", destination="S12")
+    )
+    assert result["origin"] == "Mo Chit"
+    assert result["destination"] == "Bang Wa"
+    assert result["transfers"] == 1
+    assert [leg["towards"] for leg in result["legs"]] == ["Kheha", "Bang Wa"]
+
+    message = await invoke_tool(plan_route, origin="Mo Chit", destination="Hogwarts")
+    assert "Hogwarts" in message
+
+
+async def test_line_stations_tool():
+    stations = json.loads(await invoke_tool(line_stations, line="Silom Line"))
+    assert stations[0]["name"] == "National Stadium"
+    assert stations[-1]["code"] == "S12"
+    assert "Unknown BTS line" in await invoke_tool(line_stations, line="purple")
+
+
+async def test_trip_costs_tool():
+    result = json.loads(
+        await invoke_tool(trip_costs, origin="Asok", destinations=["Siam", "Bang Wa"])
+    )
+    assert [r["destination"] for r in result] == ["Siam", "Bang Wa"]
+    assert result[0]["fare_baht"] < result[1]["fare_baht"]
+    assert result[1]["transfers"] == 1
+
+    message = await invoke_tool(trip_costs, origin="Asok", destinations=["Hogwarts"])
+    assert "Hogwarts" in message
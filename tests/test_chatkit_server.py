@@ -1,7 +1,7 @@
 import sqlite3
 from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, AsyncIterator, Callable, cast
+from typing import Any, AsyncIterator, Callable, Literal, cast
 
 import pytest
 from helpers.mock_store import SQLiteStore
@@ -27,6 +27,7 @@ from chatkit.types import (
     ClientToolCallItem,
     FeedbackKind,
     FileAttachment,
+    HiddenContextItem,
     ImageAttachment,
     InferenceOptions,
     ItemFeedbackParams,
@@ -136,6 +137,7 @@ def make_server(
     ]
     | None = None,
     file_store: AttachmentStore | None = None,
+    commit_mode: Literal["write", "item", "turn"] = "write",
 ):
     global server_id
     db_path = f"file:{server_id}?mode=memory&cache=shared"
@@ -145,7 +147,7 @@ def make_server(
 
     class TestChatKitServer(ChatKitServer):
         def __init__(self):
-            super().__init__(SQLiteStore(db_path), file_store)
+            super().__init__(SQLiteStore(db_path), file_store, commit_mode=commit_mode)
 
         def action(
             self,
@@ -921,6 +923,64 @@ async def test_get_thread_by_id():
         assert loaded_thread.items.data[0].content[0].text == "Test thread"
 
 
+async def test_hidden_context_items_are_not_listed():
+    async def responder(
+        thread: ThreadMetadata, input: UserMessageItem | None, context: Any
+    ) -> AsyncIterator[ThreadStreamEvent]:
+        yield ThreadItemDoneEvent(
+            item=HiddenContextItem(
+                id="hidden_1",
+                content={"note": "internal"},
+                created_at=datetime.now(),
+                thread_id=thread.id,
+            ),
+        )
+        yield ThreadItemDoneEvent(
+            item=AssistantMessageItem(
+                id="msg_1",
+                content=[AssistantMessageContent(text="Hello, world!")],
+                created_at=datetime.now(),
+                thread_id=thread.id,
+            ),
+        )
+
+    with make_server(responder) as server:
+        events = await server.process_streaming(
+            ThreadsCreateReq(
+                params=ThreadCreateParams(
+                    input=UserMessageInput(
+                        content=[UserMessageTextContent(text="Hi")],
+                        attachments=[],
+                        inference_options=InferenceOptions(),
+                    )
+                )
+            )
+        )
+        thread = next(
+            event.thread for event in events if event.type == "thread.created"
+        )
+
+        list_result = await server.process_non_streaming(
+            ItemsListReq(params=ItemsListParams(thread_id=thread.id, order="asc"))
+        )
+        items = TypeAdapter(Page[ThreadItem]).validate_json(list_result.json)
+        assert [item.type for item in items.data] == [
+            "user_message",
+            "assistant_message",
+        ]
+        assert items.has_more is False
+
+        result = await server.process_non_streaming(
+            ThreadsGetByIdReq(params=ThreadGetByIdParams(thread_id=thread.id))
+        )
+        loaded_thread = TypeAdapter(Thread).validate_json(result.json)
+        assert loaded_thread.id == thread.id
+        assert [item.id for item in loaded_thread.items.data] == [
+            items.data[0].id,
+            "msg_1",
+        ]
+
+
 async def test_create_file():
     store = InMemoryFileStore()
     file_name = "test-file-name"
@@ -1216,6 +1276,170 @@ async def test_thread_item_removed_event_removes_item():
         assert all(i.id != removed_id for i in items)
 
 
+@pytest.mark.parametrize("commit_mode", ["item", "turn"])
+async def test_unit_of_work_commits_at_item_or_turn_end(commit_mode):
+    stored_mid_turn: list[bool] = []
+
+    async def responder(
+        thread: ThreadMetadata,
+        input: UserMessageItem | None,
+        context: Any,
+    ) -> AsyncIterator[ThreadStreamEvent]:
+        for item_id in ["msg_a", "msg_b"]:
+            yield ThreadItemDoneEvent(
+                item=AssistantMessageItem(
+                    id=item_id,
+                    content=[AssistantMessageContent(text=item_id)],
+                    thread_id=thread.id,
+                    created_at=datetime.now(),
+                )
+            )
+            try:
+                await server.store.load_item(thread.id, item_id, context)
+                stored_mid_turn.append(True)
+            except NotFoundError:
+                stored_mid_turn.append(False)
+
+    with make_server(responder, commit_mode=commit_mode) as server:
+        events = await server.process_streaming(
+            ThreadsCreateReq(
+                params=ThreadCreateParams(
+                    input=UserMessageInput(
+                        content=[UserMessageTextContent(text="Hello")],
+                        attachments=[],
+                        inference_options=InferenceOptions(),
+                    )
+                )
+            )
+        )
+        thread = next(
+            event.thread for event in events if event.type == "thread.created"
+        )
+        list_result = await server.process_non_streaming(
+            ItemsListReq(params=ItemsListParams(thread_id=thread.id))
+        )
+        items = TypeAdapter(Page[ThreadItem]).validate_json(list_result.json).data
+
+    assert stored_mid_turn == [commit_mode == "item"] * 2
+    assert {i.id for i in items if i.type == "assistant_message"} == {
+        "msg_a",
+        "msg_b",
+    }
+
+
+async def test_unit_of_work_drops_items_removed_before_commit():
+    async def responder(
+        thread: ThreadMetadata,
+        input: UserMessageItem | None,
+        context: Any,
+    ) -> AsyncIterator[ThreadStreamEvent]:
+        # What stream_agent_response does when a guardrail trips.
+        yield ThreadItemDoneEvent(
+            item=AssistantMessageItem(
+                id="msg_tripped",
+                content=[AssistantMessageContent(text="Unsafe")],
+                thread_id=thread.id,
+                created_at=datetime.now(),
+            )
+        )
+        yield ThreadItemRemovedEvent(item_id="msg_tripped")
+        raise ValueError("Guardrail tripwire triggered")
+
+    with make_server(responder, commit_mode="turn") as server:
+        deleted: list[str] = []
+        delete_thread_item = server.store.delete_thread_item
+
+        async def record_delete(thread_id: str, item_id: str, context: Any) -> None:
+            deleted.append(item_id)
+            await delete_thread_item(thread_id, item_id, context)
+
+        server.store.delete_thread_item = record_delete  # type: ignore[method-assign]
+        events = await server.process_streaming(
+            ThreadsCreateReq(
+                params=ThreadCreateParams(
+                    input=UserMessageInput(
+                        content=[UserMessageTextContent(text="Hello")],
+                        attachments=[],
+                        inference_options=InferenceOptions(),
+                    )
+                )
+            )
+        )
+        thread = next(
+            event.thread for event in events if event.type == "thread.created"
+        )
+        list_result = await server.process_non_streaming(
+            ItemsListReq(params=ItemsListParams(thread_id=thread.id))
+        )
+        items = TypeAdapter(Page[ThreadItem]).validate_json(list_result.json).data
+
+    assert events[-1].type == "error"
+    assert deleted == []
+    assert [i.type for i in items] == ["user_message"]
+
+
+@pytest.mark.parametrize("commit_mode", ["item", "turn"])
+async def test_unit_of_work_discards_pending_writes_on_error(commit_mode):
+    async def responder(
+        thread: ThreadMetadata,
+        input: UserMessageItem | None,
+        context: Any,
+    ) -> AsyncIterator[ThreadStreamEvent]:
+        item = AssistantMessageItem(
+            id="msg_partial",
+            content=[AssistantMessageContent(text="Partial")],
+            thread_id=thread.id,
+            created_at=datetime.now(),
+        )
+        yield ThreadItemDoneEvent(item=item)
+        yield ThreadItemDoneEvent(
+            item=AssistantMessageItem(
+                id="msg_tripped",
+                content=[AssistantMessageContent(text="Unsafe")],
+                thread_id=thread.id,
+                created_at=datetime.now(),
+            )
+        )
+        yield ThreadItemRemovedEvent(item_id="msg_tripped")
+        yield ThreadItemReplacedEvent(
+            item=item.model_copy(
+                update={"content": [AssistantMessageContent(text="Edited")]}
+            )
+        )
+        raise ValueError("Model call failed")
+
+    with make_server(responder, commit_mode=commit_mode) as server:
+        events = await server.process_streaming(
+            ThreadsCreateReq(
+                params=ThreadCreateParams(
+                    input=UserMessageInput(
+                        content=[UserMessageTextContent(text="Hello")],
+                        attachments=[],
+                        inference_options=InferenceOptions(),
+                    )
+                )
+            )
+        )
+        thread = next(
+            event.thread for event in events if event.type == "thread.created"
+        )
+        list_result = await server.process_non_streaming(
+            ItemsListReq(params=ItemsListParams(thread_id=thread.id))
+        )
+        items = TypeAdapter(Page[ThreadItem]).validate_json(list_result.json).data
+
+    assert events[-1].type == "error"
+    assistant = [i for i in items if i.type == "assistant_message"]
+    if commit_mode == "turn":
+        # Nothing from the failed turn is stored.
+        assert assistant == []
+    else:
+        # Finished items are kept; the pending replacement is not.
+        assert [(i.id, i.content[0].text) for i in assistant] == [
+            ("msg_partial", "Partial")
+        ]
+
+
 async def test_raising_in_responder_yields_error_event():
     async def responder(
         thread: ThreadMetadata,
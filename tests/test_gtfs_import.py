@@ -0,0 +1,130 @@
+import itertools
+import os
+from datetime import datetime
+
+from bts_network import NETWORK
+from gtfs_import import GtfsImporter, read_feed
+
+MONDAY_6AM = datetime(2026, 10, 19, 6)
+
+# Explicit, increasing mtimes, so rewrites are noticed on coarse filesystems.
+_MTIMES = itertools.count(10**18, 10**9)
+
+STOP_TIMES = [
+    "t1,06:00:00,06:00:00,s_w1,1",
+    "t1,06:02:00,06:02:00,s_cen,2",
+    "t1,06:04:00,06:04:00,s_s1,3",
+    "t1,06:06:00,06:06:00,s_s2,4",
+    # Short working: ends at Ratchadamri, listed out of order.
+    "t2,06:12:00,06:12:00,s_cen,2",
+    "t2,06:10:00,06:10:00,s_w1,1",
+    "t2,06:14:00,06:14:00,s_s1,3",
+    "t3,24:30:00,24:30:00,s_s2,1",
+    "t3,24:32:00,24:32:00,s_s1,2",
+    "t4,06:05:00,06:05:00,s_e4,1",
+    "t4,06:07:00,06:07:00,s_e3,2",
+]
+
+
+def _write(path, header, *rows):
+    path.write_text("\n".join([header, *rows]) + "\n")
+    mtime = next(_MTIMES)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def write_feed(directory, stop_times=STOP_TIMES):
+    _write(
+        directory / "stops.txt",
+        "stop_id,stop_code,stop_name",
+        "s_w1,W1,National Stadium",
+        "s_cen,CEN,Siam",
+        "s_s1,S1,Ratchadamri",
+        "s_s2,S2,Sala Daeng",
+        "s_e3,E3,Nana",
+        "s_e4,E4,Asok",
+    )
+    _write(
+        directory / "calendar.txt",
+        "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,"
+        "start_date,end_date",
+        "wk,1,1,1,1,1,0,0,20260101,20261231",
+        "we,0,0,0,0,0,1,1,20260101,20261231",
+    )
+    _write(
+        directory / "trips.txt",
+        "route_id,service_id,trip_id",
+        "silom,wk,t1",
+        "silom,wk,t2",
+        "silom,we,t3",
+        "sukhumvit,wk,t4",
+    )
+    _write(
+        directory / "stop_times.txt",
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence",
+        *stop_times,
+    )
+
+
+def test_read_feed_into_arrays(tmp_path):
+    write_feed(tmp_path)
+    tables = read_feed(tmp_path)
+    assert tables.route_ids == ["silom", "sukhumvit"]
+    assert len(tables.stop_trip) == len(STOP_TIMES)
+    assert tables.stop_trip.itemsize == 4
+    assert tables.stop_seconds[7] == 24 * 3600 + 1800
+
+    trips = list(tables.trips(NETWORK))
+    assert [t.route for t in trips] == ["silom"] * 3 + ["sukhumvit"]
+    assert [code for code, _ in trips[1].stops] == ["W1", "CEN", "S1"]
+    assert [t.line for t in tables.trips(NETWORK, ["sukhumvit"])] == ["sukhumvit"]
+
+
+def test_timetable_from_feed(tmp_path):
+    write_feed(tmp_path)
+    timetable = GtfsImporter(tmp_path).build()
+    assert timetable.trip_count == 4
+
+    to_sala_daeng = timetable.next_departures("W1", "S2", when=MONDAY_6AM, count=5)
+    assert to_sala_daeng[0].time == datetime(2026, 10, 19, 6, 0)
+    # The short working doesn't reach Sala Daeng; the next is the next day's t1.
+    assert to_sala_daeng[1].time == datetime(2026, 10, 20, 6, 0)
+    to_ratchadamri = timetable.next_departures("W1", "S1", when=MONDAY_6AM, count=2)
+    assert [d.terminates for d in to_ratchadamri] == ["S2", "S1"]
+
+    saturday_night = datetime(2026, 10, 25, 0, 20)
+    (late,) = timetable.next_departures("S2", "S1", when=saturday_night, count=1)
+    assert late.time == datetime(2026, 10, 25, 0, 30)
+
+
+def test_refresh_rebuilds_only_changed_routes(tmp_path):
+    write_feed(tmp_path)
+    importer = GtfsImporter(tmp_path)
+    timetable = importer.build()
+    asok_board = timetable._boards[("E4", "sukhumvit", "N24", "weekday")]
+
+    # Untouched files are not read again.
+    assert importer.refresh() is None
+
+    # Re-sorting the feed is not a change.
+    write_feed(tmp_path, list(reversed(STOP_TIMES)))
+    result = importer.refresh()
+    assert result is not None and result.changed_routes == []
+
+    # Retiming a Silom trip rebuilds Silom boards only.
+    retimed = [row.replace("06:02:00", "06:03:00") for row in STOP_TIMES]
+    write_feed(tmp_path, retimed)
+    result = importer.refresh()
+    assert result is not None
+    assert result.changed_routes == ["silom"]
+    assert 0 < result.boards_rebuilt < timetable.board_count
+    assert importer.timetable is timetable
+    assert timetable._boards[("E4", "sukhumvit", "N24", "weekday")] is asok_board
+    (siam,) = timetable.next_departures("CEN", "S2", when=MONDAY_6AM, count=1)
+    assert siam.time == datetime(2026, 10, 19, 6, 3)
+
+    # Dropping a route removes its departures.
+    write_feed(tmp_path, [row for row in retimed if not row.startswith("t4")])
+    result = importer.refresh()
+    assert result is not None and result.changed_routes == ["sukhumvit"]
+    assert ("E4", "sukhumvit", "N24", "weekday") not in timetable._boards
+    assert timetable.trip_count == 3
@@ -0,0 +1,103 @@
+from datetime import datetime
+
+import pytest
+
+from bts_matrices import TravelMatrices
+from intent_router import Intent, IntentRouter
+from timetable import Timetable
+
+ROUTER = IntentRouter(TravelMatrices.build(), Timetable.generate())
+EVENING = datetime(2026, 10, 19, 18, 0)
+
+
+@pytest.mark.parametrize(
+    "text,intent",
+    [
+        ("How do I get from Mo Chit to Saphan Taksin?", Intent("route", ("N8", "S6"))),
+        ("How much is it from Asok to Siam?", Intent("fare", ("E4", "CEN"))),
+        ("to Asok from Siam, how much?", Intent("fare", ("CEN", "E4"))),
+        ("fare from asoke to thonglor", Intent("fare", ("E4", "E6"))),
+        ("First train at Asok?", Intent("first_last", ("E4",))),
+        ("Last train from Mo Chit to Bang Wa", Intent("first_last", ("N8", "S12"))),
+        ("next train at Siam Paragon", Intent("next_train", ("CEN",))),
+        (
+            "How often do trains run from Siam to On Nut?",
+            Intent("frequency", ("CEN", "E9")),
+        ),
+    ],
+)
+def test_classify(text, intent):
+    assert ROUTER.classify(text) == intent
+
+
+@pytest.mark.parametrize(
+    "text,reason",
+    [
+        ("What's the weather like?", "no_intent"),
+        ("fare to Siam", "stations"),
+        ("How much is the next train from Asok to Siam?", "ambiguous"),
+        ("Next train from Asok at 10pm", "unsupported"),
+        ("Is the elevator at Asok working?", "unsupported"),
+        ("Last train from Asok tomorrow", "unsupported"),
+        ("รถไฟเที่ยวสุดท้ายจากหมอชิต", "thai"),
+        ("How much from Asok to Siam? " * 10, "too_long"),
+        ("How much time from Siam to Mo Chit?", "extra_words"),
+        ("Can I pay the fare with a credit card from Siam to Asok?", "extra_words"),
+        ("Is the first train from Siam to Mo Chit crowded?", "extra_words"),
+        ("I missed the last train from Asok to Siam, what now?", "extra_words"),
+        ("How do I get from Siam to Mo Chit with a bike?", "extra_words"),
+    ],
+)
+def test_classify_falls_through(text, reason):
+    assert ROUTER.classify(text) == reason
+
+
+def test_answers_route_with_widget():
+    answer = ROUTER.answer("How do I get from Mo Chit to Saphan Taksin?")
+    assert answer is not None
+    assert answer.widget.type == "Card"
+    lines = answer.text.splitlines()
+    assert lines[0] == "Mo Chit to Saphan Taksin"
+    assert "Change at Siam to the Silom Line" in lines[2]
+    assert lines[-1].endswith("1 change, 47 baht.")
+
+
+def test_answers_match_tools_data():
+    fare = ROUTER.answer("How much is it from Asok to Siam?")
+    assert fare is not None
+    assert fare.text.startswith("32 baht")
+
+    trains = ROUTER.answer("Next train from Siam to Mo Chit", when=EVENING)
+    assert trains is not None
+    assert trains.text.splitlines()[1:4] == [
+        f"18:0{m} Sukhumvit Line towards Khu Khot" for m in (0, 3, 6)
+    ]
+
+    often = ROUTER.answer("How often do trains run from Siam to Onnut?", when=EVENING)
+    assert often is not None
+    assert often.text.startswith("Every 3 min")
+
+
+def test_first_last_for_every_direction():
+    answer = ROUTER.answer("first train at Asok", when=EVENING)
+    assert answer is not None
+    assert [line.split(":")[0] for line in answer.text.splitlines()[1:3]] == [
+        "Towards Khu Khot",
+        "Towards Kheha",
+    ]
+
+
+def test_stats():
+    router = IntentRouter(ROUTER.matrices, ROUTER.timetable)
+    assert router.answer("fare from Asok to Siam") is not None
+    assert router.answer("why is the train late?") is None
+    assert router.answer("fare to Siam") is None
+    router.record_agent_response(2.5)
+
+    stats = router.stats.as_dict()
+    assert stats["messages"] == 3
+    assert stats["answered_by_intent"] == {"fare": 1}
+    assert stats["fell_through"] == {"unsupported": 1, "stations": 1}
+    assert stats["hit_rate"] == pytest.approx(1 / 3, abs=1e-4)
+    assert stats["answer_seconds_max"] > 0
+    assert stats["agent_seconds_total"] == 2.5
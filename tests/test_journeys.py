@@ -0,0 +1,146 @@
+import itertools
+import json
+from datetime import datetime
+
+import pytest
+from helpers.tools import invoke_tool
+
+import bts_tools
+from bts_matrices import route_fare
+from bts_network import NETWORK, Line, Network, Station
+from journeys import JourneyPlanner
+from rerouting import step_free_outages
+from service_status import ServiceStatus
+from timetable import MIN_CONNECTION_SECONDS, Timetable, Trip
+
+TIMETABLE = Timetable.generate()
+MORNING = datetime(2026, 10, 19, 8)
+
+
+class StaticSource:
+    def __init__(self, *disruptions):
+        self.payload = {"disruptions": list(disruptions)}
+
+    async def fetch(self):
+        return self.payload
+
+
+class RideFares:
+    empty = 0
+
+    def board(self, state, line, station):
+        return state + 10
+
+    def ride(self, state, line, a, b):
+        return state + 1
+
+    def amount(self, state):
+        return state
+
+    def covers(self, a, b):
+        return a <= b
+
+
+def _planner(**kwargs) -> JourneyPlanner:
+    """A fast trip with a change at B, and a slower direct line."""
+    network = Network(
+        [Station(code, code, code) for code in "ABCD"],
+        [
+            Line("a", "A", "#000", ("A", "B"), (60,)),
+            Line("b", "B", "#000", ("B", "D"), (60,)),
+            Line("c", "C", "#000", ("A", "C", "D"), (400, 400)),
+        ],
+    )
+    trips = []
+    for line in network.lines.values():
+        for start in range(6 * 3600, 9 * 3600, 300):
+            offsets = [0, *itertools.accumulate(line.segment_seconds)]
+            stops = tuple(zip(line.stations, (start + o for o in offsets)))
+            trips.append(Trip(line.id, frozenset(["weekday"]), stops))
+    return JourneyPlanner(Timetable(network, trips), RideFares(), **kwargs)
+
+
+def test_bts_journey_matches_the_route_and_fare():
+    [journey] = JourneyPlanner(TIMETABLE).search("Mo Chit", "S6", when=MORNING)
+    route = NETWORK.route("N8", "S6")
+    assert [(leg.line, leg.board, leg.alight) for leg in journey.legs] == [
+        (leg.line, leg.stations[0], leg.stations[-1]) for leg in route.legs
+    ]
+    assert journey.fare == route_fare(route)
+    first = TIMETABLE.next_departures("N8", "S6", when=MORNING, count=1)[0]
+    assert journey.departure == first.time
+    change = journey.legs[1].depart - journey.legs[0].arrive
+    assert change.total_seconds() >= MIN_CONNECTION_SECONDS
+    result = journey.as_dict(NETWORK)
+    assert result["transfers"] == 1 and result["step_free"] is True
+    assert result["legs"][1]["towards"] == "Bang Wa"
+
+
+def test_pareto_set_trades_time_for_transfers_and_fare():
+    planner = _planner()
+    when = datetime(2026, 10, 19, 7)
+    fastest, direct = planner.search("A", "D", when=when)
+    assert [leg.line for leg in fastest.legs] == ["a", "b"]
+    assert [leg.line for leg in direct.legs] == ["c"]
+    assert fastest.arrival < direct.arrival
+    assert (fastest.fare, direct.fare) == (22, 12)
+    assert planner.search("A", "D", when=when, prefer="cheapest")[0] == direct
+    assert planner.search("A", "D", when=when, limit=1) == [fastest]
+
+
+def test_step_free_access_and_closures():
+    planner = _planner(no_step_free={"B"})
+    when = datetime(2026, 10, 19, 7)
+    fastest, direct = planner.search("A", "D", when=when)
+    assert fastest.no_step_free == ("B",) and direct.no_step_free == ()
+    assert planner.search("A", "D", when=when, prefer="step_free")[0] == direct
+
+    [journey] = planner.search("A", "D", when=when, closed=[("b", "D", "B")])
+    assert journey == direct
+    assert planner.search("A", "D", when=datetime(2026, 10, 19, 22)) == []
+    with pytest.raises(ValueError):
+        planner.search("A", "A", when=when)
+    with pytest.raises(ValueError):
+        planner.search("A", "D", when=when, prefer="scenic")
+
+
+async def test_plan_journey_tool_follows_the_status(monkeypatch):
+    source = StaticSource({
+        "id": "lift",
+        "line": "silom",
+        "from": "CEN",
+        "to": "CEN",
+        "kind": "notice",
+        "message": "Elevator out of service",
+    })
+    status = ServiceStatus(source)
+    monkeypatch.setattr(bts_tools, "STATUS", status)
+    await status.refresh()
+    assert step_free_outages(status.snapshot) == {"CEN"}
+
+    result = json.loads(
+        await invoke_tool(
+            bts_tools.plan_journey,
+            origin="Mo Chit",
+            destination="Sala Daeng",
+            prefer="step_free",
+            depart_at="08:00",
+        )
+    )
+    [journey] = result["journeys"]
+    assert journey["step_free"] is False
+    assert journey["no_step_free_at"] == ["Siam"]
+
+    source.payload = {
+        "disruptions": [
+            {"id": "x", "line": "silom", "from": "CEN", "to": "S2", "kind": "closed"}
+        ]
+    }
+    await status.refresh()
+    assert "Closures cut BTS service" in await invoke_tool(
+        bts_tools.plan_journey,
+        origin="Mo Chit",
+        destination="Sala Daeng",
+        prefer="fastest",
+        depart_at="08:00",
+    )
@@ -0,0 +1,35 @@
+import pytest
+
+from payload_codec import (
+    CompactJsonCodec,
+    ZlibCodec,
+    decode_payload,
+    get_codec,
+)
+
+DATA = {
+    "item": {
+        "id": "msg_1",
+        "type": "assistant_message",
+        "content": [{"text": "Take the Sukhumvit Line to Siam. " * 10}],
+        "quoted_text": None,
+    }
+}
+
+
+@pytest.mark.parametrize("codec", [CompactJsonCodec(), ZlibCodec()])
+def test_round_trip(codec):
+    payload = codec.encode(DATA)
+    assert payload[0] == codec.version
+    assert decode_payload(payload) == DATA
+
+
+def test_zlib_is_smaller_than_json():
+    assert len(ZlibCodec().encode(DATA)) < len(CompactJsonCodec().encode(DATA))
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_codec("brotli")
+    with pytest.raises(ValueError):
+        decode_payload(b"\xff{}")
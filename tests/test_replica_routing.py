@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+from psycopg.pq import TransactionStatus
+
+from replica_routing import ReplicaRouter
+
+UNREACHABLE = "host=/nonexistent dbname=chatkit"
+
+
+def _read(router: ReplicaRouter, user_id: str):
+    with router.read_connection(user_id) as conn:
+        return conn
+
+
+class FakeConnection:
+    closed = False
+    broken = False
+    info = SimpleNamespace(transaction_status=TransactionStatus.IDLE)
+
+    def __init__(self, lag: float = 0.0):
+        self.lag = lag
+        self.lag_queries = 0
+
+    def execute(self, query):
+        self.lag_queries += 1
+        return SimpleNamespace(fetchone=lambda: (self.lag,))
+
+
+def test_recent_writers_read_from_primary():
+    router = ReplicaRouter([UNREACHABLE], sticky_seconds=60)
+    router.note_write("user_1")
+    assert router.is_sticky("user_1")
+    assert not router.is_sticky("user_2")
+    assert _read(router, "user_1") is None
+
+
+def test_sticky_window_covers_max_lag():
+    router = ReplicaRouter([UNREACHABLE], max_lag=3, lag_check_interval=1)
+    assert router.sticky_seconds == 4
+
+
+def test_unreachable_replica_falls_back_and_is_skipped():
+    router = ReplicaRouter([UNREACHABLE], retry_after=60)
+    assert _read(router, "user_1") is None
+    replica = router._replicas[0]
+    assert replica.unavailable_until > 0
+
+    # Skipped without another connection attempt until retry_after passes.
+    replica.pool.conninfo = "not a dsn"
+    assert _read(router, "user_1") is None
+
+
+def test_replica_connections_are_pooled_and_lag_checks_cached():
+    router = ReplicaRouter([UNREACHABLE], lag_check_interval=60)
+    conn = FakeConnection()
+    router._replicas[0].pool.checkin(conn)
+
+    assert _read(router, "user_1") is conn
+    assert _read(router, "user_2") is conn
+    assert conn.lag_queries == 1
+
+
+def test_lagging_replica_is_skipped():
+    router = ReplicaRouter([UNREACHABLE], max_lag=5, lag_check_interval=60)
+    conn = FakeConnection(lag=30)
+    router._replicas[0].pool.checkin(conn)
+    assert _read(router, "user_1") is None
+    # The connection goes back to the pool for when the replica catches up.
+    assert router._replicas[0].pool.checkout() is conn
@@ -0,0 +1,103 @@
+import json
+
+import pytest
+from helpers.tools import invoke_tool
+
+import bts_tools
+from bts_network import NETWORK
+from rerouting import LiveRoutes, segment_penalties
+from service_status import ServiceStatus
+
+
+class StaticSource:
+    def __init__(self, *disruptions):
+        self.payload = {"disruptions": list(disruptions)}
+
+    async def fetch(self):
+        return self.payload
+
+
+def _disruption(kind, line="silom", start="S2", end="S4", **extra):
+    return {
+        "id": f"{kind}-{start}",
+        "line": line,
+        "from": start,
+        "to": end,
+        "kind": kind,
+        "message": "Test",
+        **extra,
+    }
+
+
+async def test_segment_penalties():
+    status = ServiceStatus(
+        StaticSource(
+            _disruption("delay", delay_minutes=5),
+            _disruption("closed", start="S3", end="S4"),
+            _disruption("notice", start="S6", end="S8"),
+        )
+    )
+    await status.refresh()
+    assert segment_penalties(status.snapshot) == {
+        ("silom", "S2", "S3"): 150,
+        ("silom", "S3", "S4"): None,
+    }
+
+
+async def test_delays_slow_the_live_route():
+    source = StaticSource(_disruption("delay", delay_minutes=10))
+    status = ServiceStatus(source)
+    live = LiveRoutes(status)
+    await status.refresh()
+
+    alternate = live.alternate("CEN", "S6")
+    assert alternate.live is not None
+    assert alternate.live.seconds == alternate.scheduled.seconds + 600
+    assert [d.id for d in alternate.disruptions] == ["delay-S2"]
+    result = alternate.as_dict(NETWORK)
+    assert result["extra_minutes"] == 10
+
+    # Trips that miss the stretch are unaffected.
+    assert live.alternate("CEN", "N8").disruptions == ()
+    assert live.route("S6", "S5").seconds == NETWORK.travel_seconds("S6", "S5")
+
+    source.payload = {"disruptions": []}
+    await status.refresh()
+    assert live.route("CEN", "S6") == NETWORK.route("CEN", "S6")
+
+
+async def test_closures_name_where_bts_stops_and_resumes():
+    status = ServiceStatus(StaticSource(_disruption("closed")))
+    await status.refresh()
+    alternate = LiveRoutes(status).alternate("N8", "S6")
+    assert alternate.live is None
+    result = alternate.as_dict(NETWORK)
+    assert result["live"] is None
+    assert result["bts_reaches"] == "Sala Daeng"
+    assert result["bts_resumes_at"] == "Saint Louis"
+
+
+@pytest.fixture
+def closed_silom(monkeypatch):
+    status = ServiceStatus(StaticSource(_disruption("closed")))
+    monkeypatch.setattr(bts_tools, "STATUS", status)
+    monkeypatch.setattr(bts_tools, "LIVE_ROUTES", LiveRoutes(status))
+    return status
+
+
+async def test_route_tools_report_disruptions(closed_silom):
+    await closed_silom.refresh()
+    planned = json.loads(
+        await invoke_tool(bts_tools.plan_route, origin="Mo Chit", destination="S6")
+    )
+    assert planned["disruptions"][0].startswith("No service on the Silom Line")
+    alternate = json.loads(
+        await invoke_tool(
+            bts_tools.alternate_route, origin="Mo Chit", destination="Saphan Taksin"
+        )
+    )
+    assert alternate["scheduled"]["minutes"] == planned["minutes"]
+    assert alternate["bts_resumes_at"] == "Saint Louis"
+    assert "Unknown BTS station" in await invoke_tool(
+        bts_tools.alternate_route, origin="Hogwarts", destination="Siam"
+    )
@@ -0,0 +1,187 @@
+from datetime import datetime
+
+import pytest
+
+from chatkit.types import (
+    AssistantMessageContent,
+    AssistantMessageContentPartTextDelta,
+    AssistantMessageItem,
+    ThreadItemAddedEvent,
+    ThreadItemDoneEvent,
+    ThreadItemUpdated,
+    ThreadMetadata,
+    WidgetItem,
+)
+from chatkit.widgets import Card
+from response_cache import (
+    TIME_BUCKETS,
+    TTLS,
+    ResponseCache,
+    cacheable_texts,
+    replay,
+)
+
+
+class Clock:
+    def __init__(self, now: float = 1_800_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_rephrasings_share_a_key():
+    cache = ResponseCache(clock=Clock())
+    key = cache.key("How do I get from Siam to Mo Chit?")
+    assert key is not None
+    assert key.startswith("route|CEN,N8|")
+    assert cache.key("siam to mochit how to go") == key
+    assert cache.key("How do I get from Siam Paragon to Mo Chit") == key
+    # Reversed, or with a requirement, it's a different question.
+    assert cache.key("How do I get from Mo Chit to Siam?") != key
+    assert cache.key("How do I get from Siam to Mo Chit with a wheelchair?") != key
+
+
+@pytest.mark.parametrize(
+    "a,b",
+    [
+        ("first train from Siam to Asok", "last train from Siam to Asok"),
+        ("earliest train from Siam to Asok", "latest train from Siam to Asok"),
+        ("How do I get from Siam to Asok?", "How do I get to Siam from Asok?"),
+        ("next train from Siam to Asok", "next train to Siam from Asok"),
+    ],
+)
+def test_questions_with_different_answers_get_different_keys(a, b):
+    cache = ResponseCache(clock=Clock())
+    assert cache.key(a) is not None
+    assert cache.key(a) != cache.key(b)
+
+
+def test_keys_follow_origin_and_destination():
+    cache = ResponseCache(clock=Clock())
+    key = cache.key("How do I get to Siam from Asok?")
+    assert key is not None and key.startswith("route|E4,CEN|")
+    assert cache.key("from Asok to Siam") == key
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "When does the train from Siam to Asok leave?",
+        "What time does the train from Siam to Asok leave?",
+        "Siam to Asok, when does it depart?",
+    ],
+)
+def test_departure_questions_depend_on_the_time(text):
+    clock = Clock()
+    cache = ResponseCache(clock=clock)
+    key = cache.key(text)
+    assert key is not None and key.startswith("next_train|CEN,E4|")
+    clock.now += TIME_BUCKETS["next_train"]
+    assert cache.key(text) != key
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "hello",
+        "and from there to Asok?",
+        "What about the other direction from Siam?",
+        "Is Asok near Nana? " * 20,
+    ],
+)
+def test_skips_messages_that_depend_on_context(text):
+    cache = ResponseCache()
+    assert cache.key(text) is None
+    assert cache.stats.skipped == 1
+
+
+def test_time_dependent_keys_change_with_the_bucket():
+    clock = Clock()
+    cache = ResponseCache(clock=clock)
+    route = cache.key("route from Asok to Siam")
+    delays = cache.key("Any delays at Asok?")
+    assert delays is not None and delays.startswith("realtime|E4|")
+    clock.now += 3600
+    assert cache.key("route from Asok to Siam") == route
+    assert cache.key("Any delays at Asok?") != delays
+
+
+def test_entries_expire_per_kind():
+    clock = Clock()
+    cache = ResponseCache(clock=clock)
+    route = cache.key("How do I get from Siam to Mo Chit?")
+    general = cache.key("What is near Asok?")
+    cache.put(route, ["Take the Sukhumvit Line towards Khu Khot."])
+    cache.put(general, ["Terminal 21."])
+
+    clock.now += TTLS["general"]
+    assert cache.get(general) is None
+    assert cache.get(route) == ["Take the Sukhumvit Line towards Khu Khot."]
+    clock.now += TTLS["route"]
+    assert cache.get(route) is None
+    assert cache.stats.as_dict() == {
+        "hits": 1,
+        "misses": 2,
+        "skipped": 0,
+        "stores": 2,
+        "evictions": 0,
+        "expirations": 2,
+        "hit_rate": 0.3333,
+    }
+
+
+def test_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, max_chars=10, clock=Clock())
+    cache.put("route|a|", ["aaa"])
+    cache.put("route|b|", ["bbb"])
+    assert cache.get("route|a|") == ["aaa"]
+    cache.put("route|c|", ["ccc"])
+    assert cache.get("route|b|") is None
+    assert len(cache) == 2
+    # Over the character budget, older entries go until it fits.
+    cache.put("route|d|", ["dddddddd"])
+    assert len(cache) == 1
+    assert cache.get("route|d|") == ["dddddddd"]
+    # An answer bigger than the whole cache isn't stored.
+    cache.put("route|e|", ["e" * 11])
+    assert cache.get("route|e|") is None
+    assert cache.stats.evictions == 3
+
+
+def _message(*texts: str) -> AssistantMessageItem:
+    return AssistantMessageItem(
+        id="msg",
+        thread_id="thr",
+        created_at=datetime.now(),
+        content=[AssistantMessageContent(text=t) for t in texts],
+    )
+
+
+def test_cacheable_texts():
+    assert cacheable_texts([_message("a", "b"), _message("c")]) == ["a", "b", "c"]
+    assert cacheable_texts([]) is None
+    widget = WidgetItem(
+        id="w", thread_id="thr", created_at=datetime.now(), widget=Card(children=[])
+    )
+    assert cacheable_texts([_message("a"), widget]) is None
+
+
+async def test_replay_streams_a_message():
+    thread = ThreadMetadata(id="thr", created_at=datetime.now())
+    text = "Take the Sukhumvit Line towards Khu Khot, 7 stops to Siam. " * 3
+    events = [e async for e in replay(thread, [text], lambda _: "msg_1")]
+
+    assert isinstance(events[0], ThreadItemAddedEvent)
+    assert events[0].item.content == []
+    deltas = [
+        e.update.delta
+        for e in events
+        if isinstance(e, ThreadItemUpdated)
+        and isinstance(e.update, AssistantMessageContentPartTextDelta)
+    ]
+    assert len(deltas) > 1 and "".join(deltas) == text
+    done = events[-1]
+    assert isinstance(done, ThreadItemDoneEvent)
+    assert done.item.id == "msg_1"
+    assert [c.text for c in done.item.content] == [text]
@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+from payload_codec import decode_payload
+from retention import _BUNDLE_CODEC, FileArchive, _delete_hot_rows, archive_batch
+
+
+def test_file_archive_round_trip(tmp_path):
+    archive = FileArchive(tmp_path)
+    bundle = _BUNDLE_CODEC.encode({"thread": {"data": {}}, "items": []})
+
+    archive.put(None, "user/1", "../thr_1", bundle)
+    assert archive.get(None, "user/1", "../thr_1") == bundle
+    assert decode_payload(bundle)["items"] == []
+    # User and thread ids never escape the archive directory.
+    assert all(tmp_path in p.parents for p in tmp_path.rglob("*"))
+    assert archive.get(None, "user/2", "../thr_1") is None
+
+    archive.delete(None, "user/1", "../thr_1")
+    archive.delete(None, "user/1", "../thr_1")
+    assert archive.get(None, "user/1", "../thr_1") is None
+
+
+class _Rows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class _Connection:
+    """Answers each query with the rows of the first matching prefix."""
+
+    def __init__(self, results, fail_on=None):
+        self.results = results
+        self.fail_on = fail_on
+        self.executed = []
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        if self.fail_on is not None and query.startswith(self.fail_on):
+            raise RuntimeError("statement failed")
+        self.executed.append((query, params))
+        for prefix, rows in self.results.items():
+            if query.startswith(prefix):
+                return _Rows(rows)
+        return _Rows([])
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+
+def test_purge_keeps_attachments_other_threads_use():
+    pending = {"item": {"attachments": [{"id": "att_old"}, {"id": "att_other"}]}}
+    conn = _Connection({
+        "SELECT DISTINCT a FROM items": [("att_shared",)],
+        "SELECT data, payload FROM items": [(pending, None)],
+    })
+    bundle = {
+        "attachments": [{"id": "att_shared"}, {"id": "att_old"}, {"id": "att_own"}]
+    }
+
+    _delete_hot_rows(conn, "user_1", "thr_1", bundle)
+    deletes = {q: p for q, p in conn.executed if q.startswith("DELETE")}
+    query = "DELETE FROM attachments WHERE user_id = %s AND id = ANY(%s)"
+    assert deletes[query] == ("user_1", ["att_own"])
+    # Shared attachments are found by ID, not by reading every message.
+    [(_, params)] = [q for q in conn.executed if "unnest" in q[0]]
+    assert params[2] == ["att_shared", "att_old", "att_own"]
+
+
+def test_failed_batch_removes_bundle_files(tmp_path):
+    now = datetime.now(timezone.utc)
+    conn = _Connection(
+        {
+            "SELECT id, user_id FROM threads": [("thr_1", "user_1")],
+            "SELECT created_at, updated_at, data FROM threads": [(now, now, {})],
+        },
+        fail_on="DELETE FROM threads",
+    )
+    archive = FileArchive(tmp_path)
+
+    with pytest.raises(RuntimeError):
+        archive_batch(conn, archive, 90, 10)
+    assert archive.get(conn, "user_1", "thr_1") is None
+    assert not list(tmp_path.rglob("*.bundle"))
@@ -0,0 +1,170 @@
+import json
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from helpers.tools import invoke_tool
+
+import bts_tools
+from bts_matrices import TravelMatrices
+from bts_network import NETWORK
+from intent_router import IntentRouter
+from service_status import (
+    FileStatusSource,
+    HttpStatusSource,
+    ServiceStatus,
+    SimulatedStatusSource,
+    parse_feed,
+)
+from timetable import Timetable
+
+SILOM_DELAY = {
+    "id": "silom-signal",
+    "line": "silom",
+    "from": "S6",
+    "to": "S2",
+    "kind": "delay",
+    "delay_minutes": 10,
+    "message": "Signal fault at Chong Nonsi",
+}
+
+
+class StaticSource:
+    def __init__(self, *disruptions):
+        self.payload = {"disruptions": list(disruptions)}
+
+    async def fetch(self):
+        return self.payload
+
+
+def test_parse_feed():
+    disruptions = parse_feed({
+        "disruptions": [
+            SILOM_DELAY,
+            {"id": "x", "line": "sukhumvit", "kind": "closed", "message": "Strike"},
+            {"id": "bad-line", "line": "gold", "kind": "closed"},
+            {"id": "bad-kind", "line": "silom", "kind": "flood"},
+            {"id": "bad-station", "line": "silom", "from": "E4", "kind": "delay"},
+        ]
+    })
+    assert [d.id for d in disruptions] == ["silom-signal", "x"]
+    delay, closure = disruptions
+    assert delay.stations == ("S2", "S3", "S4", "S5", "S6")
+    assert delay.summary(NETWORK) == (
+        "Delays of up to 10 min on the Silom Line, Sala Daeng–Saphan Taksin: "
+        "Signal fault at Chong Nonsi"
+    )
+    assert closure.stations == NETWORK.lines["sukhumvit"].stations
+    assert closure.summary(NETWORK) == "No service on the Sukhumvit Line: Strike"
+
+
+async def test_refresh_versions_changes_only(tmp_path):
+    path = tmp_path / "status.json"
+    path.write_text(json.dumps({"disruptions": []}))
+    status = ServiceStatus(FileStatusSource(path))
+    assert status.stale
+
+    assert not await status.refresh()
+    assert status.snapshot.version == 0
+    assert status.snapshot.checked_at is not None
+    assert not status.stale
+
+    path.write_text(json.dumps({"disruptions": [SILOM_DELAY]}))
+    assert await status.refresh()
+    assert not await status.refresh()
+    snapshot = status.snapshot
+    assert snapshot.version == 1
+    assert [d.id for d in snapshot.affecting(["S4"])] == ["silom-signal"]
+    assert snapshot.affecting(["CEN"]) and not snapshot.affecting(["E4"])
+
+
+async def test_http_source(tmp_path):
+    (tmp_path / "status.json").write_text(json.dumps({"disruptions": [SILOM_DELAY]}))
+    handler = partial(SimpleHTTPRequestHandler, directory=tmp_path)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/status.json"
+        status = ServiceStatus(HttpStatusSource(url))
+        assert await status.refresh()
+        assert status.snapshot.disruptions[0].id == "silom-signal"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+async def test_simulator_is_reproducible_and_valid():
+    runs = []
+    for _ in range(2):
+        simulator = SimulatedStatusSource(seed=7, rate=0.5)
+        runs.append([await simulator.fetch() for _ in range(50)])
+    assert runs[0] == runs[1]
+    entries = [entry for payload in runs[0] for entry in payload["disruptions"]]
+    assert entries
+    assert len(parse_feed({"disruptions": entries})) == len(entries)
+    # Disruptions end as well as start.
+    ids = [{entry["id"] for entry in payload["disruptions"]} for payload in runs[0]]
+    assert ids[0] or ids[1]
+    assert not (ids[0] | ids[1]) & ids[-1]
+
+
+async def test_notices_announce_each_change_once():
+    source = StaticSource(SILOM_DELAY)
+    status = ServiceStatus(source)
+    metadata: dict = {}
+    assert status.notices(metadata) == []
+    assert metadata == {}
+
+    await status.refresh()
+    [notice] = status.notices(metadata)
+    assert notice.level == "warning"
+    assert notice.message.startswith("Delays of up to 10 min on the Silom Line")
+    assert status.notices(metadata) == []
+
+    source.payload = {"disruptions": [{**SILOM_DELAY, "kind": "closed"}]}
+    await status.refresh()
+    [notice] = status.notices(metadata)
+    assert notice.level == "danger"
+
+    source.payload = {"disruptions": []}
+    await status.refresh()
+    [notice] = status.notices(metadata)
+    assert notice.title == "Service restored"
+    assert metadata == {}
+
+
+async def test_service_status_tool(monkeypatch):
+    status = ServiceStatus(StaticSource(SILOM_DELAY))
+    monkeypatch.setattr(bts_tools, "STATUS", status)
+    await status.refresh()
+
+    report = json.loads(await invoke_tool(bts_tools.service_status, line=None))
+    assert report["version"] == 1 and report["stale"] is False
+    assert report["disruptions"][0]["from"] == "Sala Daeng"
+    report = json.loads(await invoke_tool(bts_tools.service_status, line="Sukhumvit"))
+    assert report["disruptions"] == []
+    assert "Unknown BTS line" in await invoke_tool(
+        bts_tools.service_status, line="gold"
+    )
+
+    monkeypatch.setattr(bts_tools, "STATUS", ServiceStatus(None))
+    assert "No live status feed" in await invoke_tool(
+        bts_tools.service_status, line=None
+    )
+
+
+@pytest.mark.parametrize(
+    "text,answered",
+    [
+        ("Next train from Asok to Mo Chit", True),
+        ("Next train from Siam to Surasak", False),
+    ],
+)
+async def test_fast_path_defers_to_agent_on_disrupted_lines(text, answered):
+    status = ServiceStatus(StaticSource(SILOM_DELAY))
+    await status.refresh()
+    router = IntentRouter(TravelMatrices.build(), Timetable.generate(), status=status)
+    assert (router.answer(text) is not None) == answered
+    if not answered:
+        assert router.stats.fell_through == {"disrupted": 1}
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+from helpers.tools import invoke_tool
+
+from bts_network import UnknownStationError
+from bts_tools import find_station, plan_route
+from station_resolver import RESOLVER, StationResolver, fold
+
+
+@pytest.mark.parametrize(
+    "query,code",
+    [
+        ("N8", "N8"),
+        ("Mo Chit", "N8"),
+        ("Mochit", "N8"),
+        ("Morchit", "N8"),
+        ("หมอชิต", "N8"),
+        ("Siam Paragon", "CEN"),
+        ("สยาม", "CEN"),
+        ("Saphan Taksin", "S6"),
+        ("Asoke", "E4"),
+        ("tonglor", "E6"),
+        ("Terminal 21", "E4"),
+        ("Phom Phong", "E5"),
+        ("Surasuk", "S5"),
+        ("wongwian", "S8"),
+        ("Krung Thonburi", "S7"),
+    ],
+)
+def test_resolves_spellings_and_landmarks(query, code):
+    assert RESOLVER.resolve(query) == code
+
+
+def test_search_ranks_one_entry_per_station():
+    matches = RESOLVER.search("Bang", limit=10)
+    codes = [m.code for m in matches]
+    assert len(codes) == len(set(codes))
+    assert {"E13", "N15", "S12", "E10"} <= set(codes)
+    assert [m.score for m in matches] == sorted(
+        (m.score for m in matches), reverse=True
+    )
+    assert RESOLVER.search("") == []
+
+
+def test_unknown_station_suggests():
+    with pytest.raises(UnknownStationError, match="Hogwarts"):
+        RESOLVER.resolve("Hogwarts")
+
+
+def test_fold():
+    assert fold("Phrom  Phong") == fold("Prom-pong")
+    assert fold("Ekkamai") == fold("Ekamai")
+    assert fold("พหลโยธิน 59") == "พหลโยธิน59"
+
+
+def test_conflicting_alias():
+    with pytest.raises(ValueError):
+        StationResolver(aliases={"N8": ["Siam"]})
+
+
+def test_find_in_text():
+    mentions = RESOLVER.find_in_text("How do I get from Mochit to Siam Paragon?")
+    assert [(m.text, m.match.code) for m in mentions] == [
+        ("Mochit", "N8"),
+        ("Siam Paragon", "CEN"),
+    ]
+    thai = RESOLVER.find_in_text("ไปหมอชิตจากสยามยังไง")
+    assert [m.match.code for m in thai] == ["N8", "CEN"]
+    assert RESOLVER.find_in_text("what time does the safari open") == []
+
+    hint = RESOLVER.hint("last train from asoke to bang wa please")
+    assert hint is not None
+    assert "Asok (E4)" in hint and "Bang Wa (S12)" in hint
+
+
+async def test_tools_accept_fuzzy_names():
+    matches = json.loads(await invoke_tool(find_station, query="Siam Paragon"))
+    assert matches[0]["code"] == "CEN"
+
+    route = json.loads(
+        await invoke_tool(plan_route, origin="หมอชิต", destination="Terminal 21")
+    )
+    assert route["origin"] == "Mo Chit"
+    assert route["destination"] == "Asok"
+
+
+def test_finds_names_starting_with_a_stopword():
+    mentions = RESOLVER.find_in_text("trains from Siam to On Nut")
+    assert [m.match.code for m in mentions] == ["CEN", "E9"]
+    assert mentions[1].text == "On Nut"
+
+
+def test_exact_names_win_over_fuzzy_neighbours():
+    mentions = RESOLVER.find_in_text("How do I get from Siam Paragon to Mo Chit")
+    assert [(m.text, m.match.code) for m in mentions] == [
+        ("Siam Paragon", "CEN"),
+        ("Mo Chit", "N8"),
+    ]
@@ -1,16 +1,32 @@
+import asyncio
+import json
 import sqlite3
+import tempfile
+import time
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
 
 import pytest
 from helpers.mock_store import SQLiteStore
-from pydantic import AnyUrl
-
-from chatkit.store import NotFoundError, Store
+from pydantic import AnyUrl, TypeAdapter
+
+from chatkit.memory_store import MemoryStore
+from chatkit.sharded_store import ShardedStore
+from chatkit.sqlite_store import SQLiteStore as ChatKitSQLiteStore
+from chatkit.store import (
+    ItemRecord,
+    NotFoundError,
+    RawThreadItem,
+    Store,
+    ThreadRecord,
+)
+from chatkit.thread_pool_store import ThreadPoolStore
 from chatkit.types import (
     AssistantMessageContent,
     AssistantMessageItem,
+    ClientToolCallItem,
     FileAttachment,
+    HiddenContextItem,
     ImageAttachment,
     InferenceOptions,
     ThreadItem,
@@ -103,6 +119,41 @@ class TestStore(ABC):
         assert loaded_meta.title == thread.title
         assert loaded_meta.metadata == thread.metadata
 
+    @pytest.mark.asyncio
+    async def test_raw_items_match_client_json(self):
+        thread = make_thread()
+        await self.store.save_thread(thread, DEFAULT_CONTEXT)
+        items = [
+            ClientToolCallItem(
+                id="tc_1",
+                thread_id=thread.id,
+                created_at=datetime.now(),
+                call_id="call_1",
+                name="lookup",
+                arguments={"x": None, "nested": {"y": None}},
+                output={"z": None},
+            ),
+            HiddenContextItem(
+                id="hc_1",
+                thread_id=thread.id,
+                created_at=datetime.now(),
+                content={"a": None},
+            ),
+            *make_thread_items(),
+        ]
+        for item in items:
+            item.thread_id = thread.id
+            await self.store.add_thread_item(thread.id, item, DEFAULT_CONTEXT)
+
+        page = await self.store.load_raw_thread_items(
+            thread.id, None, len(items), "asc", DEFAULT_CONTEXT
+        )
+        expected = {
+            item.id: json.loads(item.model_dump_json(by_alias=True, exclude_none=True))
+            for item in items
+        }
+        assert {raw.id: json.loads(raw.data) for raw in page.data} == expected
+
     @pytest.mark.asyncio
     async def test_save_and_load_thread_metadata_null_title(self):
         thread = ThreadMetadata(
@@ -278,6 +329,137 @@ class TestStore(ABC):
         assert after_limit.has_more is True
         assert after_limit.after == "msg1"
 
+    @pytest.mark.asyncio
+    async def test_commit_unit_of_work(self):
+        thread = make_thread()
+        await self.store.save_thread(thread, DEFAULT_CONTEXT)
+        user_msg, assistant_msg, widget = make_thread_items()
+        await self.store.add_thread_item(thread.id, widget, DEFAULT_CONTEXT)
+
+        unit = self.store.begin_unit_of_work(thread.id, DEFAULT_CONTEXT)
+        unit.add_item(user_msg)
+        unit.add_item(assistant_msg)
+        assistant_msg = assistant_msg.model_copy(
+            update={"content": [AssistantMessageContent(text="Replaced")]}
+        )
+        unit.save_item(assistant_msg)
+        unit.delete_item(widget.id)
+        thread.title = "Committed"
+        unit.save_thread(thread)
+        await unit.commit()
+        assert not unit.pending
+
+        items = await self.store.load_thread_items(
+            thread.id, None, 10, "asc", DEFAULT_CONTEXT
+        )
+        assert items.data == [user_msg, assistant_msg]
+        loaded = await self.store.load_thread(thread.id, DEFAULT_CONTEXT)
+        assert loaded.title == "Committed"
+
+    @pytest.mark.asyncio
+    async def test_thread_items_filtered(self):
+        thread = make_thread()
+        now = datetime.now()
+        await self.store.save_thread(thread, DEFAULT_CONTEXT)
+        for i in range(3):
+            await self.store.add_thread_item(
+                thread.id,
+                HiddenContextItem(
+                    id=f"hidden{i}",
+                    content="context",
+                    thread_id=thread.id,
+                    created_at=now + timedelta(seconds=2 * i),
+                ),
+                DEFAULT_CONTEXT,
+            )
+            await self.store.add_thread_item(
+                thread.id,
+                ClientToolCallItem(
+                    id=f"tool{i}",
+                    call_id=f"call{i}",
+                    name="get_weather",
+                    arguments={},
+                    status="pending" if i == 1 else "completed",
+                    thread_id=thread.id,
+                    created_at=now + timedelta(seconds=2 * i + 1),
+                ),
+                DEFAULT_CONTEXT,
+            )
+
+        visible = await self.store.load_thread_items_filtered(
+            thread.id,
+            None,
+            2,
+            "asc",
+            DEFAULT_CONTEXT,
+            exclude_types=["hidden_context_item"],
+        )
+        assert [i.id for i in visible.data] == ["tool0", "tool1"]
+        assert visible.has_more is True
+        assert visible.after == "tool1"
+
+        pending = await self.store.load_thread_items_filtered(
+            thread.id,
+            None,
+            10,
+            "desc",
+            DEFAULT_CONTEXT,
+            types=["client_tool_call"],
+            status="pending",
+        )
+        assert [i.id for i in pending.data] == ["tool1"]
+        assert pending.has_more is False
+
+    @pytest.mark.asyncio
+    async def test_export_and_import_ndjson(self):
+        now = datetime.now()
+        thread = make_thread(created_at=now)
+        await self.store.save_thread(thread, DEFAULT_CONTEXT)
+        await self.store.save_thread(
+            make_thread("empty_thread", now + timedelta(seconds=1)), DEFAULT_CONTEXT
+        )
+        items = make_thread_items()
+        for item in items:
+            await self.store.add_thread_item(thread.id, item, DEFAULT_CONTEXT)
+
+        lines = [
+            line
+            async for line in self.store.export_ndjson(DEFAULT_CONTEXT, batch_size=2)
+        ]
+        assert len(lines) == 2 + len(items)
+        assert all(line.endswith(b"\n") for line in lines)
+        # Each thread line is followed by its items.
+        current = None
+        for line in lines:
+            record = json.loads(line)
+            if "thread" in record:
+                current = record["thread"]["id"]
+            else:
+                assert record["thread_id"] == current
+        # The default implementation exports the same records.
+        default_lines = [
+            line
+            async for line in Store.export_ndjson(
+                self.store, DEFAULT_CONTEXT, batch_size=2
+            )
+        ]
+        parse = ThreadRecord | ItemRecord
+        assert sorted(
+            TypeAdapter(parse).validate_json(line).model_dump_json() for line in lines
+        ) == sorted(
+            TypeAdapter(parse).validate_json(line).model_dump_json()
+            for line in default_lines
+        )
+
+        count = await self.store.import_ndjson(lines, ALTERNATIVE_CONTEXT, batch_size=2)
+        assert count == len(lines)
+        threads = await self.store.load_threads(10, None, "asc", ALTERNATIVE_CONTEXT)
+        assert [t.id for t in threads.data] == [thread.id, "empty_thread"]
+        imported = await self.store.load_thread_items(
+            thread.id, None, 10, "asc", ALTERNATIVE_CONTEXT
+        )
+        assert imported.data == items
+
     @pytest.mark.asyncio
     async def test_save_and_load_item(self):
         thread = make_thread()
@@ -373,6 +555,20 @@ class TestStore(ABC):
             )
 
 
+def test_raw_thread_item_validates_lazily():
+    item = make_thread_items()[2]
+    raw = RawThreadItem(
+        id=item.id,
+        type=item.type,
+        data=item.model_dump_json(by_alias=True, exclude_none=True),
+    )
+    assert raw._item is None
+    assert raw.item == item
+    assert raw.item is raw.item
+
+    assert RawThreadItem.from_item(item).data == raw.data
+
+
 class TestSqliteStore(TestStore):
     def setup_method(self, method):
         db_path = f"file:{method.__name__}?mode=memory&cache=shared"
@@ -396,6 +592,254 @@ class TestSqliteStore(TestStore):
         assert self.store.generate_item_id("workflow", thread, ctx).startswith("wf_")
 
 
+class TestChatKitSQLiteStore(TestStore):
+    def setup_method(self, method):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = ChatKitSQLiteStore(f"{self.tmp_dir.name}/chatkit.db")
+
+    def teardown_method(self, method):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_writes_after_close_raise(self):
+        self.store.close()
+        self.store.close()
+        with pytest.raises(RuntimeError, match="closed"):
+            await self.store.save_thread(make_thread(), DEFAULT_CONTEXT)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_writes_are_all_committed(self):
+        thread = make_thread()
+        await self.store.save_thread(thread, DEFAULT_CONTEXT)
+        now = datetime.now()
+        items = [
+            AssistantMessageItem(
+                id=f"msg_{i:03d}",
+                content=[AssistantMessageContent(text=str(i))],
+                thread_id=thread.id,
+                created_at=now + timedelta(seconds=i),
+            )
+            for i in range(100)
+        ]
+        await asyncio.gather(
+            *(
+                self.store.add_thread_item(thread.id, item, DEFAULT_CONTEXT)
+                for item in items
+            )
+        )
+        loaded = await self.store.load_thread_items(
+            thread.id, None, 200, "asc", DEFAULT_CONTEXT
+        )
+        assert loaded.data == items
+
+    @pytest.mark.asyncio
+    async def test_failed_write_does_not_roll_back_its_batch(self):
+        thread = make_thread()
+
+        def fail(conn):
+            raise sqlite3.IntegrityError("boom")
+
+        results = await asyncio.gather(
+            self.store._write(fail),
+            self.store.save_thread(thread, DEFAULT_CONTEXT),
+            return_exceptions=True,
+        )
+        assert isinstance(results[0], sqlite3.IntegrityError)
+        assert (
+            await self.store.load_thread(thread.id, DEFAULT_CONTEXT)
+        ).id == thread.id
+
+
+class TestMemoryStore(TestStore):
+    def setup_method(self, method):
+        self.store = MemoryStore()
+
+    def teardown_method(self, method):
+        pass
+
+    @pytest.mark.asyncio
+    async def test_loaded_items_are_copies(self):
+        thread = make_thread()
+        await self.store.save_thread(thread, DEFAULT_CONTEXT)
+        item = AssistantMessageItem(
+            id="msg_1",
+            content=[AssistantMessageContent(text="stored")],
+            thread_id=thread.id,
+            created_at=datetime.now(),
+        )
+        await self.store.add_thread_item(thread.id, item, DEFAULT_CONTEXT)
+        item.content[0].text = "changed"
+        loaded = await self.store.load_item(thread.id, item.id, DEFAULT_CONTEXT)
+        loaded.content[0].text = "changed again"
+        reloaded = await self.store.load_item(thread.id, item.id, DEFAULT_CONTEXT)
+        assert reloaded.content[0].text == "stored"
+
+    @pytest.mark.asyncio
+    async def test_items_move_between_threads(self):
+        first, second = make_thread("thr_1"), make_thread("thr_2")
+        item = AssistantMessageItem(
+            id="msg_1",
+            content=[AssistantMessageContent(text="moved")],
+            thread_id=first.id,
+            created_at=datetime.now(),
+        )
+        await self.store.save_item(first.id, item, DEFAULT_CONTEXT)
+        await self.store.save_item(second.id, item, DEFAULT_CONTEXT)
+        with pytest.raises(NotFoundError):
+            await self.store.load_item(first.id, item.id, DEFAULT_CONTEXT)
+        assert await self.store.load_item(second.id, item.id, DEFAULT_CONTEXT)
+
+        # Deleting from the wrong thread leaves the item alone.
+        await self.store.delete_thread_item(first.id, item.id, DEFAULT_CONTEXT)
+        assert await self.store.load_item(second.id, item.id, DEFAULT_CONTEXT)
+        await self.store.save_thread(second, DEFAULT_CONTEXT)
+        await self.store.delete_thread(second.id, DEFAULT_CONTEXT)
+        data = self.store._users[DEFAULT_CONTEXT.user_id]
+        assert data.item_threads == {}
+
+
+class TestShardedStore(TestStore):
+    def setup_method(self, method):
+        self.shards = [MemoryStore(), MemoryStore(), MemoryStore()]
+        self.store = ShardedStore(self.shards, buckets=16)
+
+    def teardown_method(self, method):
+        pass
+
+    @pytest.mark.asyncio
+    async def test_generated_ids_route_to_their_shard(self):
+        thread = make_thread(thread_id=self.store.generate_thread_id(DEFAULT_CONTEXT))
+        item_id = self.store.generate_item_id("message", thread, DEFAULT_CONTEXT)
+        bucket = self.store.bucket_for_user(DEFAULT_CONTEXT.user_id)
+        assert thread.id.startswith(f"thr_b{bucket}_")
+        assert item_id.startswith(f"msg_b{bucket}_")
+
+        await self.store.save_thread(thread, DEFAULT_CONTEXT)
+        home = self.store.shard_for(DEFAULT_CONTEXT)
+        assert (await home.load_thread(thread.id, DEFAULT_CONTEXT)).id == thread.id
+        for shard in self.shards:
+            if shard is not home:
+                with pytest.raises(NotFoundError):
+                    await shard.load_thread(thread.id, DEFAULT_CONTEXT)
+
+    @pytest.mark.asyncio
+    async def test_rebalance_moves_users(self):
+        attachment = FileAttachment(id="file_1", mime_type="text/plain", name="a.txt")
+        await self.store.save_attachment(attachment, DEFAULT_CONTEXT)
+        thread = make_thread(thread_id=self.store.generate_thread_id(DEFAULT_CONTEXT))
+        await self.store.save_thread(thread, DEFAULT_CONTEXT)
+        items = make_thread_items()
+        items[0].attachments = [attachment]
+        for item in items:
+            await self.store.add_thread_item(thread.id, item, DEFAULT_CONTEXT)
+
+        old = self.store.shard_for(DEFAULT_CONTEXT)
+        target = (self.shards.index(old) + 1) % len(self.shards)
+        moved = await self.store.rebalance(
+            [target] * self.store.buckets, [DEFAULT_CONTEXT, ALTERNATIVE_CONTEXT]
+        )
+
+        assert moved >= 1
+        assert self.store.shard_for(DEFAULT_CONTEXT) is self.shards[target]
+        loaded = await self.store.load_thread_items(
+            thread.id, None, 10, "asc", DEFAULT_CONTEXT
+        )
+        assert [item.id for item in loaded.data] == [item.id for item in items]
+        assert (await self.store.load_attachment("file_1", DEFAULT_CONTEXT)) == (
+            attachment
+        )
+        with pytest.raises(NotFoundError):
+            await old.load_thread(thread.id, DEFAULT_CONTEXT)
+        with pytest.raises(NotFoundError):
+            await old.load_attachment("file_1", DEFAULT_CONTEXT)
+
+    @pytest.mark.asyncio
+    async def test_rebalance_moves_every_user_in_a_bucket(self):
+        store = ShardedStore(self.shards, buckets=1, assignment=[0])
+        contexts = [DEFAULT_CONTEXT, ALTERNATIVE_CONTEXT]
+        threads = {}
+        for context in contexts:
+            thread = make_thread(thread_id=store.generate_thread_id(context))
+            await store.save_thread(thread, context)
+            threads[context.user_id] = thread
+
+        assert await store.rebalance([2], contexts) == 2
+
+        assert store.assignment == [2]
+        for context in contexts:
+            thread = threads[context.user_id]
+            assert (await store.load_thread(thread.id, context)).id == thread.id
+            with pytest.raises(NotFoundError):
+                await self.shards[0].load_thread(thread.id, context)
+
+
+class TestThreadPoolStore(TestStore):
+    def setup_method(self, method):
+        db_path = f"file:{method.__name__}_pool?mode=memory&cache=shared"
+        self.db = sqlite3.connect(db_path, uri=True)
+        self.store = ThreadPoolStore(SQLiteStore(db_path), max_workers=4)
+
+    def teardown_method(self, method):
+        self.store.close()
+        self.db.close()
+
+    @pytest.mark.asyncio
+    async def test_calls_for_a_thread_run_in_order(self):
+        calls: list[str] = []
+
+        class SlowStore(MemoryStore):
+            async def add_thread_item(self, thread_id, item, context):
+                # Later calls sleep less, so they'd finish first if unordered.
+                time.sleep(0.01 * (5 - int(item.id[-1])))  # noqa: ASYNC251
+                calls.append(item.id)
+                await super().add_thread_item(thread_id, item, context)
+
+        store = ThreadPoolStore(SlowStore(), max_workers=4)
+        thread = make_thread()
+        await store.save_thread(thread, DEFAULT_CONTEXT)
+        items = [
+            AssistantMessageItem(
+                id=f"msg_{i}",
+                content=[AssistantMessageContent(text=str(i))],
+                thread_id=thread.id,
+                created_at=datetime.now(),
+            )
+            for i in range(5)
+        ]
+        await asyncio.gather(
+            *(store.add_thread_item(thread.id, i, DEFAULT_CONTEXT) for i in items)
+        )
+        store.close()
+        assert calls == [item.id for item in items]
+
+    @pytest.mark.asyncio
+    async def test_blocking_calls_leave_the_loop_free(self):
+        class BlockingStore(MemoryStore):
+            async def load_thread(self, thread_id, context):
+                time.sleep(0.2)  # noqa: ASYNC251
+                return await super().load_thread(thread_id, context)
+
+        store = ThreadPoolStore(BlockingStore(), lag_interval=0.01)
+        thread = make_thread()
+        await store.save_thread(thread, DEFAULT_CONTEXT)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await store.load_thread(thread.id, DEFAULT_CONTEXT)
+        ticker.cancel()
+        store.close()
+        assert ticks >= 5
+        assert store.stats.calls == 2
+        assert store.stats.loop_lag_max < 0.1
+
+
 class TestSqliteStoreCustomIds(TestStore):
     def setup_method(self, method):
         db_path = f"file:{method.__name__}_custom?mode=memory&cache=shared"
@@ -0,0 +1,167 @@
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+from helpers.tools import invoke_tool
+
+from bts_network import NETWORK
+from bts_tools import first_and_last_trains, next_trains
+from timetable import (
+    MIN_CONNECTION_SECONDS,
+    Timetable,
+    Trip,
+    day_type,
+    service_day,
+)
+
+TIMETABLE = Timetable.generate()
+MONDAY = date(2026, 10, 19)
+
+
+def test_service_day_runs_past_midnight():
+    assert service_day(datetime(2026, 10, 20, 0, 30)) == (MONDAY, 24 * 3600 + 1800)
+    assert service_day(datetime(2026, 10, 19, 5, 0)) == (MONDAY, 5 * 3600)
+    assert day_type(MONDAY) == "weekday"
+    assert day_type(date(2026, 10, 24)) == "saturday"
+    assert day_type(date(2026, 10, 25)) == "sunday"
+
+
+def test_next_departures_towards_destination():
+    when = datetime(2026, 10, 19, 8, 1)
+    departures = TIMETABLE.next_departures("Asok", "Siam", when=when, count=3)
+    assert len(departures) == 3
+    assert all(d.station == "E4" and d.towards == "N24" for d in departures)
+    times = [d.time for d in departures]
+    assert times == sorted(times)
+    assert times[0] >= when
+    # Weekday peak service.
+    assert (times[1] - times[0]).total_seconds() == 180
+
+
+def test_next_departures_every_direction():
+    departures = TIMETABLE.next_departures(
+        "Siam", when=datetime(2026, 10, 19, 12), count=8
+    )
+    assert {(d.line, d.towards) for d in departures} == {
+        ("sukhumvit", "N24"),
+        ("sukhumvit", "E23"),
+        ("silom", "W1"),
+        ("silom", "S12"),
+    }
+
+
+def test_next_departures_roll_over_to_next_day():
+    departures = TIMETABLE.next_departures(
+        "Mo Chit", "Siam", when=datetime(2026, 10, 20, 2, 0), count=2
+    )
+    assert [d.time.date() for d in departures] == [date(2026, 10, 20)] * 2
+    assert departures[0].time.hour == 5
+
+
+def test_first_and_last_with_connection():
+    first_last = TIMETABLE.first_last("Mo Chit", "Bang Wa", MONDAY)
+    assert first_last is not None
+    first, last = first_last.first, first_last.last
+    assert first.station == last.station == "N8"
+    assert first.time < last.time
+
+    # The last train from Mo Chit still makes the last Silom train at Siam.
+    route = NETWORK.route("N8", "S12")
+    at_siam = last.time.timestamp() + route.legs[0].seconds + MIN_CONNECTION_SECONDS
+    last_silom = TIMETABLE.next_departures(
+        "Siam", "Bang Wa", when=datetime.fromtimestamp(at_siam), count=1
+    )
+    assert last_silom and last_silom[0].time.date() == MONDAY
+
+    with pytest.raises(ValueError):
+        TIMETABLE.first_last("Siam", "Siam", MONDAY)
+
+
+def _brute_force_first_last(origin: str, destination: str) -> tuple[datetime, datetime]:
+    """Try every departure from `origin` on MONDAY, following each change."""
+    route = NETWORK.route(origin, destination)
+    reaching = []
+    when = datetime(2026, 10, 19, 4)
+    while True:
+        departures = TIMETABLE.next_departures(
+            origin, route.legs[0].stations[-1], when=when, count=1
+        )
+        if not departures or service_day(departures[0].time)[0] != MONDAY:
+            break
+        start = departures[0].time
+        ready, ok = start, True
+        for n, leg in enumerate(route.legs):
+            if n:
+                [train] = TIMETABLE.next_departures(
+                    leg.stations[0],
+                    leg.stations[-1],
+                    when=ready + timedelta(seconds=MIN_CONNECTION_SECONDS),
+                    count=1,
+                )
+                if service_day(train.time)[0] != MONDAY:
+                    ok = False
+                    break
+                ready = train.time
+            ready += timedelta(seconds=leg.seconds)
+        if ok:
+            reaching.append(start)
+        when = start + timedelta(seconds=1)
+    return reaching[0], reaching[-1]
+
+
+@pytest.mark.parametrize(
+    "origin,destination",
+    [("N8", "S12"), ("S12", "N8"), ("E4", "W1"), ("S6", "E9")],
+)
+def test_first_and_last_match_brute_force(origin, destination):
+    assert len(NETWORK.route(origin, destination).legs) > 1
+    first_last = TIMETABLE.first_last(origin, destination, MONDAY)
+    assert first_last is not None
+    assert (first_last.first.time, first_last.last.time) == (
+        _brute_force_first_last(origin, destination)
+    )
+
+
+def test_headway():
+    peak = TIMETABLE.headway("Asok", "Siam", when=datetime(2026, 10, 19, 18))
+    midday = TIMETABLE.headway("Asok", "Siam", when=datetime(2026, 10, 19, 12))
+    assert peak == 180
+    assert midday == 360
+    assert TIMETABLE.headway("Asok", "Siam", when=datetime(2026, 10, 19, 3, 30)) is None
+
+
+async def test_timetable_tools():
+    departures = json.loads(
+        await invoke_tool(next_trains, station="Asok", destination="Siam", count=2)
+    )
+    assert len(departures) == 2
+    assert departures[0]["station"] == "Asok"
+    assert departures[0]["towards"] == "Khu Khot"
+
+    result = json.loads(
+        await invoke_tool(
+            first_and_last_trains,
+            origin="Mo Chit",
+            destination="Bang Wa",
+            day="2026-10-19",
+        )
+    )
+    assert result["first"]["date"] == "2026-10-19"
+    assert "Hogwarts" in await invoke_tool(
+        first_and_last_trains, origin="Hogwarts", destination="Siam", day=None
+    )
+
+
+def test_patterns_split_overtaking_trips():
+    trips = [
+        Trip("silom", frozenset(["weekday"]), (("W1", t), ("CEN", t + d)))
+        for t, d in ((0, 100), (50, 100), (60, 20), (200, 100))
+    ]
+    patterns = Timetable(NETWORK, trips).patterns("weekday")
+    # The third trip overtakes the second, so it runs in a pattern of its own.
+    assert sorted(p.times.shape[1] for p in patterns) == [1, 3]
+    for pattern in patterns:
+        assert pattern.stops == ("W1", "CEN") and pattern.towards == "S12"
+        assert all((row[:-1] <= row[1:]).all() for row in pattern.times)
+    assert TIMETABLE.patterns("sunday")
+    assert TIMETABLE.patterns("holiday") == []
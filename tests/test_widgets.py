@@ -6,7 +6,22 @@ import pytest
 
 from chatkit.server import diff_widget
 from chatkit.types import WidgetItem
-from chatkit.widgets import Card, Text, WidgetRoot
+from chatkit.widgets import (
+    Badge,
+    BarSeries,
+    Button,
+    Card,
+    Chart,
+    Col,
+    Icon,
+    ListView,
+    ListViewItem,
+    Row,
+    Text,
+    Title,
+    WidgetRoot,
+    widget_to_text,
+)
 
 
 @pytest.mark.parametrize(
@@ -102,3 +117,50 @@ def test_json_dump_excludes_none_fields_nested():
     assert "streaming" not in text_dump
     assert "color" not in text_dump
     assert "key" not in text_dump
+
+
+def test_widget_to_text_keeps_semantic_content():
+    widget = Card(
+        padding=4,
+        background="surface-secondary",
+        status={"text": "Live status", "icon": "info"},
+        children=[
+            Row(
+                gap=2,
+                children=[
+                    Icon(name="info"),
+                    Title(value="Sukhumvit Line", size="lg"),
+                    Badge(label="Normal", color="success"),
+                ],
+            ),
+            Col(children=[Text(value="Trains every 4 minutes", color="secondary")]),
+            Chart(
+                data=[{"hour": "06:00", "riders": 10}, {"hour": "09:00", "riders": 30}],
+                series=[BarSeries(label="Riders", dataKey="riders")],
+                xAxis="hour",
+            ),
+            Button(label="Refresh", iconStart="reload"),
+        ],
+        confirm={"label": "Done", "action": {"type": "done"}},
+    )
+
+    assert widget_to_text(widget) == "\n".join([
+        "Live status",
+        "Sukhumvit Line [Normal]",
+        "Trains every 4 minutes",
+        "Chart of Riders by hour (2 points), from 06:00 to 09:00",
+        "[Button: Refresh]",
+        "[Button: Done]",
+    ])
+
+
+def test_widget_to_text_list_rows_and_cap():
+    widget = ListView(
+        children=[
+            ListViewItem(children=[Text(value="Siam"), Text(value="CEN")]),
+            ListViewItem(children=[Text(value="Asok"), Text(value="E4")]),
+        ]
+    )
+
+    assert widget_to_text(widget) == "- Siam CEN\n- Asok E4"
+    assert widget_to_text(widget, max_chars=8) == "- Siam …"
@@ -0,0 +1,501 @@
+"""
+BTS timetable: departures by station, direction and day type.
+
+Departures are kept per (station, line, direction, day type) as a sorted array
+of times, in seconds after the start of the service day, with a parallel array
+giving where each train terminates (as a position along its line). Next
+departure, first/last train and headway queries are answered by binary search
+over those arrays. A direction is named by the line terminus the train heads
+towards, as in bts_network's route legs.
+
+Times are local Bangkok time. A service day runs from 03:00 to 03:00, so the
+last trains after midnight belong to the previous day, and its day type
+(weekday, saturday or sunday) decides the timetable. Public holidays are not
+modelled; treat them as sundays by passing an explicit day type.
+
+`Timetable.generate()` builds the regular BTS pattern from the network's
+running times, first/last departures and headways by time of day. The
+frequencies are approximations. gtfs_import loads a GTFS feed instead, and
+uses `replace_sources()` to re-index only the routes that changed.
+"""
+
+import logging
+from collections.abc import Collection, Iterable, Sequence
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+
+import numpy as np
+
+from bts_network import NETWORK, Network
+
+logger = logging.getLogger(__name__)
+
+BANGKOK = timezone(timedelta(hours=7), "Asia/Bangkok")
+
+DAY_TYPES = ("weekday", "saturday", "sunday")
+SERVICE_DAY_START = 3 * 3600
+DAY = 24 * 3600
+
+# Time to walk between platforms when changing lines at Siam.
+MIN_CONNECTION_SECONDS = 60
+
+# Generated pattern: first and last departure from each terminus, and the
+# headway in force from each time of day until the next entry.
+FIRST_DEPARTURE = 5 * 3600 + 15 * 60
+LAST_DEPARTURE = 23 * 3600 + 30 * 60
+HEADWAYS = {
+    "weekday": [
+        (0, 6 * 60),
+        (7 * 3600, 3 * 60),
+        (9 * 3600 + 30 * 60, 6 * 60),
+        (16 * 3600 + 30 * 60, 3 * 60),
+        (19 * 3600 + 30 * 60, 6 * 60),
+        (21 * 3600, 8 * 60),
+    ],
+    "saturday": [(0, 6 * 60), (21 * 3600, 8 * 60)],
+    "sunday": [(0, 6 * 60), (21 * 3600, 8 * 60)],
+}
+
+_WEEKDAY_COLUMNS = ("monday", "tuesday", "wednesday", "thursday", "friday")
+
+
+def day_type(day: date) -> str:
+    weekday = day.weekday()
+    if weekday < 5:
+        return "weekday"
+    return "saturday" if weekday == 5 else "sunday"
+
+
+def now() -> datetime:
+    """The current Bangkok time, naive, as the timetable uses."""
+    return datetime.now(BANGKOK).replace(tzinfo=None)
+
+
+def service_day(when: datetime) -> tuple[date, int]:
+    """The service day `when` falls in, and seconds since that day's midnight."""
+    if when.tzinfo is not None:
+        when = when.astimezone(BANGKOK).replace(tzinfo=None)
+    seconds = when.hour * 3600 + when.minute * 60 + when.second
+    if seconds < SERVICE_DAY_START:
+        return when.date() - timedelta(days=1), seconds + DAY
+    return when.date(), seconds
+
+
+def parse_time(value: str) -> int:
+    """Seconds for a GTFS `HH:MM:SS` time, which may run past 24:00:00."""
+    hours, minutes, seconds = value.strip().split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+@dataclass(frozen=True)
+class Trip:
+    line: str
+    day_types: frozenset[str]
+    # (station code, departure seconds) in travel order.
+    stops: tuple[tuple[str, int], ...]
+    # The GTFS route the trip came from; generated trips belong to their line.
+    route: str | None = None
+
+    @property
+    def source(self) -> str:
+        return self.route if self.route is not None else self.line
+
+
+@dataclass(frozen=True)
+class Departure:
+    station: str
+    line: str
+    # The line terminus the train heads towards, and where it actually ends.
+    towards: str
+    terminates: str
+    time: datetime
+
+    def as_dict(self, network: Network) -> dict[str, str]:
+        return {
+            "station": network.name(self.station),
+            "line": network.lines[self.line].name,
+            "towards": network.name(self.towards),
+            "terminates": network.name(self.terminates),
+            "date": self.time.date().isoformat(),
+            "time": self.time.strftime("%H:%M"),
+        }
+
+
+@dataclass(frozen=True)
+class FirstLast:
+    first: Departure
+    last: Departure
+
+
+@dataclass(frozen=True, eq=False)
+class Pattern:
+    """Trips that call at the same stations in the same order.
+
+    `times[i]` holds each trip's departure from `stops[i]`, in trip order.
+    Trips never overtake within a pattern, so every row is sorted and the
+    first trip at or after a time can be found by bisection at any stop.
+    """
+
+    line: str
+    stops: tuple[str, ...]
+    towards: str
+    times: np.ndarray
+
+
+_Key = tuple[str, str, str, str]
+
+
+class _Board:
+    """Sorted departure times at one platform, with where each train ends."""
+
+    __slots__ = ("ends", "times")
+
+    def __init__(self, times: np.ndarray, ends: np.ndarray):
+        self.times = times
+        self.ends = ends
+
+
+class Timetable:
+    """Departure boards for every platform, searched by bisection."""
+
+    def __init__(self, network: Network, trips: Iterable[Trip]):
+        self.network = network
+        self._positions = {
+            line.id: {code: i for i, code in enumerate(line.stations)}
+            for line in network.lines.values()
+        }
+        # Boards contributed by each source (a GTFS route, or a generated
+        # line), merged per key into `_boards`.
+        self._parts: dict[str, dict[_Key, _Board]] = {}
+        self._trip_counts: dict[str, int] = {}
+        self._boards: dict[_Key, _Board] = {}
+        # Whole trips per source and day type, for journey planning.
+        self._patterns: dict[str, dict[str, list[Pattern]]] = {}
+        # Bumped whenever trips change, so derived indexes know to rebuild.
+        self.revision = 0
+        self.replace_sources((), trips)
+
+    @property
+    def trip_count(self) -> int:
+        return sum(self._trip_counts.values())
+
+    @property
+    def board_count(self) -> int:
+        return len(self._boards)
+
+    def replace_sources(self, sources: Collection[str], trips: Iterable[Trip]) -> int:
+        """Swap the trips of `sources` for `trips`, re-merging only affected boards.
+
+        `trips` must all belong to `sources` (or to sources not indexed yet);
+        a source with no trips left is dropped. Returns the number of boards
+        rebuilt.
+        """
+        pending: dict[str, dict[_Key, list[tuple[int, int]]]] = {}
+        runs: dict[str, dict[tuple[str, tuple[str, ...], str], list[list[int]]]] = {}
+        counts: dict[str, int] = {}
+        for trip in trips:
+            source = trip.source
+            counts[source] = counts.get(source, 0) + 1
+            self._add_trip(trip, pending.setdefault(source, {}))
+            stops = tuple(code for code, _ in trip.stops)
+            for day in trip.day_types:
+                runs.setdefault(source, {}).setdefault(
+                    (trip.line, stops, day), []
+                ).append([seconds for _, seconds in trip.stops])
+        touched: set[_Key] = set()
+        for source in {*sources, *pending}:
+            touched.update(self._parts.pop(source, {}))
+            self._trip_counts.pop(source, None)
+            self._patterns.pop(source, None)
+        for source, departures in pending.items():
+            self._parts[source] = {
+                key: _board(values) for key, values in departures.items()
+            }
+            self._trip_counts[source] = counts[source]
+            touched.update(self._parts[source])
+            patterns: dict[str, list[Pattern]] = {}
+            for (line, stops, day), times in runs[source].items():
+                patterns.setdefault(day, []).extend(
+                    self._build_patterns(line, stops, times)
+                )
+            self._patterns[source] = patterns
+        for key in touched:
+            boards = [part[key] for part in self._parts.values() if key in part]
+            if boards:
+                self._boards[key] = _merge(boards)
+            else:
+                self._boards.pop(key, None)
+        self.revision += 1
+        logger.info(
+            f"Indexed {sum(counts.values())} trips from {len(pending)} sources, "
+            f"rebuilt {len(touched)} of {len(self._boards)} departure boards"
+        )
+        return len(touched)
+
+    def _add_trip(self, trip: Trip, pending: dict[_Key, list[tuple[int, int]]]) -> None:
+        line = self.network.lines[trip.line]
+        positions = self._positions[trip.line]
+        first, last = trip.stops[0][0], trip.stops[-1][0]
+        forward = positions[last] > positions[first]
+        towards = line.stations[-1] if forward else line.stations[0]
+        end = positions[last]
+        # Trains don't take passengers at their final stop.
+        for code, seconds in trip.stops[:-1]:
+            for day in trip.day_types:
+                key = (code, trip.line, towards, day)
+                pending.setdefault(key, []).append((seconds, end))
+
+    def _build_patterns(
+        self, line: str, stops: tuple[str, ...], trips: list[list[int]]
+    ) -> list[Pattern]:
+        """Patterns for trips over `stops`, split where one overtakes another."""
+        positions = self._positions[line]
+        stations = self.network.lines[line].stations
+        forward = positions[stops[-1]] > positions[stops[0]]
+        towards = stations[-1] if forward else stations[0]
+        groups: list[list[list[int]]] = []
+        for trip in sorted(trips):
+            for group in groups:
+                if all(a <= b for a, b in zip(group[-1], trip)):
+                    group.append(trip)
+                    break
+            else:
+                groups.append([trip])
+        return [
+            Pattern(line, stops, towards, np.array(group, dtype=np.int32).T.copy())
+            for group in groups
+        ]
+
+    def patterns(self, day_kind: str) -> list[Pattern]:
+        """Every trip pattern running on a day type, for journey planning."""
+        return [
+            pattern
+            for by_day in self._patterns.values()
+            for pattern in by_day.get(day_kind, ())
+        ]
+
+    # Loading
+
+    @classmethod
+    def generate(cls, network: Network = NETWORK) -> "Timetable":
+        trips = []
+        for line in network.lines.values():
+            offsets = [0, *np.cumsum(line.segment_seconds).tolist()]
+            for stations, offs in (
+                (line.stations, offsets),
+                (line.stations[::-1], [offsets[-1] - o for o in offsets[::-1]]),
+            ):
+                for day, headways in HEADWAYS.items():
+                    for start in _departure_times(headways):
+                        trips.append(
+                            Trip(
+                                line=line.id,
+                                day_types=frozenset([day]),
+                                stops=tuple(
+                                    (code, start + o) for code, o in zip(stations, offs)
+                                ),
+                            )
+                        )
+        return cls(network, trips)
+
+    # Queries
+
+    def _direction(self, origin: str, destination: str) -> tuple[str, str, int]:
+        """The line, terminus and alighting position of the first leg."""
+        route = self.network.route(origin, destination)
+        if not route.legs:
+            raise ValueError("Origin and destination are the same station")
+        leg = route.legs[0]
+        return leg.line, leg.towards, self._positions[leg.line][leg.stations[-1]]
+
+    def _reaches(self, board: _Board, line: str, towards: str, alight: int | None):
+        """Mask of departures whose train runs at least as far as `alight`."""
+        if alight is None:
+            return None
+        forward = towards == self.network.lines[line].stations[-1]
+        return board.ends >= alight if forward else board.ends <= alight
+
+    def _departure(self, key: _Key, board: _Board, i: int, day: date) -> Departure:
+        code, line, towards, _ = key
+        midnight = datetime.combine(day, time())
+        return Departure(
+            station=code,
+            line=line,
+            towards=towards,
+            terminates=self.network.lines[line].stations[int(board.ends[i])],
+            time=midnight + timedelta(seconds=int(board.times[i])),
+        )
+
+    def _board_indices(
+        self, key: _Key, alight: int | None
+    ) -> tuple[_Board, np.ndarray] | None:
+        board = self._boards.get(key)
+        if board is None:
+            return None
+        mask = self._reaches(board, key[1], key[2], alight)
+        indices = np.arange(len(board.times)) if mask is None else np.flatnonzero(mask)
+        return board, indices
+
+    def _keys(
+        self, station: str, destination: str | None, day: date, day_kind: str | None
+    ) -> list[tuple[_Key, int | None]]:
+        kind = day_kind or day_type(day)
+        if destination is not None:
+            line, towards, alight = self._direction(station, destination)
+            return [((station, line, towards, kind), alight)]
+        keys = []
+        for line in self.network.lines_at(station):
+            stations = self.network.lines[line].stations
+            for towards in (stations[0], stations[-1]):
+                keys.append(((station, line, towards, kind), None))
+        return keys
+
+    def next_departures(
+        self,
+        station: str,
+        destination: str | None = None,
+        *,
+        when: datetime | None = None,
+        count: int = 3,
+        day_kind: str | None = None,
+    ) -> list[Departure]:
+        """The next `count` departures from `station` at or after `when`.
+
+        With a destination, only trains in its direction that run far enough
+        to reach it (or the change towards it) are included; otherwise trains
+        in every direction are merged. Rolls over into the next service day.
+        """
+        station = self.network.resolve(station)
+        if destination is not None:
+            destination = self.network.resolve(destination)
+        day, seconds = service_day(when or now())
+        found: list[Departure] = []
+        for _ in range(2):
+            for key, alight in self._keys(station, destination, day, day_kind):
+                indexed = self._board_indices(key, alight)
+                if indexed is None:
+                    continue
+                board, indices = indexed
+                times = board.times[indices]
+                start = int(np.searchsorted(times, seconds, side="left"))
+                for i in indices[start : start + count]:
+                    found.append(self._departure(key, board, int(i), day))
+            if len(found) >= count:
+                break
+            # Nothing more today: continue from the start of the next service day.
+            day, seconds, day_kind = day + timedelta(days=1), 0, None
+        found.sort(key=lambda d: d.time)
+        return found[:count]
+
+    def first_last(
+        self,
+        origin: str,
+        destination: str,
+        day: date | None = None,
+        *,
+        day_kind: str | None = None,
+    ) -> FirstLast | None:
+        """The first and last trains from `origin` that get to `destination`.
+
+        The last train is the latest departure from `origin` that still makes
+        each connection along the route. Returns None without service.
+        """
+        origin = self.network.resolve(origin)
+        destination = self.network.resolve(destination)
+        day = day or service_day(now())[0]
+        kind = day_kind or day_type(day)
+        route = self.network.route(origin, destination)
+        if not route.legs:
+            raise ValueError("Origin and destination are the same station")
+        boards = []
+        for leg in route.legs:
+            key = (leg.stations[0], leg.line, leg.towards, kind)
+            indexed = self._board_indices(
+                key, self._positions[leg.line][leg.stations[-1]]
+            )
+            if indexed is None or not len(indexed[1]):
+                return None
+            board, indices = indexed
+            boards.append((key, board, indices, board.times[indices], leg.seconds))
+
+        # Earliest trip: catch the first train, then the next one at each change.
+        first = None
+        ready = 0
+        for n, (key, board, indices, times, seconds) in enumerate(boards):
+            i = int(np.searchsorted(times, ready, side="left"))
+            if i == len(times):
+                return None
+            if n == 0:
+                first = self._departure(key, board, int(indices[i]), day)
+            ready = int(times[i]) + seconds + MIN_CONNECTION_SECONDS
+
+        # Latest trip: work back from the last train of the final leg.
+        deadline = DAY * 2
+        last_index = -1
+        for n in reversed(range(len(boards))):
+            _key, _board, indices, times, _seconds = boards[n]
+            i = int(np.searchsorted(times, deadline, side="right")) - 1
+            if i < 0:
+                return None
+            last_index = int(indices[i])
+            if n:
+                # Board the earlier leg in time to ride it and make this train.
+                ride = boards[n - 1][4]
+                deadline = int(times[i]) - ride - MIN_CONNECTION_SECONDS
+        key, board = boards[0][0], boards[0][1]
+        assert first is not None
+        return FirstLast(first=first, last=self._departure(key, board, last_index, day))
+
+    def headway(
+        self,
+        origin: str,
+        destination: str,
+        *,
+        when: datetime | None = None,
+        window: int = 1800,
+        day_kind: str | None = None,
+    ) -> float | None:
+        """Average seconds between trains towards `destination` around `when`.
+
+        Averages the gaps between departures within `window` seconds either
+        side; None when fewer than two trains run in that time.
+        """
+        origin = self.network.resolve(origin)
+        destination = self.network.resolve(destination)
+        day, seconds = service_day(when or now())
+        ((key, alight),) = self._keys(origin, destination, day, day_kind)
+        indexed = self._board_indices(key, alight)
+        if indexed is None:
+            return None
+        board, indices = indexed
+        times = board.times[indices]
+        lo = int(np.searchsorted(times, seconds - window, side="left"))
+        hi = int(np.searchsorted(times, seconds + window, side="right"))
+        if hi - lo < 2:
+            return None
+        return float(times[hi - 1] - times[lo]) / (hi - lo - 1)
+
+
+def _departure_times(headways: Sequence[tuple[int, int]]) -> list[int]:
+    times = []
+    t = FIRST_DEPARTURE
+    while t <= LAST_DEPARTURE:
+        times.append(t)
+        t += next(h for start, h in reversed(headways) if start <= t)
+    return times
+
+
+def _board(departures: list[tuple[int, int]]) -> _Board:
+    departures.sort()
+    return _Board(
+        np.array([t for t, _ in departures], dtype=np.int32),
+        np.array([e for _, e in departures], dtype=np.int16),
+    )
+
+
+def _merge(boards: list[_Board]) -> _Board:
+    if len(boards) == 1:
+        return boards[0]
+    times = np.concatenate([b.times for b in boards])
+    order = np.argsort(times, kind="stable")
+    return _Board(times[order], np.concatenate([b.ends for b in boards])[order])